@@ -0,0 +1,210 @@
+import random
+from decimal import Decimal
+from jal.constants import PredefindedAccountType, PredefinedAsset, PredefinedCategory
+from jal.db.db import JalDB
+from jal.db.helpers import db_connection, executeSQL, executeSQLbatch, decimal2db, format_decimal
+from jal.db.operations import Dividend, CorporateAction
+from jal.data_import.statement import FOF
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Generates a synthetic book of given size and puts it into current database. The same 'seed' and sizes always give
+# the same data set. Accounts are investment accounts in USD, assets are stocks with daily quotes in USD and
+# USD has daily quotes in RUB. Operations are spread over 'years' since START and include trades, dividends, money
+# transfers between accounts, stock splits and monthly fees.
+class PortfolioGenerator:
+    START = 1546300800       # 01/01/2019 00:00:00 UTC
+    DAY = 86400
+    CURRENCY = 2             # USD
+    BASE_CURRENCY = 1        # RUB
+    FIRST_ASSET = 4          # first 3 assets are predefined currencies
+    PEER = 1
+    INITIAL_BALANCE = 10000000
+
+    def __init__(self, seed=1, accounts=3, assets=30, years=3, trades=5000, dividends=500, transfers=100,
+                 corp_actions=10):
+        self.seed = seed
+        self.accounts = accounts
+        self.assets = assets
+        self.years = years
+        self.trades = trades
+        self.dividends = dividends
+        self.transfers = transfers
+        self.corp_actions = corp_actions
+        self._rng = random.Random(seed)
+        self._prices = {}       # {asset_id: [price for every day]}
+
+    def config(self) -> dict:
+        return {"seed": self.seed, "accounts": self.accounts, "assets": self.assets, "years": self.years,
+                "trades": self.trades, "dividends": self.dividends, "transfers": self.transfers,
+                "corp_actions": self.corp_actions}
+
+    def days(self) -> int:
+        return self.years * 365
+
+    def end(self) -> int:
+        return self.START + self.days() * self.DAY
+
+    def asset_ids(self) -> list:
+        return list(range(self.FIRST_ASSET, self.FIRST_ASSET + self.assets))
+
+    # Puts all generated data into DB. Triggers are disabled as ledger is empty and will be rebuilt anyway
+    def populate(self) -> None:
+        db = JalDB()
+        db.enable_triggers(False)
+        db_connection().transaction()
+        self._create_references()
+        self._create_quotes()
+        self._create_operations()
+        db_connection().commit()
+        db.enable_triggers(True)
+
+    # Inserts 'rows' into 'table'. Every row is a tuple of values for 'fields'
+    def _batch(self, table, fields, rows) -> None:
+        if not rows:
+            return
+        sql_text = f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({', '.join([':' + x for x in fields])})"
+        columns = [list(x) for x in zip(*rows)]
+        assert executeSQLbatch(sql_text, list(zip([':' + x for x in fields], columns))) is not None
+
+    def _create_references(self) -> None:
+        assert executeSQL("INSERT INTO agents (id, pid, name) VALUES (:id, 0, 'Benchmark Broker')",
+                          [(":id", self.PEER)]) is not None
+        self._batch("accounts",
+                    ['id', 'type_id', 'name', 'currency_id', 'active', 'number', 'organization_id', 'precision'],
+                    [(i, PredefindedAccountType.Investment, f"Broker {i}", self.CURRENCY, 1, f"B{i:06d}", self.PEER, 2)
+                     for i in range(1, self.accounts + 1)])
+        self._batch("assets", ['id', 'type_id', 'full_name', 'isin'],
+                    [(x, PredefinedAsset.Stock, f"SYNTHETIC STOCK {x}", f"US{x:09d}0") for x in self.asset_ids()])
+        self._batch("asset_tickers", ['asset_id', 'symbol', 'currency_id'],
+                    [(x, f"S{x:04d}", self.CURRENCY) for x in self.asset_ids()])
+
+    # Quotes follow a random walk with 2 decimal digits for stocks and 4 digits for USD/RUB rate
+    def _create_quotes(self) -> None:
+        rows = []
+        rate = Decimal('70')
+        for day in range(self.days()):
+            rate = max(Decimal('30'), rate * (Decimal('1') + Decimal(self._rng.randint(-100, 100)) / 10000))
+            rate = rate.quantize(Decimal('0.0001'))
+            rows.append((self.START + day * self.DAY, 2, self.BASE_CURRENCY, decimal2db(rate, 'quote')))
+        for asset_id in self.asset_ids():
+            price = Decimal(self._rng.randint(1000, 50000)) / 100
+            self._prices[asset_id] = []
+            for day in range(self.days()):
+                price = max(Decimal('1'), price * (Decimal('1') + Decimal(self._rng.randint(-300, 300)) / 10000))
+                price = price.quantize(Decimal('0.01'))
+                self._prices[asset_id].append(price)
+                rows.append((self.START + day * self.DAY, asset_id, self.CURRENCY, decimal2db(price, 'quote')))
+        self._batch("quotes", ['timestamp', 'asset_id', 'currency_id', 'quote'], rows)
+
+    # Operations are generated in time order while positions are tracked in order to keep them consistent:
+    # sales don't exceed holdings, dividends and splits are made only for assets that are held.
+    def _create_operations(self) -> None:
+        events = [('trade', self._timestamp()) for _ in range(self.trades)] + \
+                 [('dividend', self._timestamp()) for _ in range(self.dividends)] + \
+                 [('transfer', self._timestamp()) for _ in range(self.transfers if self.accounts > 1 else 0)] + \
+                 [('split', self._timestamp()) for _ in range(self.corp_actions)]
+        events.sort(key=lambda x: x[1])
+        positions = {}
+        trades, dividends, transfers, splits = [], [], [], []
+        for event, timestamp in events:
+            day = (timestamp - self.START) // self.DAY
+            held = [x for x in sorted(positions) if positions[x] > 0]
+            if event == 'trade':
+                account_id = self._rng.randint(1, self.accounts)
+                asset_id = self._rng.choice(self.asset_ids())
+                qty = positions.get((account_id, asset_id), 0)
+                if qty > 0 and self._rng.random() < 0.45:
+                    qty = -self._rng.randint(1, qty)
+                else:
+                    qty = self._rng.randint(1, 100)
+                positions[(account_id, asset_id)] = positions.get((account_id, asset_id), 0) + qty
+                price = self._prices[asset_id][day]
+                fee = (abs(qty) * price / 1000).quantize(Decimal('0.01'))
+                trades.append((timestamp, timestamp + 2 * self.DAY, account_id, asset_id,
+                               str(qty), format_decimal(price), format_decimal(fee)))
+            elif event == 'dividend' and held:
+                account_id, asset_id = self._rng.choice(held)
+                amount = positions[(account_id, asset_id)] * self._prices[asset_id][day] / 100
+                amount = amount.quantize(Decimal('0.01'))
+                tax = (amount / 10).quantize(Decimal('0.01'))
+                dividends.append((timestamp, Dividend.Dividend, account_id, asset_id, format_decimal(amount),
+                                  format_decimal(tax), f"Dividend {len(dividends) + 1}"))
+            elif event == 'transfer':
+                source, target = self._rng.sample(range(1, self.accounts + 1), 2)
+                amount = str(self._rng.randint(100, 10000))
+                transfers.append((timestamp, source, amount, timestamp, target, amount,
+                                  f"Transfer {len(transfers) + 1}"))
+            elif event == 'split' and held:
+                account_id, asset_id = self._rng.choice(held)
+                qty = positions[(account_id, asset_id)]
+                positions[(account_id, asset_id)] = 2 * qty
+                splits.append((timestamp, account_id, asset_id, qty))
+        self._batch("trades", ['timestamp', 'settlement', 'account_id', 'asset_id', 'qty', 'price', 'fee'], trades)
+        self._batch("dividends", ['timestamp', 'type', 'account_id', 'asset_id', 'amount', 'tax', 'note'], dividends)
+        self._batch("transfers", ['withdrawal_timestamp', 'withdrawal_account', 'withdrawal',
+                                  'deposit_timestamp', 'deposit_account', 'deposit', 'note'], transfers)
+        for timestamp, account_id, asset_id, qty in splits:
+            query = executeSQL("INSERT INTO asset_actions (timestamp, account_id, type, asset_id, qty, note) "
+                               "VALUES (:timestamp, :account, :type, :asset, :qty, 'Split 2 for 1')",
+                               [(":timestamp", timestamp), (":account", account_id), (":type", CorporateAction.Split),
+                                (":asset", asset_id), (":qty", str(qty))])
+            assert executeSQL("INSERT INTO action_results (action_id, asset_id, qty, value_share) "
+                              "VALUES (:action, :asset, :qty, '1')",
+                              [(":action", query.lastInsertId()), (":asset", asset_id),
+                               (":qty", str(2 * qty))]) is not None
+        self._create_actions()
+
+    # Every account gets starting balance and monthly fee
+    def _create_actions(self) -> None:
+        actions = []
+        for account_id in range(1, self.accounts + 1):
+            actions.append((self.START - self.DAY, account_id, PredefinedCategory.StartingBalance,
+                            str(self.INITIAL_BALANCE), "Starting balance"))
+            for month in range(self.years * 12):
+                actions.append((self.START + month * 30 * self.DAY + 43200, account_id, PredefinedCategory.Fees,
+                                str(-self._rng.randint(1, 20)), "Monthly fee"))
+        for timestamp, account_id, category, amount, note in actions:
+            query = executeSQL("INSERT INTO actions (timestamp, account_id, peer_id) "
+                               "VALUES (:timestamp, :account, :peer)",
+                               [(":timestamp", timestamp), (":account", account_id), (":peer", self.PEER)])
+            assert executeSQL("INSERT INTO action_details (pid, category_id, amount, note) "
+                              "VALUES (:pid, :category, :amount, :note)",
+                              [(":pid", query.lastInsertId()), (":category", category), (":amount", amount),
+                               (":note", note)]) is not None
+
+    # Returns random timestamp inside generated period during trading hours
+    def _timestamp(self) -> int:
+        return self.START + self._rng.randrange(self.days()) * self.DAY + 36000 + self._rng.randrange(21600)
+
+    # Returns a statement in JSON import format (see jal/data_import/import_schema.json) with 'trades' trades
+    # of already existing assets for a new account 'number' made after the end of generated period
+    def statement(self, trades=500, number="STATEMENT") -> dict:
+        rng = random.Random(self.seed + 1)
+        begin = self.end()
+        assets = [{"id": 1, "type": FOF.ASSET_MONEY, "name": ""}]
+        symbols = [{"id": 1, "asset": 1, "symbol": "USD", "currency": -1}]
+        for i, asset_id in enumerate(self.asset_ids()):
+            assets.append({"id": i + 2, "type": FOF.ASSET_STOCK, "name": f"SYNTHETIC STOCK {asset_id}",
+                           "isin": f"US{asset_id:09d}0"})
+            symbols.append({"id": i + 2, "asset": i + 2, "symbol": f"S{asset_id:04d}", "currency": 1})
+        statement_trades = []
+        for i in range(trades):
+            timestamp = begin + i * 600
+            statement_trades.append({"id": i + 1, "number": f"{i + 1}", "timestamp": timestamp,
+                                     "settlement": timestamp + 2 * self.DAY, "account": 1,
+                                     "asset": rng.randint(2, self.assets + 1),
+                                     "quantity": float(rng.randint(1, 100) * rng.choice([1, -1])),
+                                     "price": rng.randint(1000, 50000) / 100, "fee": 1.0})
+        return {
+            FOF.PERIOD: [begin, begin + trades * 600],
+            FOF.ACCOUNTS: [{"id": 1, "number": number, "currency": 1, "precision": 2}],
+            FOF.ASSETS: assets,
+            FOF.SYMBOLS: symbols,
+            FOF.ASSETS_DATA: [],
+            FOF.TRADES: statement_trades,
+            FOF.TRANSFERS: [],
+            FOF.CORP_ACTIONS: [],
+            FOF.ASSET_PAYMENTS: [],
+            FOF.INCOME_SPENDING: []
+        }
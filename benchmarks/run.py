@@ -0,0 +1,194 @@
+# Benchmarks of JAL on a synthetic data set. Usage example (from the project root folder):
+#   python -m benchmarks.run --accounts 3 --assets 30 --years 3 --trades 5000 --output results.json
+# Results (time of every run in seconds) are stored in JSON file together with data set configuration.
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timezone
+from PySide6.QtCore import QDate, QDateTime, Qt, QModelIndex
+from PySide6.QtWidgets import QApplication, QTreeView, QTableView
+
+from jal import __version__
+from jal.constants import Setup
+from jal.db.db import JalDB, JalDBError
+from jal.db.helpers import get_app_path, close_db_connection
+from jal.db.ledger import Ledger
+from jal.reports.profit_loss import ProfitLossReportModel     # reports should be imported before models in order
+from jal.reports.income_spending import IncomeSpendingReportModel   # to resolve circular import of delegates
+from jal.reports.deals import DealsReportModel
+from jal.db.holdings_model import HoldingsModel
+from jal.db.balances_model import BalancesModel
+from jal.data_export.taxes import TaxesRus
+from jal.data_import.statement import Statement
+from benchmarks.generator import PortfolioGenerator
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Every benchmark function gets PortfolioGenerator of the data set (that is already in DB) and does all preparations.
+# It returns a callable that is timed by runner.
+def bench_rebuild_full(portfolio):
+    return lambda: Ledger().rebuild(from_timestamp=0)
+
+
+def bench_rebuild_frontier(portfolio):   # Rebuild of the last year only
+    return lambda: Ledger().rebuild(from_timestamp=portfolio.end() - 365 * portfolio.DAY)
+
+
+def bench_holdings(portfolio):
+    model = HoldingsModel(QTreeView())
+    model.setCurrency(PortfolioGenerator.CURRENCY)
+    model.setDate(_qdate(portfolio.end()))
+    return model.update
+
+
+def bench_balances(portfolio):
+    model = BalancesModel(QTableView())
+    model.setCurrency(PortfolioGenerator.CURRENCY)
+    model.setDate(_qdate(portfolio.end()))
+    return model.update
+
+
+def bench_profit_loss_report(portfolio):
+    model = ProfitLossReportModel(QTableView())
+    model.setDatesRange(portfolio.START, portfolio.end())
+    return lambda: _fetch_all(model, model.setAccount, 1)
+
+
+def bench_deals_report(portfolio):
+    model = DealsReportModel(QTableView())
+    model.setDatesRange(portfolio.START, portfolio.end())
+    return lambda: _fetch_all(model, model.setAccount, 1)
+
+
+def bench_income_spending_report(portfolio):
+    model = IncomeSpendingReportModel(QTreeView())
+    return lambda: model.setDatesRange(portfolio.START, portfolio.end())
+
+
+def bench_taxes_rus(portfolio):
+    year = datetime.fromtimestamp(portfolio.end(), tz=timezone.utc).year - 1
+    return lambda: TaxesRus().prepare_tax_report(year, 1)
+
+
+def bench_statement_import(portfolio):
+    statement_file = os.path.join(tempfile.mkdtemp(), "statement.json")
+    with open(statement_file, 'w', encoding='utf-8') as json_file:
+        json.dump(portfolio.statement(), json_file)
+
+    def import_statement():
+        statement = Statement()
+        statement.load(statement_file)
+        statement.validate_format()
+        statement.match_db_ids()
+        statement.import_into_db()
+    return import_statement
+
+
+# Benchmarks are executed in the order of this list. Number of repetitions is limited to 1 for benchmarks that
+# modify data. Statement import is the last one as it adds new operations into DB.
+BENCHMARKS = [
+    ("ledger_rebuild_full", bench_rebuild_full, None),
+    ("ledger_rebuild_frontier", bench_rebuild_frontier, None),
+    ("holdings", bench_holdings, None),
+    ("balances", bench_balances, None),
+    ("report_profit_loss", bench_profit_loss_report, None),
+    ("report_income_spending", bench_income_spending_report, None),
+    ("report_deals", bench_deals_report, None),
+    ("taxes_rus", bench_taxes_rus, None),
+    ("statement_import", bench_statement_import, 1)
+]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def _qdate(timestamp) -> QDate:
+    return QDateTime.fromSecsSinceEpoch(timestamp, Qt.UTC).date()
+
+
+# Calls method(*args) and fetches all rows of the model as views do it while scrolling
+def _fetch_all(model, method, *args):
+    method(*args)
+    while model.canFetchMore(QModelIndex()):
+        model.fetchMore(QModelIndex())
+
+
+# Creates new empty database in 'db_path' folder
+def _create_db(db_path):
+    shutil.copyfile(get_app_path() + Setup.INIT_SCRIPT_PATH, db_path + Setup.INIT_SCRIPT_PATH)
+    error = JalDB().init_db(db_path)
+    if error.code != JalDBError.NoError:
+        raise RuntimeError(f"Benchmark DB initialization failed: {error.message} {error.details}")
+
+
+def run(portfolio, repeat, selected=None) -> dict:
+    results = {}
+    for name, benchmark, max_repeat in BENCHMARKS:
+        if selected and name not in selected:
+            continue
+        timed_call = benchmark(portfolio)
+        runs = []
+        for _ in range(min(repeat, max_repeat) if max_repeat else repeat):
+            start = time.perf_counter()
+            timed_call()
+            runs.append(time.perf_counter() - start)
+        results[name] = {"runs": runs, "min": min(runs), "median": statistics.median(runs),
+                         "mean": statistics.mean(runs)}
+        print(f"{name:<30}{results[name]['min']:>12.3f}s (min of {len(runs)})")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run JAL benchmarks on a synthetic portfolio")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--accounts", type=int, default=3)
+    parser.add_argument("--assets", type=int, default=30)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--trades", type=int, default=5000)
+    parser.add_argument("--dividends", type=int, default=500)
+    parser.add_argument("--transfers", type=int, default=100)
+    parser.add_argument("--corp-actions", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs for every benchmark")
+    parser.add_argument("--only", nargs='*', help="names of benchmarks to run")
+    parser.add_argument("--output", default="benchmark_results.json", help="file for JSON results")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication([])
+
+    db_path = tempfile.mkdtemp() + os.sep
+    _create_db(db_path)
+    portfolio = PortfolioGenerator(seed=args.seed, accounts=args.accounts, assets=args.assets, years=args.years,
+                                   trades=args.trades, dividends=args.dividends, transfers=args.transfers,
+                                   corp_actions=args.corp_actions)
+    start = time.perf_counter()
+    portfolio.populate()
+    print(f"{'data_generation':<30}{time.perf_counter() - start:>12.3f}s")
+    results = run(portfolio, args.repeat, args.only)
+
+    report = {
+        "jal_version": __version__,
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sqlite": JalDB().get_engine_version(),
+        "config": portfolio.config(),
+        "repeat": args.repeat,
+        "results": results
+    }
+    with open(args.output, 'w', encoding='utf-8') as json_file:
+        json.dump(report, json_file, indent=2)
+    close_db_connection()
+    shutil.rmtree(db_path, ignore_errors=True)
+    app.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,7 @@ from PySide6.QtWidgets import QApplication, QComboBox
 
 class Setup:
     DB_PATH = "jal.sqlite"
+    WEB_CACHE_PATH = "web_cache.sqlite"
     DB_CONNECTION = "JAL.DB"
     SQLITE_MIN_VERSION = "3.35"
     MAIN_WND_NAME = "JAL_MainWindow"
@@ -19,7 +20,7 @@ class Setup:
     STATEMENT_PATH = "broker_statements"
     TEMPLATE_PATH = "templates"
     UPDATE_PREFIX = 'jal_delta_'
-    TARGET_SCHEMA = 38
+    TARGET_SCHEMA = 48
     DEFAULT_ACCOUNT_PRECISION = 2
 
 
@@ -124,6 +125,11 @@ class AssetData:
     PrincipalValue = 3
 
 
+class FxPeriod:    # Periods of rates in fx_rates table
+    Day = 1
+    Month = 2
+
+
 class PredefinedPeer:
     Financial = 1
 
@@ -10,7 +10,10 @@ from jal.db.account import JalAccount
 from jal.db.asset import JalAsset
 from jal.db.category import JalCategory
 from jal.db.country import JalCountry
+from jal.db.peer import JalPeer
 from jal.db.settings import JalSettings
+from jal.data_export.xlsx import XLSX
+from jal.data_export.dlsg import DLSG
 
 
 # -----------------------------------------------------------------------------------------------------------------------
@@ -25,6 +28,17 @@ class TaxesRus:
         CorporateAction.Delisting: "Делистинг"
     }
 
+    Templates = {
+        "Дивиденды": "tax_rus_dividends.json",
+        "Акции": "tax_rus_trades.json",
+        "Облигации": "tax_rus_bonds.json",
+        "ПФИ": "tax_rus_derivatives.json",
+        "Криптовалюты": "tax_rus_crypto.json",
+        "Корп.события": "tax_rus_corporate_actions.json",
+        "Комиссии": "tax_rus_fees.json",
+        "Проценты": "tax_rus_interests.json"
+    }
+
     def __init__(self):
         self.account = None
         self.year_begin = 0
@@ -64,6 +78,35 @@ class TaxesRus:
             tax_report[report] = self.reports[report]()
         return tax_report
 
+    # Prepares tax report for given year and account and saves it into xlsx file. Tax form file is updated if
+    # dlsg_filename is given ('dlsg_options' are passed to DLSG class). Returns tax report
+    def save_tax_report(self, year, account_id, xls_filename, use_settlement=True, dlsg_filename='', **dlsg_options):
+        tax_report = self.prepare_tax_report(year, account_id, use_settlement=use_settlement)
+        reports_xls = XLSX(xls_filename)
+        parameters = {
+            "period": f"{datetime.utcfromtimestamp(self.year_begin).strftime('%d.%m.%Y')}"
+                      f" - {datetime.utcfromtimestamp(self.year_end - 1).strftime('%d.%m.%Y')}",
+            "account": f"{self.account.number()} ({self.account.currency()})",
+            "currency": self.account.currency(),
+            "broker_name": JalPeer(self.account.organization()).name(),
+            "broker_iso_country": JalCountry(self.account.country()).iso_code()
+        }
+        for section in tax_report:
+            if section not in self.Templates:
+                continue
+            reports_xls.output_data(tax_report[section], self.Templates[section], parameters)
+        reports_xls.save()
+        logging.info(self.tr("Tax report saved to file ") + f"'{xls_filename}'")
+
+        if dlsg_filename:
+            tax_forms = DLSG(year, **dlsg_options)
+            tax_forms.update_taxes(tax_report, parameters)
+            try:
+                tax_forms.save(dlsg_filename)
+            except:
+                logging.error(self.tr("Can't write tax form into file ") + f"'{dlsg_filename}'")
+        return tax_report
+
     # ------------------------------------------------------------------------------------------------------------------
     # Create a totals row from provided list of dictionaries
     # it calculates sum for each field in fields and adds it to return dictionary
@@ -1,9 +1,14 @@
+import logging
 from datetime import datetime, timezone
 from decimal import Decimal
 
+from PySide6.QtWidgets import QApplication
 from jal.db.account import JalAccount
 from jal.db.asset import JalAsset
+from jal.db.holdings import JalHoldings
+from jal.db.settings import JalSettings
 from jal.data_export.dlsg import DLSG
+from jal.data_export.xlsx import XLSX
 
 
 COUNTRY_NA_ID = 0
@@ -16,68 +21,57 @@ class TaxesFlowRus:
         self.year_end = 0
         self.flows = {}
 
+    def tr(self, text):
+        return QApplication.translate("TaxesFlowRus", text)
+
+    # Prepares money flow report for given year and saves it into xlsx file. Returns the report
+    def save_flow_report(self, year, xls_filename):
+        flow_report = self.prepare_flow_report(year)
+        reports_xls = XLSX(xls_filename)
+        parameters = {
+            "period": f"{datetime.utcfromtimestamp(self.year_begin).strftime('%d.%m.%Y')}"
+                      f" - {datetime.utcfromtimestamp(self.year_end - 1).strftime('%d.%m.%Y')}"
+        }
+        reports_xls.output_data(flow_report, "tax_rus_flow.json", parameters)
+        reports_xls.save()
+        logging.info(self.tr("Money flow report saved to file ") + f"'{xls_filename}'")
+        return flow_report
+
+    # All values are reported in account currency, so no currency conversion (and no fx_rates lookup) is required here.
+    # Account currency rate of JalHoldings snapshots isn't used.
     def prepare_flow_report(self, year):
         self.flows = {}
         self.year_begin = int(datetime.strptime(f"{year}", "%Y").replace(tzinfo=timezone.utc).timestamp())
         self.year_end = int(datetime.strptime(f"{year + 1}", "%Y").replace(tzinfo=timezone.utc).timestamp())
 
-        # collect data for period start
         accounts = JalAccount.get_all_accounts(active_only=False)
-        values = []
-        for account in accounts:
-            if account.country() == COUNTRY_NA_ID or account.country() == COUNTRY_RUSSIA_ID:
-                continue
-            assets = account.assets_list(self.year_begin)
-            assets_value = Decimal('0')
-            for asset_data in assets:
-                assets_value += asset_data['amount'] * asset_data['asset'].quote(self.year_begin, account.currency())[1]
-            if assets_value != Decimal('0'):
-                values.append({
-                    'account': account.number(),
-                    'currency': JalAsset(account.currency()).symbol(),
-                    'is_currency': False,
-                    'value': assets_value
-                })
-            money = account.get_asset_amount(self.year_begin, account.currency())
-            if money != Decimal('0'):
-                values.append({
-                    'account': account.number(),
-                    'currency': JalAsset(account.currency()).symbol(),
-                    'is_currency': True,
-                    'value': money
-                })
-        values = sorted(values, key=lambda x: (x['account'], x['is_currency'], x['currency']))
-        for item in values:
-            self.append_flow_values(item, "begin")
-
-        # collect data for period end
-        # TODO - Optimize and combine with data collection for period start as routine is actually the same
-        values = []
-        for account in accounts:
-            if account.country() == COUNTRY_NA_ID or account.country() == COUNTRY_RUSSIA_ID:
-                continue
-            assets = account.assets_list(self.year_end)
-            assets_value = Decimal('0')
-            for asset_data in assets:
-                assets_value += asset_data['amount'] * asset_data['asset'].quote(self.year_end, account.currency())[1]
-            if assets_value != Decimal('0'):
-                values.append({
-                    'account': account.number(),
-                    'currency': JalAsset(account.currency()).symbol(),
-                    'is_currency': False,
-                    'value': assets_value
-                })
-            money = account.get_asset_amount(self.year_end, account.currency())
-            if money != Decimal('0'):
-                values.append({
-                    'account': account.number(),
-                    'currency': JalAsset(account.currency()).symbol(),
-                    'is_currency': True,
-                    'value': money
-                })
-        values = sorted(values, key=lambda x: (x['account'], x['is_currency'], x['currency']))
-        for item in values:
-            self.append_flow_values(item, "end")
+        # collect data for period start and end
+        for period, timestamp in [("begin", self.year_begin), ("end", self.year_end)]:
+            snapshot = JalHoldings(timestamp, JalSettings().getValue('BaseCurrency'), active_only=False)
+            values = []
+            for account_id in snapshot.accounts():
+                account = JalAccount(account_id)
+                if account.country() == COUNTRY_NA_ID or account.country() == COUNTRY_RUSSIA_ID:
+                    continue
+                assets_value = snapshot.assets_value(account_id)
+                if assets_value != Decimal('0'):
+                    values.append({
+                        'account': account.number(),
+                        'currency': JalAsset(account.currency()).symbol(),
+                        'is_currency': False,
+                        'value': assets_value
+                    })
+                money = snapshot.money(account_id)
+                if money != Decimal('0'):
+                    values.append({
+                        'account': account.number(),
+                        'currency': JalAsset(account.currency()).symbol(),
+                        'is_currency': True,
+                        'value': money
+                    })
+            values = sorted(values, key=lambda x: (x['account'], x['is_currency'], x['currency']))
+            for item in values:
+                self.append_flow_values(item, period)
 
         # collect money and assets ins/outs
         # FIXME - repetition of similar code and similar method calls - to be optimized
@@ -111,6 +111,7 @@ class Statement(QObject):   # derived from QObject to have proper string transla
         self._data = {}
         self._previous_accounts = {}
         self._last_selected_account = None
+        self._batch = None    # Settings of non-interactive import, see set_batch_mode()
         self._section_loaders = {
             FOF.PERIOD: self._check_period,
             FOF.ASSETS: self._import_assets,
@@ -124,6 +125,12 @@ class Statement(QObject):   # derived from QObject to have proper string transla
             FOF.CORP_ACTIONS: self._import_corporate_actions
         }
 
+    # Switches import into non-interactive mode where no dialogs are shown: 'account_id' is used as a pair account
+    # for deposits/withdrawals (import fails if it is 0), 'force' allows import of a statement that starts before
+    # the last recorded operation of the account (import fails otherwise)
+    def set_batch_mode(self, account_id: int = 0, force: bool = False) -> None:
+        self._batch = {'account': account_id, 'force': force}
+
     # returns tuple (start_timestamp, end_timestamp)
     def period(self):
         if FOF.PERIOD in self._data:
@@ -299,6 +306,11 @@ class Statement(QObject):   # derived from QObject to have proper string transla
         for account in accounts:
             if account['id'] < 0:  # Checks if report is after last transaction recorded for account.
                 if period[0] < JalAccount(-account['id']).last_operation_date():
+                    if self._batch is not None:
+                        if not self._batch['force']:
+                            raise Statement_ImportError(self.tr("Statement period starts before last recorded "
+                                                                "operation for the account"))
+                        continue
                     if QMessageBox().warning(None, self.tr("Confirmation"),
                                              self.tr("Statement period starts before last recorded operation for the account. Continue import?"),
                                              QMessageBox.Yes, QMessageBox.No) == QMessageBox.No:
@@ -508,6 +520,8 @@ class Statement(QObject):   # derived from QObject to have proper string transla
             LedgerTransaction().create_new(LedgerTransaction.CorporateAction, action)
 
     def select_account(self, text, account_id, recent_account_id=0):
+        if self._batch is not None:
+            return self._batch['account']
         if "pytest" in sys.modules:
             return 1    # Always return 1st account if we are in testing mode
         dialog = SelectAccountDialog(text, account_id, recent_account=recent_account_id)
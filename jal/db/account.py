@@ -1,5 +1,6 @@
 from decimal import Decimal
-from jal.db.db import JalDB
+from jal.db.db import JalDB, JalDBObject
+from jal.db.helpers import db2decimal
 from jal.db.asset import JalAsset
 from jal.db.peer import JalPeer
 import jal.db.operations
@@ -7,8 +8,23 @@ import jal.db.closed_trade
 from jal.constants import Setup, BookAccount, PredefindedAccountType, PredefinedAsset
 
 
-class JalAccount(JalDB):
+class JalAccount(JalDBObject):
+    _db_tables = ("accounts",)
+    ASSETS_LIST_SQL = "WITH _last_ids AS (" \
+                      "SELECT MAX(id) AS id, asset_id FROM ledger " \
+                      "WHERE account_id=:account_id AND timestamp<=:timestamp GROUP BY asset_id" \
+                      ") " \
+                      "SELECT l.asset_id, amount_acc, value_acc " \
+                      "FROM ledger l JOIN _last_ids d ON l.asset_id=d.asset_id AND l.id=d.id " \
+                      "WHERE amount_acc!='0' AND book_account=:assets"
+    ASSET_AMOUNT_SQL = "SELECT amount_acc FROM ledger WHERE account_id=:account_id AND asset_id=:asset_id " \
+                       "AND timestamp<=:timestamp AND book_account=:book ORDER BY id DESC LIMIT 1"
+    OPEN_TRADES_SQL = "SELECT op_type, operation_id, price, remaining_qty FROM trades_opened " \
+                      "WHERE remaining_qty!='0' AND account_id=:account AND asset_id=:asset"
+
     def __init__(self, id: int = 0, data: dict = None, search: bool = False, create: bool = False) -> None:
+        if self._cached():
+            return
         super().__init__()
         self._id = id
         if self._valid_data(data, search, create):
@@ -43,6 +59,7 @@ class JalAccount(JalDB):
         self._country_id = self._data['country_id'] if self._data is not None else None
         self._reconciled = int(self._data['reconciled_on']) if self._data is not None else 0
         self._precision = int(self._data['precision']) if self._data is not None else Setup.DEFAULT_ACCOUNT_PRECISION
+        self._cache(self._data is not None)
 
     # Method returns a list of JalAccount objects for accounts of given type (or all if None given)
     # Flag "active_only" allows only active accounts output by default
@@ -98,6 +115,7 @@ class JalAccount(JalDB):
         _ = self._executeSQL("UPDATE accounts SET organization_id=:peer_id WHERE id=:id",
                              [(":id", self._id), (":peer_id", peer_id)])
         self._organization_id = peer_id
+        self._invalidate()
 
     def reconciled_at(self) -> int:
         return self._reconciled
@@ -105,13 +123,14 @@ class JalAccount(JalDB):
     def reconcile(self, timestamp: int):
         _ = self._executeSQL("UPDATE accounts SET reconciled_on=:timestamp WHERE id = :account_id",
                              [(":timestamp", timestamp), (":account_id", self._id)])
+        self._reconciled = timestamp
+        self._invalidate()
 
     def precision(self) -> int:
         return self._precision
 
     def last_operation_date(self) -> int:
-        last_timestamp = self._readSQL("SELECT MAX(o.timestamp) FROM operation_sequence AS o "
-                                       "LEFT JOIN accounts AS a ON o.account_id=a.id WHERE a.id=:account_id",
+        last_timestamp = self._readSQL("SELECT MAX(timestamp) FROM operation_sequence WHERE account_id=:account_id",
                                        [(":account_id", self._id)])
         last_timestamp = 0 if last_timestamp == '' else last_timestamp
         return last_timestamp
@@ -120,48 +139,30 @@ class JalAccount(JalDB):
     # corresponding to assets present on account at given timestamp
     def assets_list(self, timestamp: int) -> list:
         assets = []
-        query = self._executeSQL(
-            "WITH _last_ids AS ("
-            "SELECT MAX(id) AS id, asset_id FROM ledger "
-            "WHERE account_id=:account_id AND timestamp<=:timestamp GROUP BY asset_id"
-            ") "
-            "SELECT l.asset_id, amount_acc, value_acc "
-            "FROM ledger l JOIN _last_ids d ON l.asset_id=d.asset_id AND l.id=d.id "
-            "WHERE amount_acc!='0' AND book_account=:assets",
-            [(":account_id", self._id), (":timestamp", timestamp), (":assets", BookAccount.Assets)])
+        query = self._executeSQL(self.ASSETS_LIST_SQL, [(":account_id", self._id), (":timestamp", timestamp),
+                                                        (":assets", BookAccount.Assets)])
         while query.next():
             try:
                 asset_id, amount, value = self._readSQLrecord(query)
             except TypeError:  # Skip if None is returned (i.e. there are no assets)
                 continue
-            assets.append({"asset": JalAsset(int(asset_id)), "amount": Decimal(amount), "value": Decimal(value)})
+            assets.append({"asset": JalAsset(int(asset_id)), "amount": db2decimal(amount, 'amount_acc'),
+                           "value": db2decimal(value, 'value_acc')})
         return assets
 
     # Return amount of asset accumulated on account at given timestamp
     def get_asset_amount(self, timestamp: int, asset_id: int) -> Decimal:
         asset =JalAsset(asset_id)
         if asset.type() == PredefinedAsset.Money:
-            money = self._readSQL("SELECT amount_acc FROM ledger "
-                                  "WHERE account_id=:account_id AND asset_id=:asset_id AND timestamp<=:timestamp "
-                                  "AND book_account=:money ORDER BY id DESC LIMIT 1",
-                                  [(":account_id", self._id), (":asset_id", asset_id),
-                                   (":timestamp", timestamp), (":money", BookAccount.Money)])
-            money = Decimal('0') if money is None else Decimal(money)
-            debt = self._readSQL("SELECT amount_acc FROM ledger "
-                                  "WHERE account_id=:account_id AND asset_id=:asset_id AND timestamp<=:timestamp "
-                                  "AND book_account=:liabilities ORDER BY id DESC LIMIT 1",
-                                  [(":account_id", self._id), (":asset_id", asset_id),
-                                   (":timestamp", timestamp), (":liabilities", BookAccount.Liabilities)])
-            debt = Decimal('0') if debt is None else Decimal(debt)
-            return money + debt
+            money = self._readSQL(self.ASSET_AMOUNT_SQL, [(":account_id", self._id), (":asset_id", asset_id),
+                                                          (":timestamp", timestamp), (":book", BookAccount.Money)])
+            debt = self._readSQL(self.ASSET_AMOUNT_SQL, [(":account_id", self._id), (":asset_id", asset_id),
+                                                         (":timestamp", timestamp), (":book", BookAccount.Liabilities)])
+            return db2decimal(money, 'amount_acc') + db2decimal(debt, 'amount_acc')
         else:
-            value = self._readSQL("SELECT amount_acc FROM ledger "
-                                  "WHERE account_id=:account_id AND asset_id=:asset_id AND timestamp<=:timestamp "
-                                  "AND book_account=:assets ORDER BY id DESC LIMIT 1",
-                                  [(":account_id", self._id), (":asset_id", asset_id),
-                                   (":timestamp", timestamp), (":assets", BookAccount.Assets)])
-            amount = Decimal(value) if value is not None else Decimal('0')
-            return amount
+            value = self._readSQL(self.ASSET_AMOUNT_SQL, [(":account_id", self._id), (":asset_id", asset_id),
+                                                          (":timestamp", timestamp), (":book", BookAccount.Assets)])
+            return db2decimal(value, 'amount_acc')
 
     # Returns a list of JalClosedTrade objects recorded for the account
     def closed_trades_list(self) -> list:
@@ -177,15 +178,13 @@ class JalAccount(JalDB):
     # It doesn't take 'timestamp' as a parameter as it always return current open trades, not a retrospective position
     def open_trades_list(self, asset) -> list:
         trades = []
-        query = self._executeSQL("SELECT op_type, operation_id, price, remaining_qty "
-                                 "FROM trades_opened "
-                                 "WHERE remaining_qty!='0' AND account_id=:account AND asset_id=:asset",
-                                 [(":account", self._id), (":asset", asset.id())])
+        query = self._executeSQL(self.OPEN_TRADES_SQL, [(":account", self._id), (":asset", asset.id())])
         while query.next():
             op_type, oid, price, qty = self._readSQLrecord(query)
             operation = jal.db.operations.LedgerTransaction().get_operation(op_type, oid,
                                                                             jal.db.operations.Transfer.Incoming)
-            trades.append({"operation": operation, "price": Decimal(price), "remaining_qty": Decimal(qty)})
+            trades.append({"operation": operation, "price": Decimal(price),
+                           "remaining_qty": db2decimal(qty, 'remaining_qty')})
         return trades
 
     def _valid_data(self, data: dict, search: bool = False, create: bool = False) -> bool:
@@ -238,10 +237,7 @@ class JalAccount(JalDB):
             "AND (book_account=:money OR book_account=:debt) AND timestamp>=:begin AND timestamp<=:end",
             [(":account_id", self._id), (":money", BookAccount.Money), (":debt", BookAccount.Liabilities),
              (":begin", begin), (":end", end)])
-        if value:
-            return Decimal(value)
-        else:
-            return Decimal('0')
+        return db2decimal(value, 'amount')
 
     # FIXME - this method is almost identical to the previous one, to be optimized
     def money_flow_out(self, begin, end):
@@ -250,10 +246,7 @@ class JalAccount(JalDB):
             "AND (book_account=:money OR book_account=:debt) AND timestamp>=:begin AND timestamp<=:end",
             [(":account_id", self._id), (":money", BookAccount.Money), (":debt", BookAccount.Liabilities),
              (":begin", begin), (":end", end)])
-        if value:
-            return Decimal(value)
-        else:
-            return Decimal('0')
+        return db2decimal(value, 'amount')
 
     # FIXME - this method is almost identical to the previous one, to be optimized
     def assets_flow_in(self, begin, end):
@@ -262,10 +255,7 @@ class JalAccount(JalDB):
             "AND book_account=:assets AND timestamp>=:begin AND timestamp<=:end AND op_type!=:corp_action",
             [(":account_id", self._id), (":assets", BookAccount.Assets), (":begin", begin), (":end", end),
              (":corp_action", jal.db.operations.LedgerTransaction.CorporateAction)])
-        if value:
-            return Decimal(value)
-        else:
-            return Decimal('0')
+        return db2decimal(value, 'value')
 
     # FIXME - this method is almost identical to the previous one, to be optimized
     def assets_flow_out(self, begin, end):
@@ -274,7 +264,4 @@ class JalAccount(JalDB):
             "AND book_account=:assets AND timestamp>=:begin AND timestamp<=:end AND op_type!=:corp_action",
             [(":account_id", self._id), (":assets", BookAccount.Assets), (":begin", begin), (":end", end),
              (":corp_action", jal.db.operations.LedgerTransaction.CorporateAction)])
-        if value:
-            return Decimal(value)
-        else:
-            return Decimal('0')
+        return db2decimal(value, 'value')
@@ -1,14 +1,19 @@
 import logging
+import pandas as pd
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
 from jal.constants import BookAccount, MarketDataFeed, AssetData, PredefinedAsset
-from jal.db.db import JalDB
-from jal.db.helpers import format_decimal
+from jal.db.db import JalDB, JalDBObject, QuoteIndex
+from jal.db.helpers import decimal2db, db2decimal, fixed_point_storage
 from jal.db.country import JalCountry
 
 
-class JalAsset(JalDB):
+class JalAsset(JalDBObject):
+    _db_tables = ("assets", "asset_data")
+
     def __init__(self, id: int = 0, data: dict = None, search: bool = False, create: bool = False) -> None:
+        if self._cached():
+            return
         super().__init__()
         self._id = id
         if self._valid_data(data, search, create):
@@ -31,6 +36,7 @@ class JalAsset(JalDB):
                                          [(":datatype", AssetData.RegistrationCode), (":id", self._id)])
         self._expiry = self._readSQL("SELECT value FROM asset_data WHERE datatype=:datatype AND asset_id=:id",
                                          [(":datatype", AssetData.ExpiryDate), (":id", self._id)])
+        self._cache(self._data is not None)
 
     def id(self) -> int:
         return self._id
@@ -88,12 +94,11 @@ class JalAsset(JalDB):
     # Returns tuple in form of (timestamp:int, quote:Decimal) that contains last found quotation in given currency.
     # Returned timestamp might be less than given. Returns (0, 0) if no quotation information present in db.
     def quote(self, timestamp: int, currency_id: int) -> tuple:
-        quote = self._readSQL("SELECT timestamp, quote FROM quotes WHERE asset_id=:asset_id "
-                              "AND currency_id=:currency_id AND timestamp<=:timestamp ORDER BY timestamp DESC LIMIT 1",
-                              [(":asset_id", self._id), (":currency_id", currency_id), (":timestamp", timestamp)])
-        if quote is None:
-            return 0, Decimal('0')
-        return int(quote[0]), Decimal(quote[1])
+        return QuoteIndex.quote(self._id, currency_id, timestamp)
+
+    # Returns a list of (timestamp, quote) tuples with the last quote at or before every timestamp of 'timestamps'
+    def quotes_at(self, timestamps: list, currency_id: int) -> list:
+        return QuoteIndex.quotes(self._id, currency_id, timestamps)
 
     # Return a list of tuples (timestamp:int, quote:Decimal) of all quotes avaiable for asset
     # for time interval begin-end
@@ -105,7 +110,7 @@ class JalAsset(JalDB):
             [(":asset_id", self._id), (":currency_id", currency_id), (":begin", begin), (":end", end)])
         while query.next():
             timestamp, quote = self._readSQLrecord(query)
-            quotes.append((timestamp, Decimal(quote)))
+            quotes.append((timestamp, db2decimal(quote, 'quote')))
         return quotes
 
     # Returns tuple (begin_timestamp: int, end_timestamp: int) that defines timestamp range for which quotest are
@@ -117,7 +122,7 @@ class JalAsset(JalDB):
                                        [(":asset_id", self._id), (":currency_id", currency_id)])
         except TypeError:
             begin = end = 0
-        return begin, end
+        return begin if begin else 0, end if end else 0   # MIN()/MAX() give NULL if there are no quotes
 
     # Returns a quote source id defined for given currency
     def quote_source(self, currency_id: int) -> int:
@@ -131,19 +136,60 @@ class JalAsset(JalDB):
 
     # Set quotations for given currency_id. Quotations is a list of {'timestamp':int, 'quote':Decimal} values
     def set_quotes(self, quotations: list, currency_id: int) -> None:
-        data = [x for x in quotations if x['timestamp'] is not None and x['quote'] is not None]  # Drop Nones
-        if data:
-            for quote in quotations:
-                _ = self._executeSQL("INSERT OR REPLACE INTO quotes (asset_id, currency_id, timestamp, quote) "
-                                     "VALUES(:asset_id, :currency_id, :timestamp, :quote)",
-                                     [(":asset_id", self._id), (":currency_id", currency_id),
-                                      (":timestamp", quote['timestamp']), (":quote", format_decimal(quote['quote']))])
-            begin = min(data, key=lambda x: x['timestamp'])['timestamp']
-            end = max(data, key=lambda x: x['timestamp'])['timestamp']
-            logging.info(self.tr("Quotations were updated: ") +
-                         f"{self.symbol(currency_id)} ({JalAsset(currency_id).symbol()}) "  
-                         f"{datetime.utcfromtimestamp(begin).strftime('%d/%m/%Y')} - "
-                         f"{datetime.utcfromtimestamp(end).strftime('%d/%m/%Y')}")
+        self.set_quotes_bulk({'timestamp': [x['timestamp'] for x in quotations],
+                              'quote': [x['quote'] for x in quotations]}, currency_id)
+
+    # Stores quotations for given currency_id with one batched query in a single transaction. 'data' is either
+    # - pandas DataFrame with DatetimeIndex and quotes in the first column (as returned by QuoteDownloader data loaders)
+    # - DataFrame or dictionary with 'timestamp' and 'quote' columns (quotes may be Decimal, str or float values)
+    # Rows with empty timestamp or quote are skipped. Returns number of stored quotations.
+    def set_quotes_bulk(self, data, currency_id: int) -> int:
+        if isinstance(data, pd.DataFrame) and isinstance(data.index, pd.DatetimeIndex):
+            # Index values are naive UTC datetimes even for timezone-aware index
+            quotes = pd.DataFrame({'timestamp': data.index.values.astype('datetime64[s]').astype('int64'),
+                                   'quote': data.iloc[:, 0].values})
+        else:
+            quotes = pd.DataFrame(data, columns=['timestamp', 'quote'])
+        quotes = quotes.dropna()
+        if quotes.empty:
+            return 0
+        fixed_point = fixed_point_storage()
+        timestamps = quotes['timestamp'].astype('int64').tolist()
+        try:
+            values = [decimal2db(x if isinstance(x, Decimal) else Decimal(str(x)), 'quote', fixed_point)
+                      for x in quotes['quote']]
+        except ValueError as e:
+            logging.error(self.tr("Quotations can't be stored: ") + f"{self.symbol(currency_id)} - {e}")
+            return 0
+        self.transaction()
+        query = self._executeSQLbatch("INSERT OR REPLACE INTO quotes (asset_id, currency_id, timestamp, quote) "
+                                      "VALUES(:asset_id, :currency_id, :timestamp, :quote)",
+                                      [(":asset_id", [self._id] * len(timestamps)),
+                                       (":currency_id", [currency_id] * len(timestamps)),
+                                       (":timestamp", timestamps), (":quote", values)])
+        if query is None:
+            self.rollback()
+            return 0
+        self.commit()
+        QuoteIndex.invalidate(self._id, currency_id)
+        logging.info(self.tr("Quotations were updated: ") +
+                     f"{self.symbol(currency_id)} ({JalAsset(currency_id).symbol()}) "
+                     f"{datetime.utcfromtimestamp(min(timestamps)).strftime('%d/%m/%Y')} - "
+                     f"{datetime.utcfromtimestamp(max(timestamps)).strftime('%d/%m/%Y')}")
+        return len(timestamps)
+
+    # Loads quotations for given currency_id from CSV file with header. The first column contains either a date
+    # in YYYY-MM-DD format (UTC) or a timestamp, the second column contains quotes. Returns number of loaded quotations.
+    def load_quotes_csv(self, filename: str, currency_id: int) -> int:
+        data = pd.read_csv(filename, dtype=str, usecols=[0, 1], skipinitialspace=True)
+        data.columns = ['timestamp', 'quote']
+        data = data.dropna()
+        if data['timestamp'].str.isdigit().all():
+            data['timestamp'] = data['timestamp'].astype('int64')
+        else:
+            dates = pd.to_datetime(data['timestamp'], format="%Y-%m-%d", utc=True)
+            data['timestamp'] = dates.values.astype('datetime64[s]').astype('int64')
+        return self.set_quotes_bulk(data, currency_id)
 
     def expiry(self):
         return self._expiry
@@ -166,6 +212,7 @@ class JalAsset(JalDB):
                     updaters[key](data[key])
                 except KeyError:  # No updater for this key is present
                     continue
+        self._invalidate()
 
     def _update_isin(self, new_isin: str) -> None:
         if self._isin:
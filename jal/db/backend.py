@@ -0,0 +1,144 @@
+import re
+import logging
+import sqlite3
+from decimal import Decimal
+from jal.db.helpers import executeSQL, executeSQLbatch, readSQL, readSQLrecord, db_connection, format_decimal
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Backends execute SQL queries for JalDB class. All of them have the same interface and return query objects that
+# support next() and lastInsertId() calls. Values are returned in the same way by all backends: NULL is returned
+# as '' and a record with one field is returned as a value of this field.
+# QtSqlBackend uses QtSql connection of the application (Setup.DB_CONNECTION) and is used by default.
+class QtSqlBackend:
+    name = "qtsql"
+
+    @staticmethod
+    def execute(sql_text, params=[], forward_only=True, commit=False):
+        return executeSQL(sql_text, params, forward_only, commit)
+
+    @staticmethod
+    def execute_batch(sql_text, params):
+        return executeSQLbatch(sql_text, params)
+
+    @staticmethod
+    def read(sql_text, params=None, named=False, check_unique=False):
+        return readSQL(sql_text, params, named, check_unique)
+
+    @staticmethod
+    def read_record(query, named=False):
+        return readSQLrecord(query, named)
+
+    @staticmethod
+    def transaction():
+        db_connection().transaction()
+
+    @staticmethod
+    def commit():
+        db_connection().commit()
+
+    @staticmethod
+    def rollback():
+        db_connection().rollback()
+
+    def close(self):
+        pass
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Wrapper of sqlite3 cursor that provides part of QSqlQuery interface used by JalDB descendants
+class Sqlite3Query:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._row = None
+
+    def next(self) -> bool:
+        self._row = self._cursor.fetchone()
+        return self._row is not None
+
+    def value(self, index):
+        value = self._row[index]
+        return '' if value is None else value
+
+    def lastInsertId(self) -> int:
+        return self._cursor.lastrowid
+
+    def numRowsAffected(self) -> int:
+        return self._cursor.rowcount
+
+    def row(self) -> sqlite3.Row:
+        return self._row
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Sqlite3Backend uses separate connection to the same DB file via python sqlite3 module. It doesn't need QtSql and
+# QApplication and avoids conversion of every value via QVariant. It is intended for bulk and headless processing.
+# Only SQL calls of JalDB and its descendants (accounts, assets, settings, statement import) are executed by backend.
+# Ledger, helpers.executeSQL()/readSQL() callers, reports and Qt models always use QtSql connection of the application.
+# Both connections have separate transactions, so changes of one of them are visible for another only after commit.
+# Ledger.rebuild() commits pending changes of the backend and works with JalDB objects via QtSql till its end.
+# Connection is in autocommit mode, i.e. transactions are controlled explicitly in the same way as for QtSql.
+class Sqlite3Backend:
+    name = "sqlite3"
+
+    def __init__(self, db_file: str):
+        sqlite3.register_adapter(Decimal, format_decimal)
+        self._connection = sqlite3.connect(db_file, isolation_level=None)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.create_function("REGEXP", 2, lambda pattern, text: re.search(pattern, text) is not None)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+
+    # params is a list of tuples (":param", value) - the same as for QtSql backend
+    def execute(self, sql_text, params=[], forward_only=True, commit=False):
+        try:
+            cursor = self._connection.execute(sql_text, {x[0][1:]: x[1] for x in params})
+        except sqlite3.Error as e:
+            logging.error(f"SQL exec: '{e}' for query '{sql_text}' with params '{params}'")
+            return None
+        if commit:
+            self.commit()
+        return Sqlite3Query(cursor)
+
+    # params is a list of tuples (":param", [value1, value2, ...]) - the same as for QtSql backend
+    def execute_batch(self, sql_text, params):
+        names = [x[0][1:] for x in params]
+        try:
+            cursor = self._connection.executemany(sql_text, [dict(zip(names, x)) for x in zip(*[x[1] for x in params])])
+        except sqlite3.Error as e:
+            logging.error(f"SQL batch exec: '{e}' for query '{sql_text}'")
+            return None
+        return Sqlite3Query(cursor)
+
+    def read(self, sql_text, params=None, named=False, check_unique=False):
+        query = self.execute(sql_text, [] if params is None else params)
+        if query is None or not query.next():
+            return None
+        result = self.read_record(query, named=named)
+        if check_unique and query.next():
+            return None  # More than one record in result when only one expected
+        return result
+
+    @staticmethod
+    def read_record(query, named=False):
+        row = query.row()
+        if named:
+            return {x: '' if row[x] is None else row[x] for x in row.keys()}
+        values = ['' if x is None else x for x in row]
+        if len(values) == 1:
+            return values[0]
+        return values if values else None
+
+    def transaction(self):
+        if not self._connection.in_transaction:
+            self._connection.execute("BEGIN")
+
+    def commit(self):
+        if self._connection.in_transaction:
+            self._connection.commit()
+
+    def rollback(self):
+        if self._connection.in_transaction:
+            self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
@@ -9,7 +9,7 @@ from tempfile import TemporaryDirectory
 import tarfile
 
 from PySide6.QtWidgets import QApplication, QFileDialog, QMessageBox
-from jal.db.helpers import db_connection
+from jal.db.helpers import close_db_connection
 
 
 # ------------------------------------------------------------------------------
@@ -125,7 +125,7 @@ class JalBackup:
         self.get_filename(False)
         if self.backup_name is None:
             return
-        db_connection().close()
+        close_db_connection()
 
         if not self.validate_backup():
             logging.error(self.tr("Wrong format of backup file"))
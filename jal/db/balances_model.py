@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from decimal import Decimal
 
 from PySide6.QtCore import Qt, Slot, QAbstractTableModel, QDate
@@ -6,14 +7,18 @@ from PySide6.QtWidgets import QHeaderView
 from jal.constants import CustomColor, PredefindedAccountType
 from jal.db.asset import JalAsset
 from jal.db.account import JalAccount
+from jal.db.holdings import JalHoldings
 from jal.db.settings import JalSettings
 
 
 class BalancesModel(QAbstractTableModel):
+    CACHE_SIZE = 32
+
     def __init__(self, parent_view):
         super().__init__(parent_view)
         self._view = parent_view
         self._data = []
+        self._balances_cache = OrderedDict()   # {(date, active_only): balances of accounts in account currencies}
         self._currency = 0
         self._currency_name = ''
         self._active_only = True
@@ -114,39 +119,55 @@ class BalancesModel(QAbstractTableModel):
     def getAccountId(self, row):
         return self._data[row]['account']
 
+    # Is called when ledger or quotes are updated (see MainWindow.updateWidgets())
     def update(self):
+        self.invalidate()
         self.calculateBalances()
 
+    @Slot()
+    def invalidate(self):
+        self._balances_cache.clear()
+
+    # Returns a list of non-zero account balances in account currencies together with rates of account currencies
+    # in base currency. Results are cached for (date, active_only) until invalidate() call
+    def accountBalances(self) -> list:
+        key = (self._date, self._active_only)
+        if key in self._balances_cache:
+            self._balances_cache.move_to_end(key)
+            return self._balances_cache[key]
+        balances = []
+        snapshot = JalHoldings(self._date, JalSettings().getValue('BaseCurrency'), active_only=self._active_only)
+        for account_id in snapshot.accounts():
+            value = snapshot.assets_value(account_id) + snapshot.money(account_id)
+            if value == Decimal('0'):
+                continue
+            account = JalAccount(account_id)
+            balances.append({
+                "account_type": account.type(),
+                "account": account.id(),
+                "account_name": account.name(),
+                "currency": account.currency(),
+                "currency_name": JalAsset(account.currency()).symbol(),
+                "balance": value,
+                "rate": snapshot.rate(account_id),
+                "unreconciled": (account.last_operation_date() - account.reconciled_at()) / 86400,
+                "active": account.is_active()
+            })
+        self._balances_cache[key] = balances
+        if len(self._balances_cache) > self.CACHE_SIZE:
+            self._balances_cache.popitem(last=False)
+        return balances
+
     # Populate table balances with data calculated for given parameters of model: _currency, _date, _active_only
+    # Account balances are taken from cache and only conversion into display currency is done for every call
     def calculateBalances(self):
+        currency_rate = JalAsset(self._currency).quote(self._date, JalSettings().getValue('BaseCurrency'))[1]
         balances = []
-        accounts = JalAccount.get_all_accounts(active_only=self._active_only)
-        for account in accounts:
-            value = value_adjusted = Decimal('0')
-            assets = account.assets_list(self._date)
-            # Calculate cross-rate between account currency and display currency
-            rate = JalAsset(account.currency()).quote(self._date, JalSettings().getValue('BaseCurrency'))[1] / \
-                   JalAsset(self._currency).quote(self._date, JalSettings().getValue('BaseCurrency'))[1]
-            for asset_data in assets:
-                asset = asset_data['asset']
-                asset_value = asset_data['amount'] * asset.quote(self._date, account.currency())[1]
-                value += asset_value
-                value_adjusted += asset_value * rate
-            money = account.get_asset_amount(self._date, account.currency())
-            value += money
-            value_adjusted += money * rate
-            if value != Decimal('0'):
-                balances.append({
-                    "account_type": account.type(),
-                    "account": account.id(),
-                    "account_name": account.name(),
-                    "currency": account.currency(),
-                    "currency_name": JalAsset(account.currency()).symbol(),
-                    "balance": value,
-                    "balance_a": value_adjusted,
-                    "unreconciled": (account.last_operation_date() - account.reconciled_at())/86400,
-                    "active": account.is_active()
-                })
+        for account_balance in self.accountBalances():
+            values = account_balance.copy()
+            # Convert with cross-rate between account currency and display currency
+            values['balance_a'] = values.pop('rate') / currency_rate * values['balance']
+            balances.append(values)
         balances = sorted(balances, key=lambda x: (x['account_type']))
         self._data = []
         field_names = ["account_type", "account", "account_name", "currency", "currency_name", "balance", "balance_a",
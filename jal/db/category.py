@@ -1,14 +1,19 @@
-from jal.db.db import JalDB
+from jal.db.db import JalDB, JalDBObject
 from jal.db.operations import IncomeSpending
 
 
-class JalCategory(JalDB):
+class JalCategory(JalDBObject):
+    _db_tables = ("categories",)
+
     def __init__(self, id: int = 0):
+        if self._cached():
+            return
         super().__init__()
         self._id = id
         self._data = self._readSQL("SELECT name FROM categories WHERE id=:category_id",
                                    [(":category_id", self._id)], named=True)
         self._name = self._data['name'] if self._data is not None else None
+        self._cache(self._data is not None)
 
     def id(self) -> int:
         return self._id
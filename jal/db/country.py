@@ -1,8 +1,12 @@
-from jal.db.db import JalDB
+from jal.db.db import JalDBObject
 
 
-class JalCountry(JalDB):
+class JalCountry(JalDBObject):
+    _db_tables = ("countries",)
+
     def __init__(self, id: int = 0, data: dict = None, search=False) -> None:
+        if self._cached():
+            return
         super().__init__()
         self._id = id
         if self._valid_data(data):
@@ -14,6 +18,7 @@ class JalCountry(JalDB):
         self._code = self._data['code'] if self._data is not None else None
         self._iso_code = self._data['iso_code'] if self._data is not None else None
         self._tax_treaty = self._data['tax_treaty'] == 1 if self._data is not None else False
+        self._cache(self._data is not None)
 
     def id(self) -> int:
         return self._id
@@ -1,13 +1,21 @@
 from typing import Union
 import os
+import re
 import logging
+from array import array
+from bisect import bisect_right
+from decimal import Decimal
 import sqlparse
 from pkg_resources import parse_version
 from PySide6.QtWidgets import QApplication, QMessageBox
 from PySide6.QtSql import QSql, QSqlDatabase
 
 from jal.constants import Setup
-from jal.db.helpers import db_connection, executeSQL, readSQL, readSQLrecord, get_dbfilename
+from jal.db.backend import QtSqlBackend
+from jal.net.web_cache import init_web_cache
+from jal.db.helpers import db_connection, executeSQL, executeSQLbatch, readSQL, readSQLrecord, get_dbfilename, \
+    fixed_point_storage, decimal2db, db2decimal, FIXED_POINT_SCALE, FIXED_POINT_TABLES, clear_query_cache, \
+    close_db_connection
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -41,6 +49,7 @@ class JalDBError:
 # ----------------------------------------------------------------------------------------------------------------------
 class JalDB:
     _tables = []
+    _backend = QtSqlBackend()
 
     def __init__(self):
         pass
@@ -49,18 +58,38 @@ class JalDB:
         return QApplication.translate("JalDB", text)
 
     # -------------------------------------------------------------------------------------------------------------------
-    # dummy calls for future replacement
+    # SQL calls are executed by backend (see jal/db/backend.py) that might be replaced with set_backend()
     @staticmethod
     def _executeSQL(sql_text, params=[], forward_only=True, commit=False):
-        return executeSQL(sql_text, params, forward_only, commit)
+        return JalDB._backend.execute(sql_text, params, forward_only, commit)
+
+    @staticmethod
+    def _executeSQLbatch(sql_text, params):
+        return JalDB._backend.execute_batch(sql_text, params)
 
     @staticmethod
     def _readSQL(sql_text, params=None, named=False, check_unique=False):
-        return readSQL(sql_text, params, named, check_unique)
+        return JalDB._backend.read(sql_text, params, named, check_unique)
 
     @staticmethod
     def _readSQLrecord(query, named=False):
-        return readSQLrecord(query, named)
+        return JalDB._backend.read_record(query, named)
+
+    # Sets backend for SQL calls of JalDB and its descendants and returns previous one.
+    # Previous backend is closed unless it is requested to be kept with close=False (to be restored later).
+    @staticmethod
+    def set_backend(backend, close=True):
+        previous = JalDB._backend
+        if backend is not previous:
+            if close:
+                previous.close()
+            JalDB._backend = backend
+            JalDBObject.clear_cache()
+        return previous
+
+    @staticmethod
+    def backend():
+        return JalDB._backend
 
     # -------------------------------------------------------------------------------------------------------------------
     # This function:
@@ -70,6 +99,7 @@ class JalDB:
     #    if schema version is invalid it will close DB
     # Returns: LedgerInitError(code == NoError(0) if db was initialized successfully)
     def init_db(self, db_path) -> JalDBError:
+        clear_query_cache()
         db = QSqlDatabase.addDatabase("QSQLITE", Setup.DB_CONNECTION)
         if not db.isValid():
             return JalDBError(JalDBError.DbDriverFailure)
@@ -78,7 +108,7 @@ class JalDB:
         db.open()
         sqlite_version = self.get_engine_version()
         if parse_version(sqlite_version) < parse_version(Setup.SQLITE_MIN_VERSION):
-            db.close()
+            close_db_connection()
             return JalDBError(JalDBError.OutdatedSqlite)
         JalDB._tables = db.tables(QSql.Tables)
         if not JalDB._tables:
@@ -88,13 +118,16 @@ class JalDB:
                 return error
         schema_version = self._readSQL("SELECT value FROM settings WHERE name='SchemaVersion'")
         if schema_version < Setup.TARGET_SCHEMA:
-            db.close()
+            close_db_connection()
             return JalDBError(JalDBError.OutdatedDbSchema)
         elif schema_version > Setup.TARGET_SCHEMA:
-            db.close()
+            close_db_connection()
             return JalDBError(JalDBError.NewerDbSchema)
         self.enable_fk(True)
         self.enable_triggers(True)
+        fixed_point_storage(refresh=True)
+        JalDBObject.clear_cache()
+        init_web_cache(db_path + Setup.WEB_CACHE_PATH)
 
         return JalDBError(JalDBError.NoError)
 
@@ -127,6 +160,80 @@ class JalDB:
         else:
             _ = executeSQL("PRAGMA foreign_keys = OFF")
 
+    # ------------------------------------------------------------------------------------------------------------------
+    # Converts decimal values of all FIXED_POINT_TABLES into scaled integers if fixed_point == True or into text
+    # otherwise. Values are converted via Decimal in order to keep them exact. Decimal columns are declared as INTEGER
+    # for scaled integers (values are converted while columns are still TEXT) and as TEXT for text values.
+    # 'FixedPointQtyMultiplier' setting keeps scale of 'remaining_qty' for on_closed_trade_delete trigger.
+    # Raises ValueError and keeps DB unchanged if some value doesn't fit into fixed point storage.
+    def set_fixed_point_storage(self, fixed_point):
+        if fixed_point == fixed_point_storage(refresh=True):
+            return
+        db = db_connection()
+        db.transaction()
+        try:
+            if not fixed_point:
+                self._set_decimal_columns_type('TEXT')
+            for table, columns in FIXED_POINT_TABLES.items():
+                rows = []
+                query = executeSQL(f"SELECT id, {', '.join(columns)} FROM {table}")
+                while query.next():
+                    row = readSQLrecord(query)
+                    rows.append([row[0]] + [None if value == '' else
+                                            decimal2db(db2decimal(value, column, not fixed_point), column, fixed_point)
+                                            for value, column in zip(row[1:], columns)])
+                if not rows:
+                    continue
+                values = [list(x) for x in zip(*rows)]
+                params = [(f":{column}", values[i + 1]) for i, column in enumerate(columns)] + [(":id", values[0])]
+                if executeSQLbatch(f"UPDATE {table} SET {', '.join([f'{x}=:{x}' for x in columns])} WHERE id=:id",
+                                   params) is None:
+                    raise ValueError(f"Failed to convert decimal values of '{table}' table")
+            if fixed_point:
+                self._set_decimal_columns_type('INTEGER')
+        except ValueError:
+            db.rollback()
+            clear_query_cache()
+            raise
+        _ = executeSQL("UPDATE settings SET value=:value WHERE name='FixedPointStorage'",
+                       [(":value", int(fixed_point))])
+        _ = executeSQL("UPDATE settings SET value=:value WHERE name='FixedPointQtyMultiplier'",
+                       [(":value", 10 ** FIXED_POINT_SCALE['remaining_qty'])])
+        db.commit()
+        clear_query_cache()
+        fixed_point_storage(refresh=True)
+
+    # Changes declared type of decimal columns of FIXED_POINT_TABLES to 'column_type'. SQLite can't do it in place,
+    # so the table is re-created with the same definition, indices and triggers. Tables with right types are skipped.
+    # Legacy mode of ALTER TABLE keeps references to the table in triggers of other tables as is during renaming.
+    def _set_decimal_columns_type(self, column_type):
+        _ = executeSQL("PRAGMA legacy_alter_table = ON")
+        try:
+            for table, columns in FIXED_POINT_TABLES.items():
+                types = {}
+                query = executeSQL(f"PRAGMA table_info({table})")
+                while query.next():
+                    column = readSQLrecord(query, named=True)
+                    types[column['name']] = column['type'].upper()
+                if all(types[x] == column_type for x in columns):
+                    continue
+                table_sql = readSQL("SELECT sql FROM sqlite_master WHERE type='table' AND name=:table",
+                                    [(":table", table)])
+                table_sql = re.sub(rf"^CREATE TABLE\s+\"?{table}\"?", f"CREATE TABLE {table}_new", table_sql)
+                for column in columns:
+                    table_sql = re.sub(rf"\b({column}\s+)(TEXT|INTEGER)\b", rf"\g<1>{column_type}", table_sql)
+                statements = [table_sql, f"INSERT INTO {table}_new SELECT * FROM {table}", f"DROP TABLE {table}",
+                              f"ALTER TABLE {table}_new RENAME TO {table}"]
+                query = executeSQL("SELECT sql FROM sqlite_master WHERE tbl_name=:table "
+                                   "AND type IN ('index', 'trigger') AND sql IS NOT NULL", [(":table", table)])
+                while query.next():
+                    statements.append(readSQLrecord(query))
+                for sql in statements:
+                    if executeSQL(sql) is None:
+                        raise ValueError(f"Failed to change type of decimal columns of '{table}' table")
+        finally:
+            _ = executeSQL("PRAGMA legacy_alter_table = OFF")
+
     # Method loads sql script into database
     def run_sql_script(self, script_file) -> JalDBError:
         try:
@@ -136,12 +243,13 @@ class JalDB:
                     clean_statement = sqlparse.format(statement, strip_comments=True)
                     if executeSQL(clean_statement, commit=False) is None:
                         _ = executeSQL("ROLLBACK")
-                        db_connection().close()
+                        close_db_connection()
                         return JalDBError(JalDBError.SQLFailure, f"FAILED: {clean_statement}")
                     else:
                         logging.debug(f"EXECUTED OK:\n{clean_statement}")
         except FileNotFoundError:
             return JalDBError(JalDBError.NoDeltaFile, script_file)
+        clear_query_cache()    # script statements are executed once and shouldn't occupy the cache
         return JalDBError(JalDBError.NoError)
 
     # updates current db schema to the latest available with help of scripts in 'updates' folder
@@ -150,23 +258,35 @@ class JalDB:
                                  QApplication.translate('DB', "Do you agree to upgrade your data to newer format?"),
                                  QMessageBox.Yes, QMessageBox.No) == QMessageBox.No:
             return JalDBError(JalDBError.OutdatedDbSchema)
-        db = db_connection()
         version = readSQL("SELECT value FROM settings WHERE name='SchemaVersion'")
         try:
             schema_version = int(version)
         except ValueError:
             return JalDBError(JalDBError.DbInitFailure)
+        fixed_point = readSQL("SELECT value FROM settings WHERE name='FixedPointStorage'")
         for step in range(schema_version, Setup.TARGET_SCHEMA):
             delta_file = db_path + Setup.UPDATES_PATH + os.sep + Setup.UPDATE_PREFIX + f"{step + 1}.sql"
             logging.info(f"Applying delta schema {step}->{step + 1} from {delta_file}")
             error = self.run_sql_script(delta_file)
             if error.code != JalDBError.NoError:
-                db.close()
+                close_db_connection()
                 return error
+        # Delta 47 converts scaled integers of older format back to text - they are converted again with checks here
+        if fixed_point and not fixed_point_storage(refresh=True):
+            try:
+                self.set_fixed_point_storage(True)
+            except ValueError as e:
+                logging.warning(f"Fixed point storage is switched off: {e}")
         return JalDBError(JalDBError.NoError)
 
+    def transaction(self):
+        JalDB._backend.transaction()
+
     def commit(self):
-        db_connection().commit()
+        JalDB._backend.commit()
+
+    def rollback(self):
+        JalDB._backend.rollback()
 
     # This method creates a db record in 'table' name that describes relevant operation.
     # 'data' is a dict that contains operation data and dict 'fields' describes it having
@@ -249,3 +369,137 @@ class JalDB:
             search_value = "'" + search_value + "'"   # Enclose string into quotes
         query_text = f"SELECT {field_name} FROM {table_name} WHERE {key_field}={search_value}"
         return JalDB._readSQL(query_text)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Base class for reference objects (accounts, assets, peers, countries, categories) that keeps process-wide identity
+# map: ClassName(id) returns the same instance for the same id until it is invalidated. Objects are put into the map
+# only by constructor without 'data' parameter and only if record was found in DB.
+# '_db_tables' of descendant class lists DB tables that define object content - map entries are invalidated
+# if data in any of these tables are modified via invalidate_table()
+class JalDBObject(JalDB):
+    _db_tables = ()
+    _identity_map = {}    # {(class, id): object}
+    _cache_hits = 0
+    _cache_misses = 0
+
+    def __new__(cls, id: int = 0, data: dict = None, *args, **kwargs):
+        if data is None and id:
+            instance = JalDBObject._identity_map.get((cls, id), None)
+            if instance is not None:
+                JalDBObject._cache_hits += 1
+                return instance
+            JalDBObject._cache_misses += 1
+        instance = super().__new__(cls)
+        instance._in_map = False
+        return instance
+
+    # Returns True if object was taken from identity map and its __init__() shouldn't read data again
+    def _cached(self) -> bool:
+        return self._in_map
+
+    # Puts object into identity map if it isn't there and 'found' is True (i.e. DB record exists)
+    def _cache(self, found: bool) -> None:
+        if not found or not self._id:
+            return
+        key = (type(self), self._id)
+        if key not in JalDBObject._identity_map:
+            JalDBObject._identity_map[key] = self
+            self._in_map = True
+
+    # Removes object from identity map - next call of ClassName(id) will read data from DB
+    def _invalidate(self) -> None:
+        JalDBObject._identity_map.pop((type(self), self._id), None)
+        self._in_map = False
+
+    # Removes all objects that depend on given DB table from identity map
+    @staticmethod
+    def invalidate_table(table: str) -> None:
+        if table == QuoteIndex.TABLE:
+            QuoteIndex.clear()
+        for key in [x for x in JalDBObject._identity_map if table in x[0]._db_tables]:
+            JalDBObject._identity_map[key]._in_map = False
+            del JalDBObject._identity_map[key]
+
+    # Removes all objects from identity map and resets counters (is called when new DB is open)
+    @staticmethod
+    def clear_cache() -> None:
+        for instance in JalDBObject._identity_map.values():
+            instance._in_map = False
+        JalDBObject._identity_map = {}
+        JalDBObject._cache_hits = JalDBObject._cache_misses = 0
+        QuoteIndex.clear()
+
+    # Returns identity map statistics as {'size', 'hits', 'misses'}
+    @staticmethod
+    def cache_stats() -> dict:
+        return {'size': len(JalDBObject._identity_map),
+                'hits': JalDBObject._cache_hits, 'misses': JalDBObject._cache_misses}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Process-wide index of quotes. Every (asset, currency) series is loaded from DB once on the first request and is kept
+# as a sorted array of timestamps with a list of Decimal quotes. Last quote at or before given time is found with
+# binary search. Series should be invalidated with invalidate() after quotes modification - it is done by
+# JalAsset.set_quotes_bulk(), JalDBObject.invalidate_table('quotes') and JalDBObject.clear_cache()
+class QuoteIndex(JalDB):
+    TABLE = "quotes"
+    _series = {}     # {(asset_id, currency_id): (array of timestamps, list of quotes)}
+    _lookups = 0
+    _loads = 0
+
+    # Returns tuple (timestamp, quote) of the last quote at or before 'timestamp' or (0, Decimal('0')) if there is none
+    @staticmethod
+    def quote(asset_id: int, currency_id: int, timestamp: int) -> tuple:
+        timestamps, quotes = QuoteIndex._get_series(int(asset_id), int(currency_id))
+        QuoteIndex._lookups += 1
+        i = bisect_right(timestamps, timestamp)
+        if i == 0:
+            return 0, Decimal('0')
+        return timestamps[i - 1], quotes[i - 1]
+
+    # Returns a list of (timestamp, quote) tuples - the same as quote() would return for every item of 'timestamps'
+    @staticmethod
+    def quotes(asset_id: int, currency_id: int, timestamps: list) -> list:
+        series_timestamps, quotes = QuoteIndex._get_series(int(asset_id), int(currency_id))
+        QuoteIndex._lookups += len(timestamps)
+        result = []
+        for timestamp in timestamps:
+            i = bisect_right(series_timestamps, timestamp)
+            result.append((series_timestamps[i - 1], quotes[i - 1]) if i else (0, Decimal('0')))
+        return result
+
+    @staticmethod
+    def _get_series(asset_id: int, currency_id: int) -> tuple:
+        series = QuoteIndex._series.get((asset_id, currency_id), None)
+        if series is None:
+            QuoteIndex._loads += 1
+            fixed_point = fixed_point_storage()
+            series = (array('q'), [])
+            query = QuoteIndex._executeSQL("SELECT timestamp, quote FROM quotes "
+                                           "WHERE asset_id=:asset_id AND currency_id=:currency_id ORDER BY timestamp",
+                                           [(":asset_id", asset_id), (":currency_id", currency_id)])
+            while query.next():
+                timestamp, quote = QuoteIndex._readSQLrecord(query)
+                series[0].append(int(timestamp))
+                series[1].append(db2decimal(quote, 'quote', fixed_point))
+            QuoteIndex._series[(asset_id, currency_id)] = series
+        return series
+
+    # Drops series of given asset (for all currencies if currency_id is None) - it will be reloaded on next request
+    @staticmethod
+    def invalidate(asset_id: int, currency_id: int = None) -> None:
+        for key in [x for x in QuoteIndex._series if x[0] == int(asset_id)]:
+            if currency_id is None or key[1] == int(currency_id):
+                del QuoteIndex._series[key]
+
+    @staticmethod
+    def clear() -> None:
+        QuoteIndex._series = {}
+        QuoteIndex._lookups = QuoteIndex._loads = 0
+
+    # Returns index statistics as {'series', 'quotes', 'lookups', 'loads'}
+    @staticmethod
+    def stats() -> dict:
+        return {'series': len(QuoteIndex._series), 'quotes': sum([len(x[0]) for x in QuoteIndex._series.values()]),
+                'lookups': QuoteIndex._lookups, 'loads': QuoteIndex._loads}
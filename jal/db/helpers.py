@@ -1,5 +1,7 @@
 import os
 import logging
+from collections import OrderedDict
+from shiboken6 import getCppPointer
 from PySide6.QtSql import QSqlDatabase, QSqlQuery
 from PySide6.QtGui import QIcon
 from jal.constants import Setup
@@ -18,6 +20,68 @@ def remove_exponent(d) -> str:
     return d.quantize(Decimal(1)) if d == d.to_integral() else d.normalize()
 
 
+# -------------------------------------------------------------------------------------------------------------------
+# Decimal values of columns below are kept in DB either as "canonical" text (default) or as integers scaled by
+# 10^FIXED_POINT_SCALE[column] if 'FixedPointStorage' setting is on. Columns are declared as INTEGER in the last case
+# in order to keep integer values as integers (TEXT column would keep them as text) and run SQL aggregates on them.
+# Scaled values should fit into 64-bit integer, i.e. quantities and quotes are limited by ~9.2e10 and money values by
+# ~9.2e12, and shouldn't have more digits than the scale gives, i.e. account precision shouldn't be above 6 and
+# quotes shouldn't have more than 8 decimal digits. decimal2db() raises ValueError for values out of these limits.
+# Prices of open trades aren't listed as they are calculated by division for transfers and corporate actions and
+# can't be kept exactly as scaled integers. They are not summed in SQL and are always stored as text.
+# 'fx_rates' table isn't listed as its quotes are copied from 'quotes' table by triggers and follow its conversion.
+FIXED_POINT_SCALE = {
+    'amount': 8, 'value': 6, 'amount_acc': 8, 'value_acc': 6,
+    'remaining_qty': 8,
+    'quote': 8
+}
+FIXED_POINT_MAX = 2 ** 63 - 1
+FIXED_POINT_TABLES = {
+    'ledger': ('amount', 'value', 'amount_acc', 'value_acc'),
+    'ledger_totals': ('amount_acc', 'value_acc'),
+    'ledger_snapshots': ('amount_acc', 'value_acc'),
+    'ledger_monthly': ('amount',),
+    'trades_opened': ('remaining_qty',),
+    'quotes': ('quote',)
+}
+_fixed_point = None    # cached value of 'FixedPointStorage' setting
+
+
+# Returns True if decimal values are stored as scaled integers. Setting value is cached and re-read if refresh=True
+def fixed_point_storage(refresh=False) -> bool:
+    global _fixed_point
+    if refresh or _fixed_point is None:
+        value = readSQL("SELECT value FROM settings WHERE name='FixedPointStorage'")
+        _fixed_point = bool(int(value)) if value else False
+    return _fixed_point
+
+
+# Returns Decimal d in the form it should be stored in DB 'column': text or scaled integer
+def decimal2db(d, column, fixed_point=None):
+    fixed_point = fixed_point_storage() if fixed_point is None else fixed_point
+    if fixed_point:
+        scaled = d.scaleb(FIXED_POINT_SCALE[column])
+        value = int(scaled)
+        if value != scaled:
+            raise ValueError(f"Value {d} has more decimal digits than fixed point storage keeps for '{column}'")
+        if abs(value) > FIXED_POINT_MAX:
+            raise ValueError(f"Value {d} is out of range of fixed point storage for '{column}'")
+        return value
+    else:
+        return format_decimal(d)
+
+
+# Returns exact Decimal for a value read from DB 'column'. None and empty values are returned as Decimal('0')
+def db2decimal(value, column, fixed_point=None) -> Decimal:
+    if value is None or value == '':
+        return Decimal('0')
+    fixed_point = fixed_point_storage() if fixed_point is None else fixed_point
+    if fixed_point:
+        return Decimal(value).scaleb(-FIXED_POINT_SCALE[column]).normalize()
+    else:
+        return Decimal(value)
+
+
 # -------------------------------------------------------------------------------------------------------------------
 # Returns absolute path to a folder from where application was started
 def get_app_path() -> str:
@@ -45,6 +109,76 @@ def db_connection():
         logging.fatal(f"DB connection '{Setup.DB_CONNECTION}' is not open")
     return db
 
+
+# Closes SQLite connection used by JAL. Cached prepared queries become invalid and are dropped
+def close_db_connection():
+    clear_query_cache()
+    db_connection().close()
+
+
+# -------------------------------------------------------------------------------------------------------------------
+# Prepared queries are kept in LRU cache with key (sql_text, forward_only) and are re-used by readSQL() and
+# executeSQLbatch(). Cache entry is (QSqlQuery, pointer to QSqlDriver) - entry is valid only for the driver that
+# prepared it. Prepared statements don't survive re-opening of DB connection, so it should be closed with
+# close_db_connection() that drops the cache. Only queries that are consumed completely by these functions are cached
+# and they are finished before return, so the cache doesn't keep active statements that may lock tables.
+# Queries of executeSQL() are given to caller for iteration and aren't cached.
+QUERY_CACHE_SIZE = 256
+_query_cache = OrderedDict()
+_query_cache_stats = {'hits': 0, 'misses': 0}
+
+
+# Returns QSqlQuery prepared for sql_text (taken from the cache if possible) or None if preparation failed
+def _prepared_query(db, sql_text, forward_only=True):
+    key = (sql_text, forward_only)
+    driver = getCppPointer(db.driver())[0]
+    entry = _query_cache.get(key, None)
+    if entry is not None and entry[1] == driver and entry[0].driver() is not None:
+        _query_cache.move_to_end(key)
+        _query_cache_stats['hits'] += 1
+        return entry[0]
+    _query_cache_stats['misses'] += 1
+    query = QSqlQuery(db)
+    query.setForwardOnly(forward_only)
+    if not query.prepare(sql_text):
+        logging.error(f"SQL prep: '{query.lastError().text()}' for query '{sql_text}'")
+        return None
+    _query_cache[key] = (query, driver)
+    _query_cache.move_to_end(key)
+    if len(_query_cache) > QUERY_CACHE_SIZE:
+        _query_cache.popitem(last=False)
+    return query
+
+
+# Binds params to the cached query and executes it (with execBatch() if batch=True). Returns query or None
+def _exec_cached_query(db, sql_text, params, batch=False):
+    query = _prepared_query(db, sql_text)
+    if query is None:
+        return None
+    for param in params:
+        query.bindValue(param[0], param[1])
+    result = query.execBatch() if batch else query.exec()
+    if not result:
+        logging.error(f"SQL exec: '{query.lastError().text()}' for query '{sql_text}' with params '{params}'")
+        query.finish()
+        return None
+    return query
+
+
+# Drops all cached queries and resets cache statistics
+def clear_query_cache():
+    for query, _driver in _query_cache.values():
+        query.finish()
+    _query_cache.clear()
+    for key in _query_cache_stats:
+        _query_cache_stats[key] = 0
+
+
+# Returns statistics of prepared queries cache usage: {'size', 'hits', 'misses'}
+def query_cache_stats() -> dict:
+    return dict(size=len(_query_cache), **_query_cache_stats)
+
+
 # -------------------------------------------------------------------------------------------------------------------
 # prepares SQL query from given sql_text
 # params_list is a list of tuples (":param", value) which are used to prepare SQL query
@@ -56,7 +190,7 @@ def executeSQL(sql_text, params=[], forward_only=True, commit=False):
     query = QSqlQuery(db)
     query.setForwardOnly(forward_only)
     if not query.prepare(sql_text):
-        logging.error(f"SQL prep: '{query.lastError().text()}' for query '{sql_text}' with params '{params}'")
+        logging.error(f"SQL prep: '{query.lastError().text()}' for query '{sql_text}'")
         return None
     for param in params:
         query.bindValue(param[0], param[1])
@@ -68,6 +202,18 @@ def executeSQL(sql_text, params=[], forward_only=True, commit=False):
     return query
 
 
+# -------------------------------------------------------------------------------------------------------------------
+# the same as executeSQL() but query is prepared once and then executed for a batch of values
+# params is a list of tuples (":param", [value1, value2, ...]) - all lists of values should have the same length
+# return value - QSqlQuery object or None if query failed. Query is taken from the cache of prepared queries
+def executeSQLbatch(sql_text, params):
+    query = _exec_cached_query(db_connection(), sql_text, params, batch=True)
+    if query is None:
+        return None
+    query.finish()   # release statement as query stays in the cache
+    return query
+
+
 # -------------------------------------------------------------------------------------------------------------------
 # the same as executeSQL() but after query execution it takes first line of query result and:
 # - returns None if no records were fetched by query
@@ -78,23 +224,16 @@ def executeSQL(sql_text, params=[], forward_only=True, commit=False):
 def readSQL(sql_text, params=None, named=False, check_unique=False):
     if params is None:
         params = []
-    query = QSqlQuery(db_connection())   # TODO reimplement via ExecuteSQL() call in order to get rid of duplicated code
-    query.setForwardOnly(True)
-    if not query.prepare(sql_text):
-        logging.error(f"SQL prep: '{query.lastError().text()}' for query '{sql_text}' | '{params}'")
-        return None
-    for param in params:
-        query.bindValue(param[0], param[1])
-    if not query.exec():
-        logging.error(f"SQL exec: '{query.lastError().text()}' for query '{sql_text}' | '{params}'")
+    query = _exec_cached_query(db_connection(), sql_text, params)
+    if query is None:
         return None
+    res = None
     if query.next():
         res = readSQLrecord(query, named=named)
         if check_unique and query.next():
-            return None  # More than one record in result when only one expected
-        return res
-    else:
-        return None
+            res = None  # More than one record in result when only one expected
+    query.finish()   # release statement as query stays in the cache
+    return res
 
 
 def readSQLrecord(query, named=False):
@@ -0,0 +1,83 @@
+from decimal import Decimal
+from jal.constants import BookAccount, FxPeriod
+from jal.db.db import JalDB
+from jal.db.helpers import db2decimal, fixed_point_storage
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Snapshot of all account positions at given timestamp. It is read by one query that takes the last ledger record for
+# every (account, asset, book account) and joins it with the last quote of the asset in account currency, with
+# the asset symbol and with the rate of account currency in base currency. Day rates from fx_rates table keep the last
+# quote of the day, so they are used for days before the snapshot day only and its own quotes are taken from quotes.
+# Accounts may be filtered by type and active flag in the same way as JalAccount.get_all_accounts() does it.
+class JalHoldings(JalDB):
+    def __init__(self, timestamp: int, base_currency: int, account_type: int = None, active_only: bool = True):
+        super().__init__()
+        self._timestamp = timestamp
+        self._accounts = {}    # {account_id: {'currency_id', 'rate', 'money', 'assets': [position]}}
+        query = self._executeSQL(
+            "WITH _last_ids AS ("
+            "SELECT MAX(l.id) AS id FROM ledger l JOIN accounts a ON a.id=l.account_id "
+            "WHERE l.timestamp<=:timestamp AND l.book_account IN (:money, :assets, :liabilities) "
+            "AND (a.type_id=:type OR :type IS NULL) AND (a.active=1 OR :active_only=0) "
+            "GROUP BY l.account_id, l.asset_id, l.book_account"
+            ") "
+            "SELECT l.account_id, a.currency_id, l.asset_id, l.book_account, l.amount_acc, l.value_acc, "
+            "CASE WHEN l.book_account=:assets THEN (SELECT q.quote FROM quotes q WHERE q.asset_id=l.asset_id "
+            "AND q.currency_id=a.currency_id AND q.timestamp<=:timestamp ORDER BY q.timestamp DESC LIMIT 1) END, "
+            "CASE WHEN l.book_account=:assets THEN (SELECT t.symbol FROM asset_tickers t WHERE t.asset_id=l.asset_id "
+            "AND t.active=1 AND t.currency_id=a.currency_id) END, "
+            "coalesce((SELECT r.quote FROM quotes r WHERE r.asset_id=a.currency_id AND r.currency_id=:base "
+            "AND r.timestamp>=:day_start AND r.timestamp<=:timestamp ORDER BY r.timestamp DESC LIMIT 1), "
+            "(SELECT r.quote FROM fx_rates r WHERE r.period=:day AND r.asset_id=a.currency_id AND r.currency_id=:base "
+            "AND r.timestamp<:day_start ORDER BY r.timestamp DESC LIMIT 1)) "
+            "FROM _last_ids d JOIN ledger l ON l.id=d.id JOIN accounts a ON a.id=l.account_id "
+            "ORDER BY l.account_id, l.asset_id",
+            [(":timestamp", timestamp), (":money", BookAccount.Money), (":assets", BookAccount.Assets),
+             (":liabilities", BookAccount.Liabilities), (":type", account_type), (":active_only", int(active_only)),
+             (":base", base_currency), (":day", FxPeriod.Day), (":day_start", timestamp - timestamp % 86400)])
+        fixed_point = fixed_point_storage()
+        while query.next():
+            account_id, currency_id, asset_id, book, amount, value, quote, symbol, rate = self._readSQLrecord(query)
+            account = self._accounts.setdefault(int(account_id), {
+                'currency_id': int(currency_id),
+                'rate': db2decimal(rate, 'quote', fixed_point),
+                'money': Decimal('0'),
+                'assets': []
+            })
+            amount = db2decimal(amount, 'amount_acc', fixed_point)
+            if book == BookAccount.Assets:
+                if amount != Decimal('0'):
+                    account['assets'].append({'asset_id': int(asset_id), 'symbol': symbol, 'amount': amount,
+                                              'value': db2decimal(value, 'value_acc', fixed_point),
+                                              'quote': db2decimal(quote, 'quote', fixed_point)})
+            elif asset_id == currency_id:   # Money and liabilities are counted in account currency only
+                account['money'] += amount
+
+    def timestamp(self) -> int:
+        return self._timestamp
+
+    # Returns a list of ids of accounts that have any ledger records before snapshot timestamp
+    def accounts(self) -> list:
+        return list(self._accounts)
+
+    # Returns account currency id
+    def currency(self, account_id: int) -> int:
+        return self._accounts[account_id]['currency_id']
+
+    # Returns rate of account currency in base currency
+    def rate(self, account_id: int) -> Decimal:
+        return self._accounts[account_id]['rate']
+
+    # Returns money amount (including debt) in account currency - the same as JalAccount.get_asset_amount() gives
+    def money(self, account_id: int) -> Decimal:
+        return self._accounts[account_id]['money'] if account_id in self._accounts else Decimal('0')
+
+    # Returns a list of non-zero asset positions of account as dictionaries
+    # {'asset_id', 'symbol', 'amount', 'value', 'quote'} where symbol and quote are given in account currency
+    def assets(self, account_id: int) -> list:
+        return self._accounts[account_id]['assets'] if account_id in self._accounts else []
+
+    # Returns total value of account assets (without money) in account currency
+    def assets_value(self, account_id: int) -> Decimal:
+        return sum([x['amount'] * x['quote'] for x in self.assets(account_id)], Decimal('0'))
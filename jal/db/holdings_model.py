@@ -7,6 +7,7 @@ from PySide6.QtWidgets import QHeaderView
 from jal.constants import CustomColor, PredefindedAccountType
 from jal.db.account import JalAccount
 from jal.db.asset import JalAsset
+from jal.db.holdings import JalHoldings
 from jal.db.settings import JalSettings
 from jal.widgets.delegates import GridLinesDelegate
 
@@ -229,42 +230,45 @@ class HoldingsModel(QAbstractItemModel):
     # Populate table 'holdings' with data calculated for given parameters of model: _currency, _date,
     def calculateHoldings(self):
         holdings = []
-        accounts = JalAccount.get_all_accounts(account_type=PredefindedAccountType.Investment)
-        for account in accounts:
+        base_currency = JalSettings().getValue('BaseCurrency')
+        snapshot = JalHoldings(self._date, base_currency, account_type=PredefindedAccountType.Investment)
+        currency_rate = JalAsset(self._currency).quote(self._date, base_currency)[1]
+        for account_id in snapshot.accounts():
+            account = JalAccount(account_id)
+            currency = JalAsset(account.currency())
+            currency_symbol = currency.symbol()
             account_holdings = []
-            assets = account.assets_list(self._date)
             # Calculate cross-rate between account currency and display currency
-            rate = JalAsset(account.currency()).quote(self._date, JalSettings().getValue('BaseCurrency'))[1] / \
-                   JalAsset(self._currency).quote(self._date, JalSettings().getValue('BaseCurrency'))[1]
-            for asset_data in assets:
-                asset = asset_data['asset']
+            rate = snapshot.rate(account_id) / currency_rate
+            for position in snapshot.assets(account_id):
+                asset = JalAsset(position['asset_id'])
                 record = {
                     "currency_id": account.currency(),
-                    "currency": JalAsset(account.currency()).symbol(),
+                    "currency": currency_symbol,
                     "account_id": account.id(),
                     "account": account.name(),
                     "asset_id": asset.id(),
                     "asset_is_currency": False,
-                    "asset": asset.symbol(currency=account.currency()),
+                    "asset": position['symbol'],
                     "asset_name": asset.name(),
                     "expiry": asset.expiry(),
-                    "qty": asset_data['amount'],
-                    "value_i": asset_data['value'],
-                    "quote": asset.quote(self._date, account.currency())[1],  # [0] is a timestamp
-                    "quote_a": rate * asset.quote(self._date, account.currency())[1]
+                    "qty": position['amount'],
+                    "value_i": position['value'],
+                    "quote": position['quote'],
+                    "quote_a": rate * position['quote']
                 }
                 account_holdings.append(record)
-            money = account.get_asset_amount(self._date, account.currency())
+            money = snapshot.money(account_id)
             if money:
                 account_holdings.append({
                     "currency_id": account.currency(),
-                    "currency": JalAsset(account.currency()).symbol(),
+                    "currency": currency_symbol,
                     "account_id": account.id(),
                     "account": account.name(),
                     "asset_id": account.currency(),
                     "asset_is_currency": True,
-                    "asset": JalAsset(account.currency()).symbol(),
-                    "asset_name": JalAsset(account.currency()).name(),
+                    "asset": currency_symbol,
+                    "asset_name": currency.name(),
                     "expiry": 0,
                     "qty": money,
                     "value_i": Decimal('0'),
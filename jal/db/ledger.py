@@ -1,12 +1,18 @@
 import logging
 import traceback
-from datetime import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from datetime import datetime, timezone
 from decimal import Decimal
 from PySide6.QtCore import Signal, QObject, QDate
 from PySide6.QtWidgets import QDialog, QMessageBox
-from jal.constants import BookAccount
-from jal.db.helpers import executeSQL, readSQL, readSQLrecord, format_decimal
+from PySide6.QtSql import QSqlDatabase
+from jal.constants import Setup, BookAccount
+from jal.db.helpers import db_connection, executeSQL, executeSQLbatch, readSQL, readSQLrecord, format_decimal, \
+    decimal2db, db2decimal, query_cache_stats, close_db_connection
 from jal.db.db import JalDB
+from jal.db.backend import QtSqlBackend
 from jal.db.account import JalAccount
 from jal.db.settings import JalSettings
 from jal.db.operations import LedgerTransaction
@@ -47,11 +53,19 @@ class RebuildDialog(QDialog, Ui_ReBuildDialog):
 # Subclasses dictionary to store last amount/value for [book, account, asset]
 # Differs from dictionary in a way that __getitem__() method uses DB-stored values for initialization
 class LedgerAmounts(dict):
+    AMOUNT_SQL = "SELECT {field} FROM ledger WHERE book_account=:book AND account_id=:account_id AND asset_id=:asset_id " \
+                 "ORDER BY id DESC LIMIT 1"
+
     def __init__(self, total_field=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if total_field is None:
             raise ValueError("Uninitialized field in LedgerAmounts")
         self.total_field = total_field
+        self.complete = False   # True if all non-zero amounts are loaded already and DB lookup isn't required
+
+    def clear(self) -> None:
+        super().clear()
+        self.complete = False
 
     def __getitem__(self, key):
         # predefined indices in key tuple
@@ -62,24 +76,223 @@ class LedgerAmounts(dict):
         try:
             return super().__getitem__(key)
         except KeyError:
-            amount = readSQL(f"SELECT {self.total_field} FROM ledger "
-                             "WHERE book_account = :book AND account_id = :account_id AND asset_id = :asset_id "
-                             "ORDER BY id DESC LIMIT 1",
+            if self.complete:
+                super().__setitem__(key, Decimal('0'))
+                return Decimal('0')
+            amount = readSQL(self.AMOUNT_SQL.format(field=self.total_field),
                              [(":book", key[BOOK]), (":account_id", key[ACCOUNT]), (":asset_id", key[ASSET])])
-            amount = Decimal(amount) if amount is not None else Decimal('0')
+            amount = db2decimal(amount, self.total_field)
             super().__setitem__(key, amount)
             return amount
 
 
+# ===================================================================================================================
+# Class keeps rows for 'ledger', 'trades_opened' and 'trades_closed' tables in memory and writes them into DB
+# in batches of 'batch_size' rows. Rows are written in the same order as they were added, so the result is the same
+# as if every row would be inserted separately. begin() and commit() define one DB transaction for all batches.
+class LedgerWriter:
+    DEFAULT_BATCH_SIZE = 5000
+    _sql = {
+        'ledger': "INSERT INTO ledger (timestamp, op_type, operation_id, book_account, asset_id, account_id, "
+                  "amount, value, amount_acc, value_acc, peer_id, category_id, tag_id) "
+                  "VALUES(:timestamp, :op_type, :operation_id, :book, :asset_id, :account_id, "
+                  ":amount, :value, :amount_acc, :value_acc, :peer_id, :category_id, :tag_id)",
+        'opened': "INSERT INTO trades_opened(timestamp, op_type, operation_id, account_id, asset_id, "
+                  "price, remaining_qty) "
+                  "VALUES(:timestamp, :op_type, :operation_id, :account_id, :asset_id, :price, :remaining_qty)",
+        'remaining': "UPDATE trades_opened SET remaining_qty=:remaining_qty WHERE id=:id",
+        'closed': "INSERT INTO trades_closed(account_id, asset_id, open_op_type, open_op_id, open_timestamp, "
+                  "open_price, close_op_type, close_op_id, close_timestamp, close_price, qty) "
+                  "VALUES(:account_id, :asset_id, :open_op_type, :open_op_id, :open_timestamp, :open_price, "
+                  ":close_op_type, :close_op_id, :close_timestamp, :close_price, :qty)",
+        'snapshot': "INSERT INTO ledger_snapshots(timestamp, book_account, account_id, asset_id, amount_acc, value_acc) "
+                    "VALUES(:timestamp, :book, :account_id, :asset_id, :amount_acc, :value_acc)"
+    }
+    _params = {
+        'ledger': [":timestamp", ":op_type", ":operation_id", ":book", ":asset_id", ":account_id", ":amount",
+                   ":value", ":amount_acc", ":value_acc", ":peer_id", ":category_id", ":tag_id"],
+        'opened': [":timestamp", ":op_type", ":operation_id", ":account_id", ":asset_id", ":price", ":remaining_qty"],
+        'remaining': [":remaining_qty", ":id"],
+        'closed': [":account_id", ":asset_id", ":open_op_type", ":open_op_id", ":open_timestamp", ":open_price",
+                   ":close_op_type", ":close_op_id", ":close_timestamp", ":close_price", ":qty"],
+        'snapshot': [":timestamp", ":book", ":account_id", ":asset_id", ":amount_acc", ":value_acc"]
+    }
+    _flush_order = ['ledger', 'opened', 'remaining', 'closed', 'snapshot']
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self._batch_size = batch_size
+        self._rows = {x: [] for x in self._flush_order}
+        self._count = 0
+
+    def set_batch_size(self, batch_size: int) -> None:
+        if batch_size < 1:
+            raise ValueError(f"Invalid ledger batch size: {batch_size}")
+        self._batch_size = batch_size
+
+    def begin(self) -> None:
+        db_connection().transaction()
+
+    # Writes buffered rows and commits transaction. Transaction is committed even if some rows failed to be written
+    def commit(self) -> None:
+        try:
+            self.flush()
+        finally:
+            db_connection().commit()
+
+    def _add(self, table, row) -> None:
+        self._rows[table].append(row)
+        self._count += 1
+        if self._count >= self._batch_size:
+            self.flush()
+
+    def add_ledger_record(self, timestamp, op_type, operation_id, book, asset_id, account_id,
+                          amount, value, amount_acc, value_acc, peer_id, category_id, tag_id) -> None:
+        self._add('ledger', (timestamp, op_type, operation_id, book, asset_id, account_id,
+                             decimal2db(amount, 'amount'), decimal2db(value, 'value'),
+                             decimal2db(amount_acc, 'amount_acc'), decimal2db(value_acc, 'value_acc'),
+                             peer_id, category_id, tag_id))
+
+    def add_open_trade(self, timestamp, op_type, operation_id, account_id, asset_id, price, qty) -> None:
+        self._add('opened', (timestamp, op_type, operation_id, account_id, asset_id,
+                             format_decimal(price), decimal2db(qty, 'remaining_qty')))
+
+    def update_open_trade(self, trade_id, remaining_qty) -> None:
+        self._add('remaining', (decimal2db(remaining_qty, 'remaining_qty'), trade_id))
+
+    def add_closed_trade(self, account_id, asset_id, open_op_type, open_op_id, open_timestamp, open_price,
+                         close_op_type, close_op_id, close_timestamp, close_price, qty) -> None:
+        self._add('closed', (account_id, asset_id, open_op_type, open_op_id, open_timestamp,
+                             format_decimal(open_price), close_op_type, close_op_id, close_timestamp,
+                             format_decimal(close_price), format_decimal(qty)))
+
+    # Adds rows that have values in DB format already. Fields should follow the order of fields in _params[table]
+    def add_records(self, table, rows) -> None:
+        for row in rows:
+            self._add(table, tuple(row))
+
+    def add_snapshot_record(self, timestamp, book, account_id, asset_id, amount_acc, value_acc) -> None:
+        self._add('snapshot', (timestamp, book, account_id, asset_id,
+                               decimal2db(amount_acc, 'amount_acc'), decimal2db(value_acc, 'value_acc')))
+
+    # Writes all buffered rows into DB. Rows are removed from buffer in any case and ValueError is raised after
+    # all tables are processed if rows of some table failed to be written
+    def flush(self) -> None:
+        failed = []
+        for table in self._flush_order:
+            rows = self._rows[table]
+            if not rows:
+                continue
+            columns = [list(x) for x in zip(*rows)]
+            if executeSQLbatch(self._sql[table], list(zip(self._params[table], columns))) is None:
+                failed.append(table)
+            self._rows[table] = []
+        self._count = 0
+        if failed:
+            raise ValueError(f"Failed to write ledger records: {', '.join(failed)}")
+
+
+# ===================================================================================================================
+# Class keeps open positions ('trades_opened' table) in memory during ledger rebuild. Positions are grouped by
+# (account_id, asset_id) key into deques sorted in FIFO order. Positions are loaded from DB once by load() and
+# all changes are written back by save() via LedgerWriter.
+class LotBook:
+    # '0' literal matches zero quantity with any storage format due to column affinity, it is used by partial index
+    LOAD_SQL = "SELECT id, timestamp, op_type, operation_id, account_id, asset_id, price, remaining_qty " \
+               "FROM trades_opened WHERE remaining_qty!='0' ORDER BY timestamp, op_type DESC, id"
+
+    def __init__(self):
+        self._lots = {}      # deque of open positions for every (account_id, asset_id)
+        self._created = []   # positions that were created after load() in order of creation
+        self._modified = []  # positions that were loaded from DB and changed after that
+
+    def clear(self) -> None:
+        self._lots = {}
+        self._created = []
+        self._modified = []
+
+    # Loads all open positions with non-zero remaining quantity from DB (only for given accounts if set)
+    def load(self, accounts=None) -> None:
+        self.clear()
+        query = executeSQL(self.LOAD_SQL)
+        while query.next():
+            lot = readSQLrecord(query, named=True)
+            if accounts is not None and lot['account_id'] not in accounts:
+                continue
+            lot['price'] = Decimal(lot['price'])
+            lot['remaining_qty'] = db2decimal(lot['remaining_qty'], 'remaining_qty')
+            lot['modified'] = False
+            self._lots.setdefault((lot['account_id'], lot['asset_id']), deque()).append(lot)
+
+    # Adds new open position. Positions are ordered by timestamp and operation type (in descending order)
+    def open(self, timestamp, op_type, operation_id, account_id, asset_id, price, qty) -> None:
+        lot = {'id': None, 'timestamp': timestamp, 'op_type': op_type, 'operation_id': operation_id,
+               'account_id': account_id, 'asset_id': asset_id, 'price': price, 'remaining_qty': qty,
+               'modified': False}
+        self._created.append(lot)
+        if qty == Decimal('0'):
+            return
+        lots = self._lots.setdefault((account_id, asset_id), deque())
+        i = len(lots)   # Usually new position goes to the end of the queue
+        while i > 0 and (lots[i - 1]['timestamp'], -lots[i - 1]['op_type']) > (timestamp, -op_type):
+            i -= 1
+        lots.insert(i, lot)
+
+    # Takes 'qty' from open positions of 'asset_id' in 'account_id' in FIFO order.
+    # Returns a list of tuples (position, matched qty)
+    def match(self, account_id, asset_id, qty) -> list:
+        matched = []
+        processed_qty = Decimal('0')
+        lots = self._lots.get((account_id, asset_id))
+        while lots and processed_qty < qty:
+            lot = lots[0]
+            deal_qty = min(lot['remaining_qty'], qty - processed_qty)
+            lot['remaining_qty'] -= deal_qty
+            if lot['id'] is not None and not lot['modified']:
+                lot['modified'] = True
+                self._modified.append(lot)
+            if lot['remaining_qty'] == Decimal('0'):
+                lots.popleft()
+            matched.append((lot, deal_qty))
+            processed_qty += deal_qty
+        return matched
+
+    # Writes changes of open positions into DB with help of given LedgerWriter
+    def save(self, writer) -> None:
+        updated, created = self.changes()
+        for lot in updated:
+            writer.update_open_trade(*lot)
+        for lot in created:
+            writer.add_open_trade(*lot)
+        self.clear()
+
+    # Returns a tuple of lists: (id, remaining_qty) for changed positions and
+    # (timestamp, op_type, operation_id, account_id, asset_id, price, remaining_qty) for new positions
+    def changes(self) -> (list, list):
+        updated = [(lot['id'], lot['remaining_qty']) for lot in self._modified]
+        created = [(lot['timestamp'], lot['op_type'], lot['operation_id'], lot['account_id'], lot['asset_id'],
+                    lot['price'], lot['remaining_qty']) for lot in self._created]
+        return updated, created
+
+
 # ===================================================================================================================
 class Ledger(QObject):
     updated = Signal()
     SILENT_REBUILD_THRESHOLD = 1000
+    # Queries that remove ledger data after the frontier before rebuild
+    CLEANUP_SQL = [
+        "DELETE FROM trades_closed WHERE close_timestamp >= :frontier",
+        "DELETE FROM ledger WHERE timestamp >= :frontier",
+        "DELETE FROM ledger_totals WHERE timestamp >= :frontier",
+        "DELETE FROM trades_opened WHERE timestamp >= :frontier",
+        "DELETE FROM ledger_snapshots WHERE timestamp > :frontier"
+    ]
 
     def __init__(self):
         QObject.__init__(self)
         self.amounts = LedgerAmounts("amount_acc")    # store last amount for [book, account, asset]
         self.values = LedgerAmounts("value_acc")      # together with corresponding value
+        self._writer = LedgerWriter()
+        self._lots = LotBook()
         self.main_window = None
         self.progress_bar = None
 
@@ -94,18 +307,29 @@ class Ledger(QObject):
             current_frontier = 0
         return current_frontier
 
+    # Returns a page of operations between 'begin' and 'end' timestamps (optionally for one account) as a list of tuples
+    # (timestamp, seq, subtype, id, op_type, account_id) ordered by the first 4 fields that are a unique key of
+    # operation_sequence. The page starts after the row with key 'after' (from the beginning if None) and contains
+    # not more than 'limit' rows (all rows if limit is 0).
     @staticmethod
-    def get_operations_sequence(begin: int, end: int, account_id: int = 0) -> list:
+    def get_operations_sequence(begin: int, end: int, account_id: int = 0, after: tuple = None, limit: int = 0) -> list:
         sequence = []
-        query_text = "SELECT op_type, id, timestamp, account_id, subtype " \
+        query_text = "SELECT timestamp, seq, subtype, id, op_type, account_id " \
                      "FROM operation_sequence WHERE timestamp>=:begin AND timestamp<=:end"
         params = [(":begin", begin), (":end", end)]
         if account_id:
             query_text += " AND account_id=:account"
             params += [(":account", account_id)]
+        if after is not None:
+            query_text += " AND (timestamp, seq, subtype, id) > (:timestamp, :seq, :subtype, :id)"
+            params += list(zip([":timestamp", ":seq", ":subtype", ":id"], after[:4]))
+        query_text += " ORDER BY timestamp, seq, subtype, id"
+        if limit:
+            query_text += " LIMIT :limit"
+            params += [(":limit", limit)]
         query = executeSQL(query_text, params, forward_only=True)
         while query.next():
-            sequence.append(readSQLrecord(query, named=True))
+            sequence.append(tuple(readSQLrecord(query)))
         return sequence
 
     # Add one more transaction to 'book' of ledger.
@@ -136,19 +360,31 @@ class Ledger(QObject):
                 (self.values[(book, operation.account_id(), asset_id)] != Decimal('0')):
             rounding_error = Decimal('0') - self.values[(book, operation.account_id(), asset_id)]
             self.values[(book, operation.account_id(), asset_id)] += rounding_error
-        _ = executeSQL("INSERT INTO ledger (timestamp, op_type, operation_id, book_account, asset_id, account_id, "
-                       "amount, value, amount_acc, value_acc, peer_id, category_id, tag_id) "
-                       "VALUES(:timestamp, :op_type, :operation_id, :book, :asset_id, :account_id, "
-                       ":amount, :value, :amount_acc, :value_acc, :peer_id, :category_id, :tag_id)",
-                       [(":timestamp", operation.timestamp()), (":op_type", operation.type()),
-                        (":operation_id", operation.oid()), (":book", book), (":asset_id", asset_id),
-                        (":account_id", operation.account_id()),
-                        (":amount", format_decimal(amount)), (":value", format_decimal(value)),
-                        (":amount_acc", format_decimal(self.amounts[(book, operation.account_id(), asset_id)])),
-                        (":value_acc", format_decimal(self.values[(book, operation.account_id(), asset_id)])),
-                        (":peer_id", peer), (":category_id", category), (":tag_id", tag)])
+        self._writer.add_ledger_record(operation.timestamp(), operation.type(), operation.oid(), book, asset_id,
+                                       operation.account_id(), amount, value,
+                                       self.amounts[(book, operation.account_id(), asset_id)],
+                                       self.values[(book, operation.account_id(), asset_id)], peer, category, tag)
         return rounding_error
 
+    # Writes all ledger records and trades that are kept in memory into DB
+    def flush(self):
+        self._writer.flush()
+
+    # Creates a new open position for 'qty' of 'asset_id' in 'account_id' opened by given operation at 'price'
+    def openTrade(self, timestamp, op_type, operation_id, account_id, asset_id, price, qty):
+        self._lots.open(timestamp, op_type, operation_id, account_id, asset_id, price, qty)
+
+    # Takes 'qty' of 'asset_id' from open positions in 'account_id' in FIFO order
+    # Returns a list of tuples (position, matched qty) where position is a dict with 'trades_opened' fields
+    def matchOpenTrades(self, account_id, asset_id, qty) -> list:
+        return self._lots.match(account_id, asset_id, qty)
+
+    # Stores a deal that matches open position (open_*) with closing operation (close_*)
+    def closeTrade(self, account_id, asset_id, open_op_type, open_op_id, open_timestamp, open_price,
+                   close_op_type, close_op_id, close_timestamp, close_price, qty):
+        self._writer.add_closed_trade(account_id, asset_id, open_op_type, open_op_id, open_timestamp, open_price,
+                                      close_op_type, close_op_id, close_timestamp, close_price, qty)
+
     # Returns Amount measured in current account currency or asset that 'book' has at current ledger frontier
     def getAmount(self, book, account_id, asset_id=None):
         if asset_id is None:
@@ -175,14 +411,226 @@ class Ledger(QObject):
             self.appendTransaction(operation, BookAccount.Liabilities, debit)
         return debit
 
+    # Returns timestamp of the first day of the month for given timestamp (or for the next month if next_month=True)
+    @staticmethod
+    def _checkpoint(timestamp: int, next_month: bool = False) -> int:
+        date = datetime.utcfromtimestamp(timestamp)
+        year, month = date.year, date.month
+        if next_month:
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())
+
+    # Loads amounts and values that ledger has just before 'frontier' in one query. It takes the last snapshot
+    # that was made before 'frontier' and applies ledger records that were made after this snapshot.
+    # Only amounts of given accounts are loaded if 'accounts' set is provided.
+    def _loadSnapshot(self, frontier, accounts=None):
+        self.amounts.clear()
+        self.values.clear()
+        query = executeSQL("WITH _snapshot AS ("
+                           "SELECT COALESCE(MAX(timestamp), 0) AS timestamp FROM ledger_snapshots "
+                           "WHERE timestamp<=:frontier"
+                           ") "
+                           "SELECT 0 AS src, book_account, account_id, asset_id, amount_acc, value_acc "
+                           "FROM ledger_snapshots WHERE timestamp=(SELECT timestamp FROM _snapshot) "
+                           "UNION ALL "
+                           "SELECT 1 AS src, book_account, account_id, asset_id, amount_acc, value_acc "
+                           "FROM ledger WHERE id IN ("
+                           "SELECT MAX(id) FROM ledger "
+                           "WHERE timestamp>=(SELECT timestamp FROM _snapshot) AND timestamp<:frontier "
+                           "GROUP BY book_account, account_id, asset_id"
+                           ") ORDER BY src", [(":frontier", frontier)])
+        while query.next():
+            _src, book, account_id, asset_id, amount, value = readSQLrecord(query)
+            if accounts is not None and account_id not in accounts:
+                continue
+            self.amounts[(book, account_id, asset_id)] = db2decimal(amount, 'amount_acc')
+            self.values[(book, account_id, asset_id)] = db2decimal(value, 'value_acc')
+        self.amounts.complete = True
+        self.values.complete = True
+
+    # Stores current non-zero amounts and values as a snapshot of ledger state before 'timestamp'
+    def _saveSnapshot(self, timestamp):
+        for key, amount in self.amounts.items():
+            value = self.values.get(key, Decimal('0'))
+            if amount != Decimal('0') or value != Decimal('0'):
+                self._writer.add_snapshot_record(timestamp, key[0], key[1], key[2], amount, value)
+
+    # Returns a list of operations from operation_sequence that happened since 'frontier'
+    @staticmethod
+    def _getSequence(frontier) -> list:
+        sequence = []
+        query = executeSQL("SELECT op_type, id, timestamp, account_id, subtype FROM operation_sequence "
+                           "WHERE timestamp >= :frontier ORDER BY timestamp, seq, subtype, id",
+                           [(":frontier", frontier)])
+        while query.next():
+            sequence.append(readSQLrecord(query, named=True))
+        return sequence
+
+    # Returns a list of timestamps where ledger snapshots should be made while 'sequence' is processed -
+    # beginning of every month where operations happened after the month of 'frontier'
+    def _getCheckpoints(self, frontier, sequence) -> list:
+        checkpoints = []
+        next_checkpoint = self._checkpoint(frontier, next_month=True)
+        for operation in sequence:
+            if operation['timestamp'] >= next_checkpoint:
+                checkpoints.append(self._checkpoint(operation['timestamp']))
+                next_checkpoint = self._checkpoint(operation['timestamp'], next_month=True)
+        return checkpoints
+
+    # Splits accounts into groups that don't depend on each other: accounts are linked only if there was a transfer
+    # between them since 'frontier'. Returns a list of sets with account ids.
+    @staticmethod
+    def _getAccountGroups(frontier, sequence) -> list:
+        parent = {}
+
+        def root(account):
+            while parent[account] != account:
+                parent[account] = parent[parent[account]]
+                account = parent[account]
+            return account
+
+        def link(account1, account2):
+            for account in (account1, account2):
+                parent.setdefault(account, account)
+            parent[root(account1)] = root(account2)
+
+        for operation in sequence:
+            link(operation['account_id'], operation['account_id'])
+        query = executeSQL("SELECT withdrawal_account, deposit_account, fee_account FROM transfers "
+                           "WHERE withdrawal_timestamp>=:frontier OR deposit_timestamp>=:frontier",
+                           [(":frontier", frontier)])
+        while query.next():
+            withdrawal_account, deposit_account, fee_account = readSQLrecord(query)
+            link(withdrawal_account, deposit_account)
+            if fee_account:
+                link(withdrawal_account, fee_account)
+        groups = {}
+        for account in parent:
+            groups.setdefault(root(account), set()).add(account)
+        groups = list(groups.values())
+        # Accounts without operations still need to be present in snapshots - put them into the first group
+        query = executeSQL("SELECT id FROM accounts")
+        while query.next():
+            account = readSQLrecord(query)
+            if groups and account not in parent:
+                groups[0].add(account)
+        return groups
+
+    # Processes 'sequence' of operations and creates ledger records for them. A ledger snapshot is stored
+    # when processing passes the next timestamp from 'checkpoints'. Returns timestamp of the last processed operation.
+    # 'operations' is a dict with preloaded data of operations (see LedgerTransaction.preload_operations())
+    def _processSequence(self, sequence, checkpoints, operations) -> int:
+        last_timestamp = 0
+        checkpoints = deque(checkpoints)
+        for i, data in enumerate(sequence):
+            last_timestamp = data['timestamp']
+            while checkpoints and last_timestamp >= checkpoints[0]:   # Keep ledger state at the beginning of month
+                self._saveSnapshot(checkpoints.popleft())
+            operation = LedgerTransaction().get_operation(data['op_type'], data['id'], data['subtype'],
+                                                          preloaded=operations.get((data['op_type'], data['id'])))
+            operation.processLedger(self)
+            if self.progress_bar is not None:
+                self.progress_bar.setValue(i + 1)
+        while checkpoints:
+            self._saveSnapshot(checkpoints.popleft())
+        return last_timestamp
+
+    # Processes operations of one account group in a separate process (see _rebuild_account_group()).
+    # New records are kept in temporary tables that shadow 'ledger', 'trades_closed' and 'ledger_snapshots' tables
+    # of the main DB for this connection. Returns a dict with all records that should be written into the main DB.
+    def _processAccountGroup(self, frontier, sequence, checkpoints, accounts) -> dict:
+        self._lots.load(accounts)
+        self._loadSnapshot(frontier, accounts)
+        for table in ['ledger', 'trades_closed', 'ledger_snapshots']:
+            _ = executeSQL(f"CREATE TEMP TABLE {table} AS SELECT * FROM main.{table} LIMIT 0")
+        # Incoming asset transfers need ledger records of withdrawals that happened before frontier
+        _ = executeSQL("INSERT INTO temp.ledger SELECT * FROM main.ledger "
+                       "WHERE book_account=:transfers AND op_type=:transfer AND operation_id IN "
+                       "(SELECT id FROM transfers WHERE withdrawal_timestamp<:frontier AND deposit_timestamp>=:frontier)",
+                       [(":transfers", BookAccount.Transfers), (":transfer", LedgerTransaction.Transfer),
+                        (":frontier", frontier)])
+        first_id = readSQL("SELECT COALESCE(MAX(rowid), 0) FROM temp.ledger")
+        error = ''
+        try:
+            operations = LedgerTransaction.preload_by_id([(x['op_type'], x['id']) for x in sequence])
+            self._processSequence(sequence, checkpoints, operations)
+        except Exception:
+            error = traceback.format_exc()
+        try:
+            self._writer.flush()
+        except ValueError:
+            error += traceback.format_exc()
+        result = {'error': error}
+        queries = {
+            'ledger': "SELECT timestamp, op_type, operation_id, book_account, asset_id, account_id, amount, value, "
+                      "amount_acc, value_acc, peer_id, category_id, tag_id FROM temp.ledger "
+                      "WHERE rowid>:first_id ORDER BY rowid",
+            'closed': "SELECT account_id, asset_id, open_op_type, open_op_id, open_timestamp, open_price, "
+                      "close_op_type, close_op_id, close_timestamp, close_price, qty FROM temp.trades_closed "
+                      "ORDER BY rowid",
+            'snapshot': "SELECT timestamp, book_account, account_id, asset_id, amount_acc, value_acc "
+                        "FROM temp.ledger_snapshots ORDER BY rowid"
+        }
+        for table in queries:
+            result[table] = []
+            query = executeSQL(queries[table], [(":first_id", first_id)] if table == 'ledger' else [])
+            while query.next():   # readSQLrecord() returns '' for NULL values that should be kept as NULL
+                result[table].append([None if x == '' else x for x in readSQLrecord(query)])
+        result['updated'], result['created'] = self._lots.changes()
+        self._lots.clear()
+        return result
+
+    # Processes every group of accounts in a separate process and stores results in DB
+    def _rebuildParallel(self, frontier, sequence, checkpoints, groups, processes) -> bool:
+        tasks = [[x for x in sequence if x['account_id'] in accounts] for accounts in groups]
+        db_file = db_connection().databaseName()
+        exception_happened = False
+        done = 0
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = pool.map(_rebuild_account_group, [db_file] * len(groups), [frontier] * len(groups), tasks,
+                               [checkpoints] * len(groups), groups)
+            for task, result in zip(tasks, results):
+                if result['error']:
+                    exception_happened = True
+                    logging.error(result['error'])
+                self._writer.add_records('ledger', result['ledger'])
+                self._writer.add_records('closed', result['closed'])
+                self._writer.add_records('snapshot', result['snapshot'])
+                for lot in result['updated']:
+                    self._writer.update_open_trade(*lot)
+                for lot in result['created']:
+                    self._writer.add_open_trade(*lot)
+                done += len(task)
+                if self.progress_bar is not None:
+                    self.progress_bar.setValue(done)
+        return exception_happened
+
     # Rebuild transaction sequence and recalculate all amounts
     # timestamp:
     # -1 - re-build from last valid operation (from ledger frontier)
     #      will asks for confirmation if we have more than SILENT_REBUILD_THRESHOLD operations require rebuild
     # 0 - re-build from scratch
     # any - re-build all operations after given timestamp
-    def rebuild(self, from_timestamp=-1, fast_and_dirty=False):
+    # batch_size - number of records that are kept in memory before they are written into DB
+    # processes - if more than 1 then operations are processed in this number of parallel processes for groups of
+    #             accounts that are independent from each other (i.e. have no transfers between them)
+    # Ledger works via QtSql connection in one transaction. If JalDB uses another backend then its pending changes are
+    # committed and JalDB objects are switched to QtSql for the time of rebuild in order to see uncommitted ledger data
+    def rebuild(self, from_timestamp=-1, fast_and_dirty=False, batch_size=LedgerWriter.DEFAULT_BATCH_SIZE,
+                processes=0):
+        if JalDB.backend().name == QtSqlBackend.name:
+            self._rebuild(from_timestamp, fast_and_dirty, batch_size, processes)
+            return
+        JalDB().commit()
+        backend = JalDB.set_backend(QtSqlBackend(), close=False)
+        try:
+            self._rebuild(from_timestamp, fast_and_dirty, batch_size, processes)
+        finally:
+            JalDB.set_backend(backend, close=False)
+
+    def _rebuild(self, from_timestamp, fast_and_dirty, batch_size, processes):
         exception_happened = False
+        self._writer.set_batch_size(batch_size)
         last_timestamp = 0
         self.amounts.clear()
         self.values.clear()
@@ -209,28 +657,36 @@ class Ledger(QObject):
         logging.info(self.tr("Re-building ledger since: ") +
                      f"{datetime.utcfromtimestamp(frontier).strftime('%d/%m/%Y %H:%M:%S')}")
         start_time = datetime.now()
-        _ = executeSQL("DELETE FROM trades_closed WHERE close_timestamp >= :frontier", [(":frontier", frontier)])
-        _ = executeSQL("DELETE FROM ledger WHERE timestamp >= :frontier", [(":frontier", frontier)])
-        _ = executeSQL("DELETE FROM ledger_totals WHERE timestamp >= :frontier", [(":frontier", frontier)])
-        _ = executeSQL("DELETE FROM trades_opened WHERE timestamp >= :frontier", [(":frontier", frontier)])
+        cache_stats = query_cache_stats()
+        for sql in self.CLEANUP_SQL:
+            _ = executeSQL(sql, [(":frontier", frontier)])
 
         JalDB().enable_triggers(False)
         if fast_and_dirty:  # For 30k operations difference of execution time is - with 0:02:41 / without 0:11:44
             JalDB().set_synchronous(False)
+        self._writer.begin()
         try:
-            query = executeSQL("SELECT op_type, id, timestamp, account_id, subtype FROM operation_sequence "
-                               "WHERE timestamp >= :frontier", [(":frontier", frontier)])
-            while query.next():
-                data = readSQLrecord(query, named=True)
-                last_timestamp = data['timestamp']
-                operation = LedgerTransaction().get_operation(data['op_type'], data['id'], data['subtype'])
-                operation.processLedger(self)
-                if self.progress_bar is not None:
-                    self.progress_bar.setValue(query.at())
+            sequence = self._getSequence(frontier)
+            checkpoints = self._getCheckpoints(frontier, sequence)
+            groups = self._getAccountGroups(frontier, sequence) if processes > 1 else []
+            if len(groups) > 1:
+                exception_happened = self._rebuildParallel(frontier, sequence, checkpoints, groups, processes)
+                last_timestamp = sequence[-1]['timestamp']
+            else:
+                self._lots.load()
+                self._loadSnapshot(frontier)
+                last_timestamp = self._processSequence(sequence, checkpoints,
+                                                       LedgerTransaction.preload_operations(frontier))
         except Exception as e:
             exception_happened = True
             logging.error(f"{traceback.format_exc()}")
         finally:
+            try:
+                self._lots.save(self._writer)
+                self._writer.commit()
+            except ValueError:
+                exception_happened = True
+                logging.error(f"{traceback.format_exc()}")
             if fast_and_dirty:
                 JalDB().set_synchronous(True)
             JalDB().enable_triggers(True)
@@ -244,6 +700,14 @@ class Ledger(QObject):
                        "WHERE id IN ("
                        "SELECT MAX(id) FROM ledger WHERE timestamp >= :frontier "
                        "GROUP BY op_type, operation_id, book_account, account_id, asset_id)", [(":frontier", frontier)])
+        # Fill monthly sums of ledger records for months that were rebuilt (i.e. starting from the month of frontier)
+        month = self._checkpoint(frontier)
+        _ = executeSQL("DELETE FROM ledger_monthly WHERE month >= :month", [(":month", month)])
+        _ = executeSQL("INSERT INTO ledger_monthly (month, account_id, book_account, category_id, asset_id, amount) "
+                       "SELECT CAST(strftime('%s', date(timestamp, 'unixepoch', 'start of month')) AS INTEGER) AS m, "
+                       "account_id, book_account, coalesce(category_id, 0) AS category, asset_id, SUM(amount) "
+                       "FROM ledger WHERE timestamp >= :month AND NOT asset_id IS NULL "
+                       "GROUP BY m, account_id, book_account, category, asset_id", [(":month", month)])
         JalSettings().setValue('RebuildDB', 0)
         if exception_happened:
             logging.error(self.tr("Exception happened. Ledger is incomplete. Please correct errors listed in log"))
@@ -251,6 +715,8 @@ class Ledger(QObject):
             logging.info(self.tr("Ledger is complete. Elapsed time: ") + f"{datetime.now() - start_time}" +
                          self.tr(", new frontier: ") +
                          f"{datetime.utcfromtimestamp(last_timestamp).strftime('%d/%m/%Y %H:%M:%S')}")
+        cache_stats = {x: y - cache_stats[x] for x, y in query_cache_stats().items() if x != 'size'}
+        logging.info(self.tr("Prepared queries cache hits: ") + f"{cache_stats['hits']}/{sum(cache_stats.values())}")
 
         self.updated.emit()
 
@@ -259,3 +725,17 @@ class Ledger(QObject):
         if rebuild_dialog.exec():
             self.rebuild(from_timestamp=rebuild_dialog.getTimestamp(),
                          fast_and_dirty=rebuild_dialog.isFastAndDirty())
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Entry point for a separate process that processes operations of one group of accounts during parallel rebuild.
+# It opens its own connection to 'db_file' and returns records created by Ledger._processAccountGroup()
+def _rebuild_account_group(db_file, frontier, sequence, checkpoints, accounts) -> dict:
+    db = QSqlDatabase.addDatabase("QSQLITE", Setup.DB_CONNECTION)
+    db.setDatabaseName(db_file)
+    if not db.open():
+        return {'error': f"Failed to open DB '{db_file}': {db.lastError().text()}", 'ledger': [], 'closed': [],
+                'snapshot': [], 'updated': [], 'created': []}
+    result = Ledger()._processAccountGroup(frontier, sequence, checkpoints, accounts)
+    close_db_connection()
+    return result
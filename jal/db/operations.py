@@ -1,8 +1,9 @@
+import json
 from datetime import datetime
 from decimal import Decimal
 from PySide6.QtWidgets import QApplication
 from jal.constants import BookAccount, CustomColor, PredefinedPeer, PredefinedCategory, PredefinedAsset
-from jal.db.helpers import readSQL, executeSQL, readSQLrecord, format_decimal
+from jal.db.helpers import readSQL, executeSQL, readSQLrecord, db2decimal, fixed_point_storage
 from jal.db.db import JalDB
 import jal.db.account
 from jal.db.asset import JalAsset
@@ -19,6 +20,14 @@ class LedgerTransaction:
     CorporateAction = 5
     _db_table = ''   # Table where operation is stored in DB
     _db_fields = {}
+    _db_alias = ''   # Alias of operation table in _db_select
+    _db_select = ''  # Fields and tables that are used to read operation data from DB
+    _db_since = ''   # Condition to select all operations that should be processed since :timestamp
+    _db_params = []  # Additional parameters for _db_select
+    # Running totals of given operations. Keys are bound as one JSON array of [operation_type, operation_id] pairs
+    TOTALS_SQL = "SELECT op_type, operation_id, book_account, account_id, asset_id, amount_acc FROM ledger_totals " \
+                 "WHERE book_account IN (:money, :liabilities, :assets) AND (op_type, operation_id) IN " \
+                 "(SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(:keys))"
 
     def __init__(self, operation_data=None):
         if type(operation_data) == dict:
@@ -39,6 +48,7 @@ class LedgerTransaction:
         self._asset = None
         self._number = ''
         self._reconciled = False
+        self._totals = None    # {(book, account_id, asset_id): amount} from ledger_totals if they were preloaded
 
     def tr(self, text):
         return QApplication.translate("LedgerTransaction", text)
@@ -46,21 +56,109 @@ class LedgerTransaction:
     def dump(self):
         return str(self._data)
 
+    # preloaded - operation data that was loaded by preload_operations() or None to read it from DB
     @staticmethod
-    def get_operation(operation_type, operation_id, display_type=None):
+    def get_operation(operation_type, operation_id, display_type=None, preloaded=None):
         if operation_type == LedgerTransaction.IncomeSpending:
-            return IncomeSpending(operation_id)
+            return IncomeSpending(operation_id, preloaded=preloaded)
         elif operation_type == LedgerTransaction.Dividend:
-            return Dividend(operation_id)
+            return Dividend(operation_id, preloaded=preloaded)
         elif operation_type == LedgerTransaction.Trade:
-            return Trade(operation_id)
+            return Trade(operation_id, preloaded=preloaded)
         elif operation_type == LedgerTransaction.Transfer:
-            return Transfer(operation_id, display_type)
+            return Transfer(operation_id, display_type, preloaded=preloaded)
         elif operation_type == LedgerTransaction.CorporateAction:
-            return CorporateAction(operation_id)
+            return CorporateAction(operation_id, preloaded=preloaded)
         else:
             raise ValueError(f"An attempt to select unknown operation type: {operation_type}")
 
+    # Returns a list of (operation_type, operation_class) for all operation types
+    @staticmethod
+    def _operation_classes() -> list:
+        return [(LedgerTransaction.IncomeSpending, IncomeSpending),
+                (LedgerTransaction.Dividend, Dividend),
+                (LedgerTransaction.Trade, Trade),
+                (LedgerTransaction.Transfer, Transfer),
+                (LedgerTransaction.CorporateAction, CorporateAction)]
+
+    # Reads data of all operations that should be processed since 'timestamp' with one query per operation table
+    # Returns a dict {(operation_type, operation_id): data} where data should be passed to get_operation()
+    @staticmethod
+    def preload_operations(timestamp: int) -> dict:
+        preloaded = {}
+        for operation_type, operation_class in LedgerTransaction._operation_classes():
+            for oid, data in operation_class._preload(timestamp).items():
+                preloaded[(operation_type, oid)] = data
+        return preloaded
+
+    # Reads data of operations given by list of (operation_type, operation_id) with one query per operation table
+    # Returns a dict {(operation_type, operation_id): data} in the same way as preload_operations() does
+    # If 'totals' is True then running totals of operations are read from ledger_totals and added to data also
+    @staticmethod
+    def preload_by_id(operations: list, totals: bool = False) -> dict:
+        preloaded = {}
+        for operation_type, operation_class in LedgerTransaction._operation_classes():
+            ids = {oid for otype, oid in operations if otype == operation_type}
+            if not ids:
+                continue
+            for oid, data in operation_class._preload(ids=sorted(ids)).items():
+                preloaded[(operation_type, oid)] = data
+        if totals:
+            ledger_totals = LedgerTransaction.preload_totals(list(preloaded))
+            for key, data in preloaded.items():
+                data['totals'] = ledger_totals.get(key, {})
+        return preloaded
+
+    # Reads running totals of money, liabilities and assets for operations given by list of
+    # (operation_type, operation_id) from ledger_totals with one query. Keys are bound as a parameter (see TOTALS_SQL)
+    # Returns a dict {(operation_type, operation_id): {(book, account_id, asset_id): amount}}
+    @staticmethod
+    def preload_totals(operations: list) -> dict:
+        totals = {}
+        if not operations:
+            return totals
+        keys = json.dumps([[int(otype), int(oid)] for otype, oid in operations])
+        query = executeSQL(LedgerTransaction.TOTALS_SQL,
+                           [(":money", BookAccount.Money), (":liabilities", BookAccount.Liabilities),
+                            (":assets", BookAccount.Assets), (":keys", keys)])
+        fixed_point = fixed_point_storage()
+        while query.next():
+            otype, oid, book, account_id, asset_id, amount = readSQLrecord(query)
+            totals.setdefault((otype, oid), {})[(book, account_id, asset_id)] = \
+                db2decimal(amount, 'amount_acc', fixed_point)
+        return totals
+
+    # Returns a dict {operation_id: {'data': operation data}} for operations of this class since 'timestamp'
+    # or for operations with given 'ids' if they are provided
+    @classmethod
+    def _preload(cls, timestamp: int = 0, ids: list = None) -> dict:
+        preloaded = {}
+        condition, params = cls._preload_condition(timestamp, ids)
+        query = executeSQL(f"SELECT {cls._db_alias}.id AS oid, {cls._db_select} WHERE {condition}",
+                           params + cls._db_params)
+        while query.next():
+            data = readSQLrecord(query, named=True)
+            preloaded[data.pop('oid')] = {'data': data}
+        return preloaded
+
+    # Returns (SQL condition, parameters) to select operations of this class for _preload()
+    # Ids are bound as one JSON array parameter in order to keep SQL text the same for any list of ids
+    @classmethod
+    def _preload_condition(cls, timestamp: int, ids: list) -> tuple:
+        if ids is None:
+            return cls._db_since, [(":timestamp", timestamp)]
+        return f"{cls._db_alias}.id IN (SELECT value FROM json_each(:ids))", \
+            [(":ids", json.dumps([int(x) for x in ids]))]
+
+    # Returns operation data from 'preloaded' dict or reads it from DB if 'preloaded' is None
+    # Keeps preloaded ledger totals of operation if they are present
+    def _read_data(self, preloaded):
+        if preloaded is not None:
+            self._totals = preloaded.get('totals')
+            return preloaded['data']
+        return readSQL(f"SELECT {self._db_select} WHERE {self._db_alias}.id=:oid",
+                       [(":oid", self._oid)] + self._db_params, named=True)
+
     @staticmethod
     def create_new(operation_type, operation_data):
         if operation_type == LedgerTransaction.IncomeSpending:
@@ -110,70 +208,51 @@ class LedgerTransaction:
     def view_rows(self) -> int:
         return self._view_rows
 
+    # Returns money amount (including debt) on account after operation
     def _money_total(self, account_id) -> Decimal:
+        if self._totals is not None:
+            return sum([amount for (book, account, _asset), amount in self._totals.items()
+                        if account == account_id and book in (BookAccount.Money, BookAccount.Liabilities)], Decimal('0'))
         money = readSQL("SELECT amount_acc FROM ledger_totals WHERE op_type=:op_type AND operation_id=:oid AND "
                         "account_id = :account_id AND book_account=:book",
                         [(":op_type", self._otype), (":oid", self._oid),
                          (":account_id", account_id), (":book", BookAccount.Money)])
-        money = Decimal('0') if money is None else Decimal(money)
+        money = db2decimal(money, 'amount_acc')
         debt = readSQL("SELECT amount_acc FROM ledger_totals WHERE op_type=:op_type AND operation_id=:oid AND "
                        "account_id = :account_id AND book_account=:book",
                        [(":op_type", self._otype), (":oid", self._oid),
                         (":account_id", account_id), (":book", BookAccount.Liabilities)])
-        debt = Decimal('0') if debt is None else Decimal(debt)
+        debt = db2decimal(debt, 'amount_acc')
         return money + debt
 
+    # Returns quantity of asset on account after operation
     def _asset_total(self, account_id, asset_id) -> Decimal:
+        if self._totals is not None:
+            return self._totals.get((BookAccount.Assets, account_id, asset_id), Decimal('0'))
         amount = readSQL("SELECT amount_acc FROM ledger_totals WHERE op_type=:op_type AND operation_id=:oid AND "
-                         "account_id = :account_id AND asset_id AND book_account=:book",
+                         "account_id = :account_id AND asset_id=:asset_id AND book_account=:book",
                          [(":op_type", self._otype), (":oid", self._oid), (":account_id", account_id),
                           (":asset_id", asset_id), (":book", BookAccount.Assets)])
-        amount = Decimal('0') if amount is None else Decimal(amount)
-        return amount
+        return db2decimal(amount, 'amount_acc')
 
-    # Performs FIFO deals match in ledger: takes current open positions from 'open_trades' table and converts
-    # them into deals in 'deals' table while supplied qty is enough.
+    # Performs FIFO deals match in ledger: takes current open positions kept by ledger and converts
+    # them into deals in 'trades_closed' table while supplied qty is enough.
     # deal_sign = +1 if closing deal is Buy operation and -1 if it is Sell operation.
     # qty - quantity of asset that closes previous open positions
     # price is None if we process corporate action or transfer where we keep initial value and don't have profit or loss
     # Returns total qty, value of deals created.
-    def _close_deals_fifo(self, deal_sign, qty, price):
+    def _close_deals_fifo(self, ledger, deal_sign, qty, price):
         processed_qty = Decimal('0')
         processed_value = Decimal('0')
-        # Get a list of all previous not matched trades or corporate actions
-        query = executeSQL("SELECT timestamp, op_type, operation_id, account_id, asset_id, price, remaining_qty "
-                           "FROM trades_opened "
-                           "WHERE account_id=:account_id AND asset_id=:asset_id AND remaining_qty!=:zero "
-                           "ORDER BY timestamp, op_type DESC",
-                           [(":account_id", self._account.id()), (":asset_id", self._asset.id()),
-                            (":zero", format_decimal(Decimal('0')))])
-        while query.next():
-            opening_trade = readSQLrecord(query, named=True)
-            next_deal_qty = Decimal(opening_trade['remaining_qty'])
-            if (processed_qty + next_deal_qty) > qty:  # We can't close all trades with current operation
-                next_deal_qty = qty - processed_qty    # If it happens - just process the remainder of the trade
-            remaining_qty = Decimal(opening_trade['remaining_qty']) - next_deal_qty
-            _ = executeSQL("UPDATE trades_opened SET remaining_qty=:new_remaining_qty "
-                           "WHERE op_type=:op_type AND operation_id=:id AND asset_id=:asset_id",
-                           [(":new_remaining_qty", format_decimal(remaining_qty)), (":asset_id", self._asset.id()),
-                            (":op_type", opening_trade['op_type']), (":id", opening_trade['operation_id'])])
-            open_price = Decimal(opening_trade['price'])
-            close_price = Decimal(opening_trade['price']) if price is None else price
-            _ = executeSQL(
-                "INSERT INTO trades_closed(account_id, asset_id, open_op_type, open_op_id, open_timestamp, open_price, "
-                "close_op_type, close_op_id, close_timestamp, close_price, qty) "
-                "VALUES(:account_id, :asset_id, :open_op_type, :open_op_id, :open_timestamp, :open_price, "
-                ":close_op_type, :close_op_id, :close_timestamp, :close_price, :qty)",
-                [(":account_id", self._account.id()), (":asset_id", self._asset.id()),
-                 (":open_op_type", opening_trade['op_type']), (":open_op_id", opening_trade['operation_id']),
-                 (":open_timestamp", opening_trade['timestamp']), (":open_price", format_decimal(open_price)),
-                 (":close_op_type", self._otype), (":close_op_id", self._oid),
-                 (":close_timestamp", self._timestamp), (":close_price", format_decimal(close_price)),
-                 (":qty", format_decimal((-deal_sign) * next_deal_qty))])
-            processed_qty += next_deal_qty
-            processed_value += (next_deal_qty * open_price)
-            if processed_qty == qty:
-                break
+        # Match previous not matched trades or corporate actions
+        for opening_trade, deal_qty in ledger.matchOpenTrades(self._account.id(), self._asset.id(), qty):
+            open_price = opening_trade['price']
+            close_price = open_price if price is None else price
+            ledger.closeTrade(self._account.id(), self._asset.id(), opening_trade['op_type'],
+                              opening_trade['operation_id'], opening_trade['timestamp'], open_price,
+                              self._otype, self._oid, self._timestamp, close_price, (-deal_sign) * deal_qty)
+            processed_qty += deal_qty
+            processed_value += (deal_qty * open_price)
         return processed_qty, processed_value
 
     def id(self):
@@ -262,14 +341,18 @@ class IncomeSpending(LedgerTransaction):
             }
         }
     }
-
-    def __init__(self, operation_id=None):
+    _db_alias = "a"
+    _db_select = "a.timestamp, a.account_id, a.peer_id, p.name AS peer, a.alt_currency_id AS currency " \
+                 "FROM actions AS a LEFT JOIN agents AS p ON a.peer_id = p.id"
+    _db_since = "a.timestamp>=:timestamp"
+    _details_select = "d.category_id, c.name AS category, d.tag_id, t.tag, d.amount, d.amount_alt, d.note " \
+                      "FROM action_details AS d " \
+                      "LEFT JOIN categories AS c ON c.id=d.category_id LEFT JOIN tags AS t ON t.id=d.tag_id"
+
+    def __init__(self, operation_id=None, preloaded=None):
         super().__init__(operation_id)
         self._otype = LedgerTransaction.IncomeSpending
-        self._data = readSQL("SELECT a.timestamp, a.account_id, a.peer_id, p.name AS peer, "
-                             "a.alt_currency_id AS currency FROM actions AS a "
-                             "LEFT JOIN agents AS p ON a.peer_id = p.id WHERE a.id=:oid",
-                             [(":oid", self._oid)], named=True)
+        self._data = self._read_data(preloaded)
         self._timestamp = self._data['timestamp']
         self._account = jal.db.account.JalAccount(self._data['account_id'])
         self._account_name = self._account.name()
@@ -278,14 +361,13 @@ class IncomeSpending(LedgerTransaction):
         self._peer_id = self._data['peer_id']
         self._peer = self._data['peer']
         self._currency = self._data['currency']
-        details_query = executeSQL("SELECT d.category_id, c.name AS category, d.tag_id, t.tag, "
-                                   "d.amount, d.amount_alt, d.note FROM action_details AS d "
-                                   "LEFT JOIN categories AS c ON c.id=d.category_id "
-                                   "LEFT JOIN tags AS t ON t.id=d.tag_id "
-                                   "WHERE d.pid= :pid", [(":pid", self._oid)])
-        self._details = []
-        while details_query.next():
-            self._details.append(readSQLrecord(details_query, named=True))
+        if preloaded is None:
+            details_query = executeSQL(f"SELECT {self._details_select} WHERE d.pid= :pid", [(":pid", self._oid)])
+            self._details = []
+            while details_query.next():
+                self._details.append(readSQLrecord(details_query, named=True))
+        else:
+            self._details = preloaded['details']
         self._amount = sum(Decimal(line['amount']) for line in self._details)
         self._label, self._label_color = ('—', CustomColor.DarkRed) if self._amount < 0 else ('+', CustomColor.DarkGreen)
         if self._currency:
@@ -293,6 +375,19 @@ class IncomeSpending(LedgerTransaction):
             self._currency_name = JalAsset(self._currency).symbol()
         self._amount_alt = sum(Decimal(line['amount_alt']) for line in self._details)
 
+    @classmethod
+    def _preload(cls, timestamp: int = 0, ids: list = None) -> dict:
+        preloaded = super()._preload(timestamp, ids)
+        for operation in preloaded.values():
+            operation['details'] = []
+        condition, params = cls._preload_condition(timestamp, ids)
+        query = executeSQL(f"SELECT d.pid, {cls._details_select} "
+                           f"WHERE d.pid IN (SELECT a.id FROM actions AS a WHERE {condition}) ORDER BY d.id", params)
+        while query.next():
+            line = readSQLrecord(query, named=True)
+            preloaded[line.pop('pid')]['details'].append(line)
+        return preloaded
+
     def description(self) -> str:
         description = self._peer
         if self._currency:
@@ -368,8 +463,18 @@ class Dividend(LedgerTransaction):
         "tax": {"mandatory": False, "validation": False},
         "note": {"mandatory": False, "validation": True}
     }
-
-    def __init__(self, operation_id=None):
+    _db_alias = "d"
+    _db_select = "d.type, d.timestamp, d.ex_date, d.number, d.account_id, d.asset_id, " \
+                 "d.amount, d.tax, l.amount_acc AS t_qty, d.note AS note, c.name AS country " \
+                 "FROM dividends AS d " \
+                 "LEFT JOIN assets AS a ON d.asset_id = a.id " \
+                 "LEFT JOIN countries AS c ON a.country_id = c.id " \
+                 "LEFT JOIN ledger_totals AS l ON l.op_type=d.op_type AND l.operation_id=d.id " \
+                 "AND l.book_account = :book_assets"
+    _db_since = "d.timestamp>=:timestamp"
+    _db_params = [(":book_assets", BookAccount.Assets)]
+
+    def __init__(self, operation_id=None, preloaded=None):
         labels = {
             Dividend.Dividend: ('Δ', CustomColor.DarkGreen),
             Dividend.BondInterest: ('%', CustomColor.DarkGreen),
@@ -379,14 +484,7 @@ class Dividend(LedgerTransaction):
         super().__init__(operation_id)
         self._otype = LedgerTransaction.Dividend
         self._view_rows = 2
-        self._data = readSQL("SELECT d.type, d.timestamp, d.ex_date, d.number, d.account_id, d.asset_id, "
-                             "d.amount, d.tax, l.amount_acc AS t_qty, d.note AS note, c.name AS country "
-                             "FROM dividends AS d "
-                             "LEFT JOIN assets AS a ON d.asset_id = a.id "
-                             "LEFT JOIN countries AS c ON a.country_id = c.id "
-                             "LEFT JOIN ledger_totals AS l ON l.op_type=d.op_type AND l.operation_id=d.id "
-                             "AND l.book_account = :book_assets WHERE d.id=:oid",
-                             [(":book_assets", BookAccount.Assets), (":oid", self._oid)], named=True)
+        self._data = self._read_data(preloaded)
         self._subtype = self._data['type']
         self._label, self._label_color = labels[self._subtype]
         self._timestamp = self._data['timestamp']
@@ -530,12 +628,8 @@ class Dividend(LedgerTransaction):
         if asset_amount < Decimal('0'):
             raise NotImplemented(self.tr("Not supported action: stock dividend or vesting closes short trade.") +
                                  f" Operation: {self.dump()}")
-        _ = executeSQL(
-            "INSERT INTO trades_opened(timestamp, op_type, operation_id, account_id, asset_id, price, remaining_qty) "
-            "VALUES(:timestamp, :type, :operation_id, :account_id, :asset_id, :price, :remaining_qty)",
-            [(":timestamp", self._timestamp), (":type", self._otype), (":operation_id", self._oid),
-             (":account_id", self._account.id()), (":asset_id", self._asset.id()),
-             (":price", format_decimal(self.price())),(":remaining_qty", format_decimal(self._amount))])
+        ledger.openTrade(self._timestamp, self._otype, self._oid, self._account.id(), self._asset.id(),
+                         self.price(), self._amount)
         ledger.appendTransaction(self, BookAccount.Assets, self._amount,
                                  asset_id=self._asset.id(), value=self._amount * self.price())
         if self._tax:
@@ -559,14 +653,18 @@ class Trade(LedgerTransaction):
         "note": {"mandatory": False, "validation": False}
     }
 
+    _db_alias = "t"
+    _db_select = "t.timestamp, t.settlement, t.number, t.account_id, t.asset_id, t.qty, t.price, t.fee, t.note " \
+                 "FROM trades AS t"
+    _db_since = "t.timestamp>=:timestamp"
+
     # operation_data is either an integer to select operation from database or a dict with operation data that is used
     # to create a new operation in database and then select it
-    def __init__(self, operation_data=None):
+    def __init__(self, operation_data=None, preloaded=None):
         super().__init__(operation_data)
         self._otype = LedgerTransaction.Trade
         self._view_rows = 2
-        self._data = readSQL("SELECT t.timestamp, t.settlement, t.number, t.account_id, t.asset_id, t.qty, t.price, "
-                             "t.fee, t.note FROM trades AS t WHERE t.id=:oid", [(":oid", self._oid)], named=True)
+        self._data = self._read_data(preloaded)
         self._timestamp = self._data['timestamp']
         self._settlement = self._data['settlement']
         self._account = jal.db.account.JalAccount(self._data['account_id'])
@@ -644,7 +742,7 @@ class Trade(LedgerTransaction):
         # Get asset amount accumulated before current operation
         asset_amount = ledger.getAmount(BookAccount.Assets, self._account.id(), self._asset.id())
         if ((-deal_sign) * asset_amount) > Decimal('0'):  # Match trade if we have asset that is opposite to operation
-            processed_qty, processed_value = self._close_deals_fifo(deal_sign, qty, self._price)
+            processed_qty, processed_value = self._close_deals_fifo(ledger, deal_sign, qty, self._price)
         if deal_sign > 0:
             credit_value = ledger.takeCredit(self, self._account.id(), trade_value)
         else:
@@ -659,12 +757,8 @@ class Trade(LedgerTransaction):
                                      deal_sign * ((self._price * processed_qty) - processed_value + rounding_error),
                                      category=PredefinedCategory.Profit, peer=self._broker)
         if processed_qty < qty:  # We have a reminder that opens a new position
-            _ = executeSQL(
-                "INSERT INTO trades_opened(timestamp, op_type, operation_id, account_id, asset_id, price, remaining_qty) "
-                "VALUES(:timestamp, :type, :operation_id, :account_id, :asset_id, :price, :remaining_qty)",
-                [(":timestamp", self._timestamp), (":type", self._otype), (":operation_id", self._oid),
-                 (":account_id", self._account.id()), (":asset_id", self._asset.id()),
-                 (":price", format_decimal(self._price)), (":remaining_qty", format_decimal(qty - processed_qty))])
+            ledger.openTrade(self._timestamp, self._otype, self._oid, self._account.id(), self._asset.id(),
+                             self._price, qty - processed_qty)
             ledger.appendTransaction(self, BookAccount.Assets, deal_sign * (qty - processed_qty),
                                      asset_id=self._asset.id(), value=deal_sign * (qty - processed_qty) * self._price)
         if self._fee:
@@ -690,8 +784,12 @@ class Transfer(LedgerTransaction):
         "asset": {"mandatory": False, "validation": True, "default": None},
         "note": {"mandatory": False, "validation": False}
     }
+    _db_alias = "t"
+    _db_select = "t.withdrawal_timestamp, t.withdrawal_account, t.withdrawal, t.deposit_timestamp, " \
+                 "t.deposit_account, t.deposit, t.fee_account, t.fee, t.asset, t.note FROM transfers AS t"
+    _db_since = "(t.withdrawal_timestamp>=:timestamp OR t.deposit_timestamp>=:timestamp)"
 
-    def __init__(self, operation_id=None, display_type=None):
+    def __init__(self, operation_id=None, display_type=None, preloaded=None):
         labels = {
             Transfer.Outgoing: ('<', CustomColor.DarkBlue),
             Transfer.Incoming: ('>', CustomColor.DarkBlue),
@@ -700,9 +798,7 @@ class Transfer(LedgerTransaction):
         super().__init__(operation_id)
         self._otype = LedgerTransaction.Transfer
         self._display_type = display_type
-        self._data = readSQL("SELECT t.withdrawal_timestamp, t.withdrawal_account, t.withdrawal, t.deposit_timestamp, "
-                             "t.deposit_account, t.deposit, t.fee_account, t.fee, t.asset, t.note "
-                             "FROM transfers AS t WHERE t.id=:oid", [(":oid", self._oid)], named=True)
+        self._data = self._read_data(preloaded)
         self._withdrawal_account = jal.db.account.JalAccount(self._data['withdrawal_account'])
         self._withdrawal_account_name = self._withdrawal_account.name()
         self._withdrawal_timestamp = self._data['withdrawal_timestamp']
@@ -860,7 +956,7 @@ class Transfer(LedgerTransaction):
                 raise ValueError(self.tr("Asset amount is not enough for asset transfer processing. Date: ")
                                  + f"{datetime.utcfromtimestamp(self._timestamp).strftime('%d/%m/%Y %H:%M:%S')}, "
                                  + f"Asset amount: {asset_amount}, Operation: {self.dump()}")
-            processed_qty, processed_value = self._close_deals_fifo(Decimal('-1.0'), self._withdrawal, None)
+            processed_qty, processed_value = self._close_deals_fifo(ledger, Decimal('-1.0'), self._withdrawal, None)
             if processed_qty < self._withdrawal:
                 raise ValueError(self.tr("Processed asset amount is less than transfer amount. Date: ")
                                  + f"{datetime.utcfromtimestamp(self._timestamp).strftime('%d/%m/%Y %H:%M:%S')}, "
@@ -876,6 +972,7 @@ class Transfer(LedgerTransaction):
                                      asset_id=self._asset.id(), value=processed_value*currency_rate)
         elif self._display_type == Transfer.Incoming:
             # get value of withdrawn asset
+            ledger.flush()
             value = readSQL("SELECT value FROM ledger WHERE "
                             "book_account=:book_transfers AND op_type=:op_type AND operation_id=:id",
                             [(":book_transfers", BookAccount.Transfers), (":op_type", self._otype), (":id", self._oid)],
@@ -883,19 +980,15 @@ class Transfer(LedgerTransaction):
             if not value:
                 raise ValueError(self.tr("Asset withdrawal not found for transfer.") + f" Operation:  {self.dump()}")
             else:
-                value = Decimal(value)
+                value = db2decimal(value, 'value')
             if self._deposit_currency == JalSettings().getValue('BaseCurrency'):
                 currency_rate = Decimal('1.0')
             else:
                 _, currency_rate = JalAsset(self._deposit_account.currency()).quote(self._deposit_timestamp,
                                                                                     JalSettings().getValue('BaseCurrency'))
             price = value * currency_rate / self._deposit
-            _ = executeSQL(
-                "INSERT INTO trades_opened(timestamp, op_type, operation_id, account_id, asset_id, price, remaining_qty) "
-                "VALUES(:timestamp, :type, :operation_id, :account_id, :asset_id, :price, :remaining_qty)",
-                [(":timestamp", self._deposit_timestamp), (":type", self._otype), (":operation_id", self._oid),
-                 (":account_id", self._deposit_account.id()), (":asset_id", self._asset.id()),
-                 (":price", format_decimal(price)), (":remaining_qty", format_decimal(self._deposit))])
+            ledger.openTrade(self._deposit_timestamp, self._otype, self._oid, self._deposit_account.id(),
+                             self._asset.id(), price, self._deposit)
             ledger.appendTransaction(self, BookAccount.Transfers, -self._deposit,
                                      asset_id=self._asset.id(), value=-value)
             ledger.appendTransaction(self, BookAccount.Assets, self._deposit,
@@ -930,8 +1023,11 @@ class CorporateAction(LedgerTransaction):
             }
         }
     }
+    _db_alias = "a"
+    _db_select = "a.type, a.timestamp, a.number, a.account_id, a.qty, a.asset_id, a.note FROM asset_actions AS a"
+    _db_since = "a.timestamp>=:timestamp"
 
-    def __init__(self, operation_id=None):
+    def __init__(self, operation_id=None, preloaded=None):
         labels = {
             CorporateAction.Merger: ('⭃', CustomColor.Black),
             CorporateAction.SpinOff: ('⎇', CustomColor.DarkGreen),
@@ -948,13 +1044,15 @@ class CorporateAction(LedgerTransaction):
         }
         super().__init__(operation_id)
         self._otype = LedgerTransaction.CorporateAction
-        self._data = readSQL("SELECT a.type, a.timestamp, a.number, a.account_id, a.qty, a.asset_id, a.note "
-                             "FROM asset_actions AS a WHERE a.id=:oid", [(":oid", self._oid)], named=True)
-        results_query = executeSQL("SELECT asset_id, qty, value_share FROM action_results WHERE action_id=:oid",
-                                   [(":oid", self._oid)])
-        self._results = []
-        while results_query.next():
-            self._results.append(readSQLrecord(results_query, named=True))
+        self._data = self._read_data(preloaded)
+        if preloaded is None:
+            results_query = executeSQL("SELECT asset_id, qty, value_share FROM action_results WHERE action_id=:oid",
+                                       [(":oid", self._oid)])
+            self._results = []
+            while results_query.next():
+                self._results.append(readSQLrecord(results_query, named=True))
+        else:
+            self._results = preloaded['results']
         self._view_rows = len(self._results)
         self._subtype = self._data['type']
         if self._subtype == CorporateAction.SpinOff or self._view_rows < 2:
@@ -970,6 +1068,20 @@ class CorporateAction(LedgerTransaction):
         self._number = self._data['number']
         self._broker = self._account.organization()
 
+    @classmethod
+    def _preload(cls, timestamp: int = 0, ids: list = None) -> dict:
+        preloaded = super()._preload(timestamp, ids)
+        for operation in preloaded.values():
+            operation['results'] = []
+        condition, params = cls._preload_condition(timestamp, ids)
+        query = executeSQL(f"SELECT action_id, asset_id, qty, value_share FROM action_results "
+                           f"WHERE action_id IN (SELECT a.id FROM asset_actions AS a WHERE {condition}) "
+                           f"ORDER BY id", params)
+        while query.next():
+            result = readSQLrecord(query, named=True)
+            preloaded[result.pop('action_id')]['results'].append(result)
+        return preloaded
+
     # Settlement returns timestamp as corporate action happens immediately in Jal
     def settlement(self) -> int:
         return self._timestamp
@@ -1061,15 +1173,12 @@ class CorporateAction(LedgerTransaction):
                              + f"{datetime.utcfromtimestamp(self._timestamp).strftime('%d/%m/%Y %H:%M:%S')}, "
                              + f"Asset amount: {asset_amount}, Operation: {self.dump()}")
         # Calculate total asset allocation after corporate action and verify it equals 100%
-        allocation = Decimal('0')
-        query = executeSQL("SELECT value_share FROM action_results WHERE action_id=:oid", [(":oid", self._oid)])
-        while query.next():
-            allocation += Decimal(readSQLrecord(query))
+        allocation = sum(Decimal(result['value_share']) for result in self._results)
         if self._subtype != CorporateAction.Delisting and allocation != Decimal('1.0'):
             raise ValueError(self.tr("Results value of corporate action doesn't match 100% of initial asset value. ")
                                      + f"Date: {datetime.utcfromtimestamp(self._timestamp).strftime('%d/%m/%Y %H:%M:%S')}, "
                                      + f"Asset amount: {asset_amount}, Operation: {self.dump()}")
-        processed_qty, processed_value = self._close_deals_fifo(Decimal('-1.0'), self._qty, None)
+        processed_qty, processed_value = self._close_deals_fifo(ledger, Decimal('-1.0'), self._qty, None)
         # Withdraw value with old quantity of old asset
         ledger.appendTransaction(self, BookAccount.Assets, -processed_qty,
                                  asset_id=self._asset.id(), value=-processed_value)
@@ -1078,20 +1187,10 @@ class CorporateAction(LedgerTransaction):
                                      category=PredefinedCategory.Profit, peer=self._broker)
             return
         # Process assets after corporate action
-        query = executeSQL("SELECT asset_id, qty, value_share FROM action_results WHERE action_id=:oid",
-                           [(":oid", self._oid)])
-        while query.next():
-            # TODO implement type casting of result values inside readSQLrecord()
-            # Like in this function as example:
-            #   def x(cast=[float, str, Decimal]):
-            #     res = []
-            #     for i, dtype in enumerate(cast):
-            #       res.append(dtype(float(i)))
-            #     return res
-            asset_id, qty, share = readSQLrecord(query)
-            asset = JalAsset(asset_id)
-            qty = Decimal(qty)
-            share = Decimal(share)
+        for result in self._results:
+            asset = JalAsset(result['asset_id'])
+            qty = Decimal(result['qty'])
+            share = Decimal(result['value_share'])
             if asset.type() == PredefinedAsset.Money:
                 ledger.appendTransaction(self, BookAccount.Money, qty)
                 ledger.appendTransaction(self, BookAccount.Incomes, -qty,
@@ -1099,11 +1198,6 @@ class CorporateAction(LedgerTransaction):
             else:
                 value = share * processed_value
                 price = value / qty
-                _ = executeSQL(
-                    "INSERT INTO trades_opened(timestamp, op_type, operation_id, "
-                    "account_id, asset_id, price, remaining_qty) "
-                    "VALUES(:timestamp, :type, :operation_id, :account_id, :asset_id, :price, :remaining_qty)",
-                    [(":timestamp", self._timestamp), (":type", self._otype), (":operation_id", self._oid),
-                     (":account_id", self._account.id()), (":asset_id", asset.id()), (":price", format_decimal(price)),
-                     (":remaining_qty", format_decimal(qty))])
+                ledger.openTrade(self._timestamp, self._otype, self._oid, self._account.id(), asset.id(),
+                                 price, qty)
                 ledger.appendTransaction(self, BookAccount.Assets, qty, asset_id=asset.id(), value=value)
@@ -1,6 +1,7 @@
 from datetime import datetime
+from collections import OrderedDict
 from decimal import Decimal
-from PySide6.QtCore import Qt, Slot, QAbstractTableModel, QDate
+from PySide6.QtCore import Qt, Slot, QAbstractTableModel, QDate, QModelIndex
 from PySide6.QtGui import QBrush, QFont
 from PySide6.QtWidgets import QStyledItemDelegate, QHeaderView
 from jal.constants import CustomColor
@@ -8,19 +9,31 @@ from jal.db.ledger import Ledger
 from jal.db.operations import LedgerTransaction
 
 
+# Operations are materialized per row into LRU cache together with texts of their columns. When a row is missing
+# in the cache it is loaded together with following rows that view is about to show - data of these operations
+# are read with one query per operation table and their running totals with one query to ledger_totals.
+# Cache is dropped on every model reset.
+# Rows of operation_sequence are loaded page by page when view requests them via canFetchMore()/fetchMore(), every
+# next page is selected after the key of the last loaded row. Rows are kept as tuples with fields given by FIELDS.
 class OperationsModel(QAbstractTableModel):
+    CACHE_SIZE = 512      # Maximum number of rows kept in cache
+    PREFETCH_SIZE = 64    # Number of rows that are loaded together on cache miss
+    PAGE_SIZE = 256       # Number of rows that are loaded from operation_sequence at once
+    FIELDS = {'timestamp': 0, 'seq': 1, 'subtype': 2, 'id': 3, 'op_type': 4, 'account_id': 5}
+
     def __init__(self, parent_view):
         super().__init__(parent_view)
         self._columns = [" ", self.tr("Timestamp"), self.tr("Account"), self.tr("Notes"),
                          self.tr("Amount"), self.tr("Balance"), self.tr("Currency")]
         self._view = parent_view
         self._amount_delegate = None
-        self._data = []
-        self._row_count = 0
+        self._data = []           # [(timestamp, seq, subtype, id, op_type, account_id)]
+        self._fetched_all = True
         self._begin = 0
         self._end = 0
         self._account = 0
         self._text_filter = ''
+        self._cache = OrderedDict()   # {row: (operation, {column: text})}
 
         self.prepareData()
 
@@ -37,7 +50,7 @@ class OperationsModel(QAbstractTableModel):
 
     def get_operation(self, row):
         if (row >= 0) and (row < self.rowCount()):
-            return self._data[row]['op_type'], self._data[row]['id']
+            return self._data[row][self.FIELDS['op_type']], self._data[row][self.FIELDS['id']]
         else:
             return [0, 0]
 
@@ -45,11 +58,11 @@ class OperationsModel(QAbstractTableModel):
         row = index.row()
         if not index.isValid():
             return None
-        operation = LedgerTransaction().get_operation(self._data[index.row()]['op_type'],
-                                                      self._data[index.row()]['id'],
-                                                      self._data[index.row()]['subtype'])
+        operation, texts = self.cached_row(row)
         if role == Qt.DisplayRole:
-            return self.data_text(operation, index.column())
+            if index.column() not in texts:
+                texts[index.column()] = self.data_text(operation, index.column())
+            return texts[index.column()]
         if role == Qt.FontRole and index.column() == 0:
             # below line isn't related with font, it is put here to be called for each row minimal times (ideally 1)
             self._view.setRowHeight(row, self._view.verticalHeader().defaultSectionSize() * operation.view_rows())
@@ -69,7 +82,30 @@ class OperationsModel(QAbstractTableModel):
                 return int(Qt.AlignRight)
             return int(Qt.AlignLeft)
         if role == Qt.UserRole:  # return underlying data for given field extra parameter
-            return self._data[index.row()][field]
+            return self._data[index.row()][self.FIELDS[field]]
+
+    # Returns (operation, {column: text}) for given row from cache. Loads the row and following rows on cache miss
+    def cached_row(self, row):
+        try:
+            self._cache.move_to_end(row)
+            return self._cache[row]
+        except KeyError:
+            self.prefetch(row, row + self.PREFETCH_SIZE - 1)
+            return self._cache[row]
+
+    # Loads operations of rows from 'first' to 'last' that are missing in cache with one query per operation table
+    def prefetch(self, first, last):
+        rows = [x for x in range(max(first, 0), min(last + 1, len(self._data))) if x not in self._cache]
+        op_type, oid, subtype = self.FIELDS['op_type'], self.FIELDS['id'], self.FIELDS['subtype']
+        preloaded = LedgerTransaction.preload_by_id([(self._data[x][op_type], self._data[x][oid]) for x in rows],
+                                                    totals=True)
+        for row in rows:
+            key = (self._data[row][op_type], self._data[row][oid])
+            operation = LedgerTransaction.get_operation(key[0], key[1], self._data[row][subtype],
+                                                        preloaded=preloaded.get(key))
+            self._cache[row] = (operation, {})
+        while len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
 
     def data_text(self, operation, column):
         if column == 0:
@@ -143,20 +179,43 @@ class OperationsModel(QAbstractTableModel):
         idx = self._view.selectionModel().selection().indexes()
         self.prepareData()
         if idx:
-            self._view.setCurrentIndex(idx[0])
+            while idx[0].row() >= self.rowCount() and self.canFetchMore():   # selected row may be out of 1st page
+                self.fetchMore()
+            self._view.setCurrentIndex(self.index(idx[0].row(), idx[0].column()))
 
     def prepareData(self):
         self._data = []
-        if self._begin == 0 and self._end == 0:
-            self._row_count = 0
-        else:
-            self._data = Ledger.get_operations_sequence(self._begin, self._end, self._account)
+        self._cache.clear()
+        self._fetched_all = self._begin == 0 and self._end == 0
+        if not self._fetched_all:
+            self._data = self._fetchPage()
         self.modelReset.emit()
 
+    # Returns next page of rows after the last loaded row and marks model as completely loaded at the end
+    def _fetchPage(self) -> list:
+        after = self._data[-1] if self._data else None
+        page = Ledger.get_operations_sequence(self._begin, self._end, self._account, after=after, limit=self.PAGE_SIZE)
+        self._fetched_all = len(page) < self.PAGE_SIZE
+        return page
+
+    def canFetchMore(self, parent=None):
+        if parent is not None and parent.isValid():
+            return False
+        return not self._fetched_all
+
+    def fetchMore(self, parent=None):
+        if (parent is not None and parent.isValid()) or self._fetched_all:
+            return
+        page = self._fetchPage()
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self._data), len(self._data) + len(page) - 1)
+            self._data += page
+            self.endInsertRows()
+
     def deleteRows(self, rows):
         for row in rows:
             if (row >= 0) and (row < len(self._data)):
-                LedgerTransaction.get_operation(self._data[row]['op_type'], self._data[row]['id']).delete()
+                LedgerTransaction.get_operation(*self.get_operation(row)).delete()
         self.prepareData()
 
 
@@ -1,8 +1,12 @@
-from jal.db.db import JalDB
+from jal.db.db import JalDB, JalDBObject
 
 
-class JalPeer(JalDB):
+class JalPeer(JalDBObject):
+    _db_tables = ("agents",)
+
     def __init__(self, id: int = 0, data: dict = None, search=False, create=False) -> None:
+        if self._cached():
+            return
         super().__init__()
         self._id = id
         if self._valid_data(data):
@@ -15,6 +19,7 @@ class JalPeer(JalDB):
         self._data = self._readSQL("SELECT name FROM agents WHERE id=:peer_id",
                                    [(":peer_id", self._id)], named=True)
         self._name = self._data['name'] if self._data is not None else None
+        self._cache(self._data is not None)
 
     def id(self) -> int:
         return self._id
@@ -4,6 +4,7 @@ from PySide6.QtSql import QSqlTableModel, QSqlRelationalTableModel
 from PySide6.QtGui import QFont
 from PySide6.QtWidgets import QHeaderView, QMessageBox
 from jal.db.helpers import db_connection, executeSQL, readSQL
+from jal.db.db import JalDBObject
 from jal.widgets.helpers import decodeError
 
 
@@ -115,6 +116,7 @@ class AbstractReferenceListModel(QSqlRelationalTableModel):
         result = super().submitAll()
         if result:
             self._deleted_rows = []
+            JalDBObject.invalidate_table(self._table)
         else:
             error_code = self.lastError().nativeErrorCode()
             if error_code == '1299':
@@ -145,6 +147,7 @@ class AbstractReferenceListModel(QSqlRelationalTableModel):
         id = self.getId(index)
         executeSQL(f"UPDATE {self._table} SET {self._group_by}=:new_type WHERE id=:id",
                    [(":new_type", new_type), (":id", id)])
+        JalDBObject.invalidate_table(self._table)
 
     def filterBy(self, field_name, value):
         self._filter_by = field_name
@@ -238,6 +241,7 @@ class SqlTreeModel(QAbstractItemModel):
         db_connection().transaction()
         _ = executeSQL(f"UPDATE {self._table} SET {self._columns[col][0]}=:value WHERE id=:id",
                        [(":id", item_id), (":value", value)])
+        JalDBObject.invalidate_table(self._table)
         self.dataChanged.emit(index, index, Qt.DisplayRole | Qt.EditRole)
         return True
 
@@ -330,11 +334,13 @@ class SqlTreeModel(QAbstractItemModel):
 
     def submitAll(self):
         _ = executeSQL("COMMIT")
+        JalDBObject.invalidate_table(self._table)
         self.layoutChanged.emit()
         return True
 
     def revertAll(self):
         _ = executeSQL("ROLLBACK")
+        JalDBObject.invalidate_table(self._table)
         self.layoutChanged.emit()
 
     # expand all parent elements for tree element with given index
@@ -0,0 +1,190 @@
+import sys
+import os
+import time
+import logging
+import argparse
+from datetime import datetime, timezone
+from jal.db.db import JalDB, JalDBError
+from jal.db.backend import QtSqlBackend, Sqlite3Backend
+from jal.db.helpers import get_app_path, get_dbfilename, close_db_connection, readSQL
+from jal.db.ledger import Ledger
+from jal.db.asset import JalAsset
+from jal.data_import.statement import Statement, Statement_ImportError
+from jal.data_import.statements import Statements
+from jal.net.downloader import QuoteDownloader
+from jal.data_export.taxes import TaxesRus
+from jal.data_export.taxes_flow import TaxesFlowRus
+
+
+# Tables which row counts are reported after import of statement
+OPERATION_TABLES = ["actions", "action_details", "trades", "dividends", "transfers", "asset_actions", "assets",
+                    "asset_tickers"]
+
+
+# -----------------------------------------------------------------------------------------------------------------------
+# Returns timestamp for a string given either as YYYY-MM-DD date (in UTC) or as a number of seconds since epoch
+def timestamp_arg(value: str) -> int:
+    if value.isdigit():
+        return int(value)
+    try:
+        return int(datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is neither YYYY-MM-DD date nor timestamp")
+
+
+# Returns {table: number of rows} for given tables
+def count_rows(tables: list) -> dict:
+    return {table: readSQL(f"SELECT COUNT(*) FROM {table}") for table in tables}
+
+
+# Returns {table: difference of rows count} for tables that have different values in 'before' and 'after'
+def count_changes(before: dict, after: dict) -> dict:
+    return {table: after[table] - before[table] for table in before if after[table] != before[table]}
+
+
+# -----------------------------------------------------------------------------------------------------------------------
+# Every command gets parsed arguments and returns a dictionary with row counts to be reported
+def rebuild(args) -> dict:
+    ledger = Ledger()
+    frontier = args.since if args.since is not None else (ledger.getCurrentFrontier() if args.frontier else 0)
+    ledger.rebuild(from_timestamp=frontier, fast_and_dirty=args.fast, processes=args.processes)
+    return count_rows(["ledger", "ledger_totals", "trades_opened", "trades_closed"])
+
+
+def import_statement(args) -> dict:
+    if args.type == "json":
+        statement = Statement()
+    else:
+        loaders = {item['module'].__name__.split('.')[-1]: item for item in Statements(None).items}
+        if args.type not in loaders:
+            raise ValueError(f"Unknown statement type '{args.type}', available: json, {', '.join(sorted(loaders))}")
+        statement = getattr(loaders[args.type]['module'], loaders[args.type]['loader_class'])()
+    statement.set_batch_mode(account_id=args.account, force=args.force)
+    before = count_rows(OPERATION_TABLES)
+    statement.load(args.file)
+    statement.validate_format()
+    statement.match_db_ids()
+    statement.import_into_db()
+    changes = count_changes(before, count_rows(OPERATION_TABLES))
+    if not args.no_rebuild:
+        ledger = Ledger()
+        ledger.rebuild(from_timestamp=ledger.getCurrentFrontier())
+    return changes
+
+
+def update_quotes(args) -> dict:
+    before = count_rows(["quotes"])
+    end = args.end if args.end is not None else int(time.time())
+    QuoteDownloader().UpdateQuotes(args.begin, end)
+    return count_changes(before, count_rows(["quotes"]))
+
+
+def load_quotes(args) -> dict:
+    before = count_rows(["quotes"])
+    JalAsset(args.asset).load_quotes_csv(args.file, args.currency)
+    return count_changes(before, count_rows(["quotes"]))
+
+
+def export_taxes(args) -> dict:
+    tax_report = TaxesRus().save_tax_report(args.year, args.account, args.file, use_settlement=not args.no_settlement,
+                                            dlsg_filename=args.dlsg, broker_as_income=args.broker_as_income,
+                                            only_dividends=args.dividends_only)
+    return {section: len(tax_report[section]) for section in tax_report}
+
+
+def export_flow(args) -> dict:
+    flow_report = TaxesFlowRus().save_flow_report(args.year, args.file)
+    return {"rows": len(flow_report)}
+
+
+# -----------------------------------------------------------------------------------------------------------------------
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="jal-cli", description="Run JAL data processing without user interface")
+    parser.add_argument("--db", default=get_app_path(), help="folder with JAL database file")
+    parser.add_argument("--sqlite3", action="store_true", help="use python sqlite3 module for data access of JAL "
+                                                               "objects instead of QtSql")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show info messages")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("rebuild", help="rebuild ledger (full rebuild by default)")
+    command.add_argument("--since", type=timestamp_arg, help="rebuild from given date/timestamp")
+    command.add_argument("--frontier", action="store_true", help="rebuild from current ledger frontier")
+    command.add_argument("--fast", action="store_true", help="disable synchronous DB writes")
+    command.add_argument("--processes", type=int, default=0, help="number of processes for parallel rebuild")
+    command.set_defaults(handler=rebuild)
+
+    command = commands.add_parser("import", help="import broker statement and rebuild ledger from its frontier")
+    command.add_argument("type", help="statement type: 'json' or name of a module from data_import/broker_statements")
+    command.add_argument("file", help="statement file")
+    command.add_argument("--account", type=int, default=0, help="account id to be used for deposits/withdrawals")
+    command.add_argument("--force", action="store_true", help="import statement that starts before the last "
+                                                                "recorded operation")
+    command.add_argument("--no-rebuild", action="store_true", help="don't rebuild ledger after import")
+    command.set_defaults(handler=import_statement)
+
+    command = commands.add_parser("quotes", help="download quotes for active assets and currencies")
+    command.add_argument("begin", type=timestamp_arg, help="start date/timestamp")
+    command.add_argument("end", type=timestamp_arg, nargs="?", help="end date/timestamp (now by default)")
+    command.set_defaults(handler=update_quotes)
+
+    command = commands.add_parser("load-quotes", help="load asset quotes from csv file (date or timestamp, quote)")
+    command.add_argument("asset", type=int, help="asset id")
+    command.add_argument("currency", type=int, help="currency id of quotes")
+    command.add_argument("file", help="csv file name")
+    command.set_defaults(handler=load_quotes)
+
+    command = commands.add_parser("taxes", help="export tax report for account into xlsx file")
+    command.add_argument("year", type=int)
+    command.add_argument("account", type=int, help="account id")
+    command.add_argument("file", help="xlsx file name")
+    command.add_argument("--dlsg", default='', help="tax form file to be updated")
+    command.add_argument("--no-settlement", action="store_true", help="use trade date instead of settlement date")
+    command.add_argument("--broker-as-income", action="store_true", help="put broker name as income source")
+    command.add_argument("--dividends-only", action="store_true", help="put only dividends into tax form")
+    command.set_defaults(handler=export_taxes)
+
+    command = commands.add_parser("flow", help="export money flow report into xlsx file")
+    command.add_argument("year", type=int)
+    command.add_argument("file", help="xlsx file name")
+    command.set_defaults(handler=export_flow)
+    return parser
+
+
+# -----------------------------------------------------------------------------------------------------------------------
+# Opens DB, runs command and prints time of its execution together with row counts. Returns exit code
+def run(args) -> int:
+    db_path = os.path.join(args.db, '')
+    if not os.path.exists(get_dbfilename(db_path)):
+        logging.error(f"Database file not found: {get_dbfilename(db_path)}")
+        return 1
+    error = JalDB().init_db(db_path)
+    if error.code != JalDBError.NoError:
+        logging.error(f"{error.message} {error.details}")
+        return 1
+    if args.sqlite3:
+        JalDB.set_backend(Sqlite3Backend(get_dbfilename(db_path)))
+    start = time.perf_counter()
+    try:
+        counts = args.handler(args)
+    except (Statement_ImportError, ValueError, OSError) as e:
+        logging.error(f"{args.command} failed: {e}")
+        return 1
+    finally:
+        JalDB.set_backend(QtSqlBackend())
+        close_db_connection()
+    print(f"{args.command}: {time.perf_counter() - start:.3f}s")
+    for name, count in counts.items():
+        print(f"  {name}: {count}")
+    return 0
+
+
+def main():
+    args = create_parser().parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    return run(args)
+
+
+# -----------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
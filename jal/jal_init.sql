@@ -156,6 +156,12 @@ CREATE TABLE ledger (
     category_id  INTEGER REFERENCES categories (id) ON DELETE NO ACTION ON UPDATE NO ACTION,
     tag_id       INTEGER REFERENCES tags (id) ON DELETE NO ACTION ON UPDATE NO ACTION
 );
+DROP INDEX IF EXISTS ledger_by_time;
+CREATE INDEX ledger_by_time ON ledger (timestamp);
+DROP INDEX IF EXISTS ledger_by_book_account_asset;
+CREATE INDEX ledger_by_book_account_asset ON ledger (book_account, account_id, asset_id, id, timestamp, amount_acc, value_acc);
+DROP INDEX IF EXISTS ledger_by_account_asset_time;
+CREATE INDEX ledger_by_account_asset_time ON ledger (account_id, asset_id, timestamp);
 
 -- Table: ledger_totals to keep last accumulated amount value for each transaction
 DROP TABLE IF EXISTS ledger_totals;
@@ -175,6 +181,38 @@ CREATE INDEX ledger_totals_by_timestamp ON ledger_totals (timestamp);
 DROP INDEX IF EXISTS ledger_totals_by_operation_book;
 CREATE INDEX ledger_totals_by_operation_book ON ledger_totals (op_type, operation_id, book_account);
 
+-- Table: ledger_snapshots to keep accumulated amounts and values of ledger at the beginning of every month
+DROP TABLE IF EXISTS ledger_snapshots;
+CREATE TABLE ledger_snapshots (
+    id           INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    timestamp    INTEGER NOT NULL,
+    book_account INTEGER NOT NULL,
+    account_id   INTEGER NOT NULL,
+    asset_id     INTEGER NOT NULL,
+    amount_acc   TEXT    NOT NULL,
+    value_acc    TEXT    NOT NULL
+);
+DROP INDEX IF EXISTS ledger_snapshots_by_time;
+CREATE INDEX ledger_snapshots_by_time ON ledger_snapshots (timestamp);
+
+-- Table: ledger_monthly keeps sums of ledger amounts per month (timestamp of month start), account, book, category
+-- (0 if records have no category) and asset. It is filled during ledger rebuild and is used by reports.
+-- Operation triggers delete its rows starting from the month of modified operation together with ledger records
+DROP TABLE IF EXISTS ledger_monthly;
+CREATE TABLE ledger_monthly (
+    id           INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    month        INTEGER NOT NULL,
+    account_id   INTEGER NOT NULL,
+    book_account INTEGER NOT NULL,
+    category_id  INTEGER NOT NULL,
+    asset_id     INTEGER NOT NULL,
+    amount       TEXT    NOT NULL
+);
+DROP INDEX IF EXISTS ledger_monthly_by_month;
+CREATE UNIQUE INDEX ledger_monthly_by_month ON ledger_monthly (month, account_id, book_account, category_id, asset_id);
+DROP INDEX IF EXISTS ledger_monthly_by_account;
+CREATE INDEX ledger_monthly_by_account ON ledger_monthly (account_id, book_account, month);
+
 -- Table: map_category
 DROP TABLE IF EXISTS map_category;
 CREATE TABLE map_category (
@@ -205,6 +243,12 @@ CREATE TABLE trades_opened (
     price         TEXT    NOT NULL,
     remaining_qty TEXT    NOT NULL
 );
+DROP INDEX IF EXISTS trades_opened_by_account_asset;
+CREATE INDEX trades_opened_by_account_asset ON trades_opened (account_id, asset_id, op_type, operation_id);
+DROP INDEX IF EXISTS trades_opened_open_lots;
+CREATE INDEX trades_opened_open_lots ON trades_opened (timestamp, op_type DESC, id) WHERE remaining_qty!='0';
+DROP INDEX IF EXISTS trades_opened_by_time;
+CREATE INDEX trades_opened_by_time ON trades_opened (timestamp);
 
 
 -- Table: quotes
@@ -218,6 +262,20 @@ CREATE TABLE quotes (
 );
 CREATE UNIQUE INDEX unique_quotations ON quotes (asset_id, currency_id, timestamp);
 
+-- Table: fx_rates keeps the last quote of every money asset within a day (period 1) and within a month (period 2).
+-- Timestamp is the start of the day/month. It is maintained by fx_rates_* triggers on quotes table
+DROP TABLE IF EXISTS fx_rates;
+CREATE TABLE fx_rates (
+    id          INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    period      INTEGER NOT NULL,
+    timestamp   INTEGER NOT NULL,
+    asset_id    INTEGER REFERENCES assets (id) ON DELETE CASCADE ON UPDATE CASCADE NOT NULL,
+    currency_id INTEGER REFERENCES assets (id) ON DELETE CASCADE ON UPDATE CASCADE NOT NULL,
+    quote       TEXT    NOT NULL DEFAULT ('0')
+);
+DROP INDEX IF EXISTS fx_rates_by_time;
+CREATE UNIQUE INDEX fx_rates_by_time ON fx_rates (period, asset_id, currency_id, timestamp);
+
 -- Table: settings
 DROP TABLE IF EXISTS settings;
 CREATE TABLE settings (
@@ -292,6 +350,8 @@ CREATE TABLE trades_closed (
     close_price     TEXT    NOT NULL,
     qty             TEXT    NOT NULL
 );
+DROP INDEX IF EXISTS trades_closed_by_close_time;
+CREATE INDEX trades_closed_by_close_time ON trades_closed (close_timestamp);
 
 DROP TRIGGER IF EXISTS on_closed_trade_delete;
 CREATE TRIGGER on_closed_trade_delete
@@ -299,8 +359,11 @@ CREATE TRIGGER on_closed_trade_delete
     FOR EACH ROW
     WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
+    -- 'FixedPointQtyMultiplier' is a scale of 'remaining_qty' if 'FixedPointStorage' is on (see jal/db/helpers.py)
     UPDATE trades_opened
-    SET remaining_qty = remaining_qty + OLD.qty
+    SET remaining_qty = remaining_qty + CASE WHEN (SELECT value FROM settings WHERE name='FixedPointStorage')
+        THEN CAST(ROUND(OLD.qty * (SELECT value FROM settings WHERE name='FixedPointQtyMultiplier')) AS INTEGER)
+        ELSE OLD.qty END
     WHERE op_type=OLD.open_op_type AND operation_id=OLD.open_op_id AND account_id=OLD.account_id AND asset_id = OLD.asset_id;
 END;
 
@@ -327,27 +390,23 @@ DROP INDEX IF EXISTS agents_by_name_idx;
 CREATE INDEX agents_by_name_idx ON agents (name);
 
 
--- View: operation_sequence
-DROP VIEW IF EXISTS operation_sequence;
-CREATE VIEW operation_sequence AS
-SELECT m.op_type, m.id, m.timestamp, m.account_id, subtype
-FROM
-(
-    SELECT op_type, 1 AS seq, id, timestamp, account_id, 0 AS subtype FROM actions
-    UNION ALL
-    SELECT op_type, 2 AS seq, id, timestamp, account_id, type AS subtype FROM dividends
-    UNION ALL
-    SELECT op_type, 3 AS seq, id, timestamp, account_id, type AS subtype FROM asset_actions
-    UNION ALL
-    SELECT op_type, 4 AS seq, id, timestamp, account_id, 0 AS subtype FROM trades
-    UNION ALL
-    SELECT op_type, 5 AS seq, id, withdrawal_timestamp AS timestamp, withdrawal_account AS account_id, -1 AS subtype FROM transfers
-    UNION ALL
-    SELECT op_type, 5 AS seq, id, withdrawal_timestamp AS timestamp, fee_account AS account_id, 0 AS subtype FROM transfers WHERE NOT fee IS NULL
-    UNION ALL
-    SELECT op_type, 5 AS seq, id, deposit_timestamp AS timestamp, deposit_account AS account_id, 1 AS subtype FROM transfers
-) AS m
-ORDER BY m.timestamp, m.seq, m.subtype, m.id;
+-- Table: operation_sequence keeps all operations in the order of their processing by ledger. It is maintained by
+-- operation_sequence_* triggers on operation tables (they work independently of 'TriggersEnabled' setting)
+-- seq - order of operation types with the same timestamp, subtype - type of transfer leg (or type of operation)
+DROP TABLE IF EXISTS operation_sequence;
+CREATE TABLE operation_sequence (
+    op_type      INTEGER NOT NULL,
+    seq          INTEGER NOT NULL,
+    id           INTEGER NOT NULL,
+    timestamp    INTEGER NOT NULL,
+    account_id   INTEGER,
+    subtype      INTEGER NOT NULL,
+    PRIMARY KEY (op_type, id, subtype)
+);
+DROP INDEX IF EXISTS operation_sequence_by_time;
+CREATE UNIQUE INDEX operation_sequence_by_time ON operation_sequence (timestamp, seq, subtype, id);
+DROP INDEX IF EXISTS operation_sequence_by_account;
+CREATE INDEX operation_sequence_by_account ON operation_sequence (account_id, timestamp);
 
 
 -- View: categories_tree
@@ -462,6 +521,9 @@ CREATE TRIGGER action_details_after_delete
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM actions WHERE id = OLD.pid);
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        (SELECT timestamp FROM actions WHERE id = OLD.pid),
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 
@@ -473,6 +535,9 @@ CREATE TRIGGER action_details_after_insert
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM actions WHERE id = NEW.pid);
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        (SELECT timestamp FROM actions WHERE id = NEW.pid),
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 -- Trigger: action_details_after_update
@@ -483,6 +548,9 @@ CREATE TRIGGER action_details_after_update
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM actions WHERE id = OLD.pid );
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        (SELECT timestamp FROM actions WHERE id = OLD.pid),
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 -- Trigger: actions_after_delete
@@ -494,6 +562,9 @@ CREATE TRIGGER actions_after_delete
 BEGIN
     DELETE FROM action_details WHERE pid = OLD.id;
     DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        OLD.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 -- Trigger: actions_after_insert
@@ -504,6 +575,9 @@ CREATE TRIGGER actions_after_insert
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        NEW.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 -- Trigger: actions_after_update
@@ -514,6 +588,9 @@ CREATE TRIGGER actions_after_update
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(OLD.timestamp, NEW.timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 -- Trigger: dividends_after_delete
@@ -524,6 +601,9 @@ CREATE TRIGGER dividends_after_delete
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        OLD.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 -- Trigger: dividends_after_insert
@@ -534,6 +614,9 @@ CREATE TRIGGER dividends_after_insert
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        NEW.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 -- Trigger: dividends_after_update
@@ -544,6 +627,9 @@ CREATE TRIGGER dividends_after_update
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(OLD.timestamp, NEW.timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 DROP TRIGGER IF EXISTS trades_after_delete;
@@ -553,6 +639,9 @@ CREATE TRIGGER trades_after_delete
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        OLD.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
     DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp;
 END;
 
@@ -563,6 +652,9 @@ CREATE TRIGGER trades_after_insert
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        NEW.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
     DELETE FROM trades_opened WHERE timestamp >= NEW.timestamp;
 END;
 
@@ -573,6 +665,9 @@ CREATE TRIGGER trades_after_update
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(OLD.timestamp, NEW.timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
     DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
 END;
 
@@ -583,6 +678,9 @@ CREATE TRIGGER asset_action_after_delete
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        OLD.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
     DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp;
 END;
 
@@ -593,6 +691,9 @@ CREATE TRIGGER asset_action_after_insert
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        NEW.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
     DELETE FROM trades_opened WHERE timestamp >= NEW.timestamp;
 END;
 
@@ -603,6 +704,9 @@ CREATE TRIGGER asset_action_after_update
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(OLD.timestamp, NEW.timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
     DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp  OR timestamp >= NEW.timestamp;
 END;
 
@@ -613,6 +717,9 @@ CREATE TRIGGER asset_result_after_delete
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id);
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id),
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 DROP TRIGGER IF EXISTS asset_result_after_insert;
@@ -622,6 +729,9 @@ CREATE TRIGGER asset_result_after_insert
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM asset_actions WHERE id = NEW.action_id);
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        (SELECT timestamp FROM asset_actions WHERE id = NEW.action_id),
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 DROP TRIGGER IF EXISTS asset_result_after_update;
@@ -631,6 +741,9 @@ CREATE TRIGGER asset_result_after_update
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id);
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id),
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 DROP TRIGGER IF EXISTS transfers_after_delete;
@@ -640,6 +753,9 @@ CREATE TRIGGER transfers_after_delete
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= OLD.withdrawal_timestamp OR timestamp >= OLD.deposit_timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(OLD.withdrawal_timestamp, OLD.deposit_timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 DROP TRIGGER IF EXISTS transfers_after_insert;
@@ -649,6 +765,9 @@ CREATE TRIGGER transfers_after_insert
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM ledger WHERE timestamp >= NEW.withdrawal_timestamp OR timestamp >= NEW.deposit_timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(NEW.withdrawal_timestamp, NEW.deposit_timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
 END;
 
 DROP TRIGGER IF EXISTS transfers_after_update;
@@ -660,6 +779,191 @@ CREATE TRIGGER transfers_after_update
 BEGIN
     DELETE FROM ledger WHERE timestamp >= OLD.withdrawal_timestamp OR timestamp >= OLD.deposit_timestamp OR
                 timestamp >= NEW.withdrawal_timestamp OR timestamp >= NEW.deposit_timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(OLD.withdrawal_timestamp, OLD.deposit_timestamp, NEW.withdrawal_timestamp, NEW.deposit_timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+-- Triggers: operation_sequence_* keep operation_sequence table in sync with operation tables
+DROP TRIGGER IF EXISTS operation_sequence_actions_insert;
+CREATE TRIGGER operation_sequence_actions_insert AFTER INSERT ON actions FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 1, NEW.id, NEW.timestamp, NEW.account_id, 0);
+END;
+DROP TRIGGER IF EXISTS operation_sequence_actions_update;
+CREATE TRIGGER operation_sequence_actions_update AFTER UPDATE OF id, timestamp, account_id ON actions FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET id=NEW.id, timestamp=NEW.timestamp, account_id=NEW.account_id
+    WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+DROP TRIGGER IF EXISTS operation_sequence_actions_delete;
+CREATE TRIGGER operation_sequence_actions_delete AFTER DELETE ON actions FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS operation_sequence_dividends_insert;
+CREATE TRIGGER operation_sequence_dividends_insert AFTER INSERT ON dividends FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 2, NEW.id, NEW.timestamp, NEW.account_id, NEW.type);
+END;
+DROP TRIGGER IF EXISTS operation_sequence_dividends_update;
+CREATE TRIGGER operation_sequence_dividends_update AFTER UPDATE OF id, timestamp, account_id, type ON dividends
+FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET id=NEW.id, timestamp=NEW.timestamp, account_id=NEW.account_id, subtype=NEW.type
+    WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+DROP TRIGGER IF EXISTS operation_sequence_dividends_delete;
+CREATE TRIGGER operation_sequence_dividends_delete AFTER DELETE ON dividends FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS operation_sequence_asset_actions_insert;
+CREATE TRIGGER operation_sequence_asset_actions_insert AFTER INSERT ON asset_actions FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 3, NEW.id, NEW.timestamp, NEW.account_id, NEW.type);
+END;
+DROP TRIGGER IF EXISTS operation_sequence_asset_actions_update;
+CREATE TRIGGER operation_sequence_asset_actions_update AFTER UPDATE OF id, timestamp, account_id, type ON asset_actions
+FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET id=NEW.id, timestamp=NEW.timestamp, account_id=NEW.account_id, subtype=NEW.type
+    WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+DROP TRIGGER IF EXISTS operation_sequence_asset_actions_delete;
+CREATE TRIGGER operation_sequence_asset_actions_delete AFTER DELETE ON asset_actions FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS operation_sequence_trades_insert;
+CREATE TRIGGER operation_sequence_trades_insert AFTER INSERT ON trades FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 4, NEW.id, NEW.timestamp, NEW.account_id, 0);
+END;
+DROP TRIGGER IF EXISTS operation_sequence_trades_update;
+CREATE TRIGGER operation_sequence_trades_update AFTER UPDATE OF id, timestamp, account_id ON trades FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET id=NEW.id, timestamp=NEW.timestamp, account_id=NEW.account_id
+    WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+DROP TRIGGER IF EXISTS operation_sequence_trades_delete;
+CREATE TRIGGER operation_sequence_trades_delete AFTER DELETE ON trades FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+
+-- Transfer is represented by 3 rows: withdrawal (subtype -1), fee (subtype 0, only if fee is set) and deposit (1)
+DROP TRIGGER IF EXISTS operation_sequence_transfers_insert;
+CREATE TRIGGER operation_sequence_transfers_insert AFTER INSERT ON transfers FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.withdrawal_account, -1);
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    SELECT NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.fee_account, 0 WHERE NOT NEW.fee IS NULL;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.deposit_timestamp, NEW.deposit_account, 1);
+END;
+DROP TRIGGER IF EXISTS operation_sequence_transfers_update;
+CREATE TRIGGER operation_sequence_transfers_update
+    AFTER UPDATE OF id, withdrawal_timestamp, withdrawal_account, deposit_timestamp, deposit_account, fee_account, fee
+    ON transfers FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type=OLD.op_type AND id=OLD.id;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.withdrawal_account, -1);
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    SELECT NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.fee_account, 0 WHERE NOT NEW.fee IS NULL;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.deposit_timestamp, NEW.deposit_account, 1);
+END;
+DROP TRIGGER IF EXISTS operation_sequence_transfers_delete;
+CREATE TRIGGER operation_sequence_transfers_delete AFTER DELETE ON transfers FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+
+-- Triggers: fx_rates_* update day and month rates of money asset (assets.type_id=1) after its quote modification
+DROP TRIGGER IF EXISTS fx_rates_insert;
+CREATE TRIGGER fx_rates_insert AFTER INSERT ON quotes FOR EACH ROW
+    WHEN (SELECT type_id FROM assets WHERE id=NEW.asset_id)=1
+BEGIN
+    DELETE FROM fx_rates WHERE asset_id=NEW.asset_id AND currency_id=NEW.currency_id AND (
+        (period=1 AND timestamp=NEW.timestamp - NEW.timestamp % 86400) OR
+        (period=2 AND timestamp=CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month')) AS INTEGER)));
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 1, NEW.timestamp - NEW.timestamp % 86400, asset_id, currency_id, quote FROM quotes
+    WHERE asset_id=NEW.asset_id AND currency_id=NEW.currency_id
+    AND timestamp>=NEW.timestamp - NEW.timestamp % 86400 AND timestamp<NEW.timestamp - NEW.timestamp % 86400 + 86400
+    ORDER BY timestamp DESC LIMIT 1;
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 2, CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month')) AS INTEGER),
+           asset_id, currency_id, quote
+    FROM quotes WHERE asset_id=NEW.asset_id AND currency_id=NEW.currency_id
+    AND timestamp>=CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month')) AS INTEGER)
+    AND timestamp<CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month', '+1 month')) AS INTEGER)
+    ORDER BY timestamp DESC LIMIT 1;
+END;
+DROP TRIGGER IF EXISTS fx_rates_update;
+CREATE TRIGGER fx_rates_update AFTER UPDATE OF timestamp, asset_id, currency_id, quote ON quotes FOR EACH ROW
+    WHEN (SELECT type_id FROM assets WHERE id=OLD.asset_id)=1 OR (SELECT type_id FROM assets WHERE id=NEW.asset_id)=1
+BEGIN
+    DELETE FROM fx_rates WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id AND (
+        (period=1 AND timestamp=OLD.timestamp - OLD.timestamp % 86400) OR
+        (period=2 AND timestamp=CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month')) AS INTEGER)));
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 1, OLD.timestamp - OLD.timestamp % 86400, asset_id, currency_id, quote FROM quotes
+    WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id
+    AND timestamp>=OLD.timestamp - OLD.timestamp % 86400 AND timestamp<OLD.timestamp - OLD.timestamp % 86400 + 86400
+    ORDER BY timestamp DESC LIMIT 1;
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 2, CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month')) AS INTEGER),
+           asset_id, currency_id, quote
+    FROM quotes WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id
+    AND timestamp>=CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month')) AS INTEGER)
+    AND timestamp<CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month', '+1 month')) AS INTEGER)
+    ORDER BY timestamp DESC LIMIT 1;
+    DELETE FROM fx_rates WHERE asset_id=NEW.asset_id AND currency_id=NEW.currency_id AND (
+        (period=1 AND timestamp=NEW.timestamp - NEW.timestamp % 86400) OR
+        (period=2 AND timestamp=CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month')) AS INTEGER)));
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 1, NEW.timestamp - NEW.timestamp % 86400, asset_id, currency_id, quote FROM quotes
+    WHERE asset_id=NEW.asset_id AND currency_id=NEW.currency_id
+    AND timestamp>=NEW.timestamp - NEW.timestamp % 86400 AND timestamp<NEW.timestamp - NEW.timestamp % 86400 + 86400
+    ORDER BY timestamp DESC LIMIT 1;
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 2, CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month')) AS INTEGER),
+           asset_id, currency_id, quote
+    FROM quotes WHERE asset_id=NEW.asset_id AND currency_id=NEW.currency_id
+    AND timestamp>=CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month')) AS INTEGER)
+    AND timestamp<CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month', '+1 month')) AS INTEGER)
+    ORDER BY timestamp DESC LIMIT 1;
+END;
+DROP TRIGGER IF EXISTS fx_rates_delete;
+CREATE TRIGGER fx_rates_delete AFTER DELETE ON quotes FOR EACH ROW
+    WHEN (SELECT type_id FROM assets WHERE id=OLD.asset_id)=1
+BEGIN
+    DELETE FROM fx_rates WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id AND (
+        (period=1 AND timestamp=OLD.timestamp - OLD.timestamp % 86400) OR
+        (period=2 AND timestamp=CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month')) AS INTEGER)));
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 1, OLD.timestamp - OLD.timestamp % 86400, asset_id, currency_id, quote FROM quotes
+    WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id
+    AND timestamp>=OLD.timestamp - OLD.timestamp % 86400 AND timestamp<OLD.timestamp - OLD.timestamp % 86400 + 86400
+    ORDER BY timestamp DESC LIMIT 1;
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 2, CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month')) AS INTEGER),
+           asset_id, currency_id, quote
+    FROM quotes WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id
+    AND timestamp>=CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month')) AS INTEGER)
+    AND timestamp<CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month', '+1 month')) AS INTEGER)
+    ORDER BY timestamp DESC LIMIT 1;
 END;
 
 DROP TRIGGER IF EXISTS validate_account_insert;
@@ -687,7 +991,7 @@ END;
 
 
 -- Initialize default values for settings
-INSERT INTO settings(id, name, value) VALUES (0, 'SchemaVersion', 38);
+INSERT INTO settings(id, name, value) VALUES (0, 'SchemaVersion', 48);
 INSERT INTO settings(id, name, value) VALUES (1, 'TriggersEnabled', 1);
 INSERT INTO settings(id, name, value) VALUES (2, 'BaseCurrency', 1);
 INSERT INTO settings(id, name, value) VALUES (3, 'Language', 1);
@@ -698,6 +1002,8 @@ INSERT INTO settings(id, name, value) VALUES (7, 'RebuildDB', 0);
 INSERT INTO settings(id, name, value) VALUES (8, 'WindowGeometry', '');
 INSERT INTO settings(id, name, value) VALUES (9, 'WindowState', '');
 INSERT INTO settings(id, name, value) VALUES (10, 'MessageOnce', '');
+INSERT INTO settings(id, name, value) VALUES (11, 'FixedPointStorage', 0);
+INSERT INTO settings(id, name, value) VALUES (12, 'FixedPointQtyMultiplier', 0);
 
 -- Initialize available languages
 INSERT INTO languages (id, language) VALUES (1, 'en');
@@ -1,5 +1,7 @@
 import logging
+import threading
 import xml.etree.ElementTree as xml_tree
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from io import StringIO
@@ -40,16 +42,55 @@ class QuotesUpdateDialog(QDialog, Ui_UpdateQuotesDlg):
         return self.EndDateEdit.dateTime().toSecsSinceEpoch()
 
 
+# ===================================================================================================================
+# Copy of asset data for data loaders that run in download threads without DB access. Asset data updates are
+# collected in 'updates' dictionary and are stored into DB later (see JalAsset.update_data())
+# ===================================================================================================================
+class AssetSnapshot:
+    def __init__(self, asset: JalAsset):
+        self._id = asset.id()
+        self._symbol = asset.symbol()
+        self._isin = asset.isin()
+        self._name = asset.name()
+        self.updates = {}
+
+    def id(self) -> int:
+        return self._id
+
+    def symbol(self) -> str:
+        return self._symbol
+
+    def isin(self) -> str:
+        return self._isin
+
+    def name(self) -> str:
+        return self._name
+
+    def update_data(self, data: dict) -> None:
+        self.updates.update(data)
+
+
 # ===================================================================================================================
 # Worker class
 # ===================================================================================================================
 # noinspection SpellCheckingInspection
 class QuoteDownloader(QObject):
     download_completed = Signal()
+    MAX_THREADS = 8
+    FEED_CONCURRENCY = {           # Maximum number of simultaneous downloads from one data feed
+        MarketDataFeed.CBR: 2,
+        MarketDataFeed.RU: 4,
+        MarketDataFeed.EU: 2,
+        MarketDataFeed.US: 4,
+        MarketDataFeed.CA: 2,
+        MarketDataFeed.GB: 2,
+        MarketDataFeed.FRA: 2
+    }
 
     def __init__(self):
         super().__init__()
         self.CBR_codes = None
+        self._currency_symbols = {}
         self.data_loaders = {
             MarketDataFeed.NA: self.Dummy_DataReader,
             MarketDataFeed.CBR: self.CBR_DataReader,
@@ -60,6 +101,8 @@ class QuoteDownloader(QObject):
             MarketDataFeed.GB: self.YahooLSE_Downloader,
             MarketDataFeed.FRA: self.YahooFRA_Downloader
         }
+        self._feed_limits = {x: threading.BoundedSemaphore(self.FEED_CONCURRENCY.get(x, self.MAX_THREADS))
+                             for x in self.data_loaders}
 
     def showQuoteDownloadDialog(self, parent):
         dialog = QuotesUpdateDialog(parent)
@@ -67,12 +110,16 @@ class QuoteDownloader(QObject):
             self.UpdateQuotes(dialog.getStartDate(), dialog.getEndDate())
             self.download_completed.emit()
 
+    # Quotes are downloaded in MAX_THREADS threads with not more than FEED_CONCURRENCY simultaneous downloads
+    # for every data feed. Downloaded data are stored into DB by this thread as DB connection isn't shared
     def UpdateQuotes(self, start_timestamp, end_timestamp):
         self.PrepareRussianCBReader()
-        assets = JalAsset.get_currencies()
+        currencies = JalAsset.get_currencies()
+        self._currency_symbols = {x.id(): x.symbol() for x in currencies}
         # Append base currency id to each currency as currency rate is relative to base currency
-        assets = [{"asset": x, "currency": int(JalSettings().getValue('BaseCurrency'))} for x in assets]
+        assets = [{"asset": x, "currency": int(JalSettings().getValue('BaseCurrency'))} for x in currencies]
         assets += JalAsset.get_active_assets(start_timestamp, end_timestamp)  # append assets list
+        downloads = []
         for asset_data in assets:
             asset = asset_data['asset']
             if asset.id() == int(JalSettings().getValue('BaseCurrency')):
@@ -85,18 +132,35 @@ class QuoteDownloader(QObject):
                 from_timestamp = quotes_end if quotes_end > start_timestamp else start_timestamp
             if end_timestamp < from_timestamp:
                 continue
+            downloads.append((asset.quote_source(currency), AssetSnapshot(asset), currency, from_timestamp,
+                              end_timestamp))
+        with ThreadPoolExecutor(max_workers=self.MAX_THREADS) as pool:
+            futures = {pool.submit(self._download_quotes, *x): x for x in downloads}
+            for future in as_completed(futures):
+                _source, snapshot, currency, _begin, _end = futures[future]
+                data = future.result()
+                asset = JalAsset(snapshot.id())
+                if snapshot.updates:
+                    asset.update_data(snapshot.updates)
+                if data is not None:
+                    asset.set_quotes_bulk(data, currency)   # Date in pandas dataset is in UTC by default
+        JalDB().commit()
+        logging.info(self.tr("Download completed"))
+
+    # Calls data loader of given data feed in a download thread. Returns pandas DataFrame with quotes or None
+    def _download_quotes(self, source, asset, currency, start_timestamp, end_timestamp):
+        with self._feed_limits[source]:
             try:
-                data = self.data_loaders[asset.quote_source(currency)](asset, currency, from_timestamp, end_timestamp)
+                return self.data_loaders[source](asset, currency, start_timestamp, end_timestamp)
             except (xml_tree.ParseError, pd.errors.EmptyDataError, KeyError):
                 logging.warning(self.tr("No data were downloaded for ") + f"{asset.name()}")
-                continue
-            if data is not None:
-                quotations = []
-                for date, quote in data.iterrows():  # Date in pandas dataset is in UTC by default
-                    quotations.append({'timestamp': int(date.timestamp()), 'quote': quote[0]})
-                asset.set_quotes(quotations, currency)
-        JalDB().commit()
-        logging.info(self.tr("Download completed"))
+                return None
+
+    # Returns symbol of currency. Symbols are cached by UpdateQuotes() as data loaders run without DB access
+    def _currency_symbol(self, currency_id) -> str:
+        if currency_id not in self._currency_symbols:
+            self._currency_symbols[currency_id] = JalAsset(currency_id).symbol()
+        return self._currency_symbols[currency_id]
 
     def PrepareRussianCBReader(self):
         rows = []
@@ -271,7 +335,7 @@ class QuoteDownloader(QObject):
 
     # noinspection PyMethodMayBeStatic
     def MOEX_DataReader(self, asset, currency_id, start_timestamp, end_timestamp, update_symbol=True):
-        currency = JalAsset(currency_id).symbol()
+        currency = self._currency_symbol(currency_id)
         moex_info = self.MOEX_info(symbol=asset.symbol(), isin=asset.isin(), currency=currency, special=True)
         if (moex_info['engine'] is None) or (moex_info['market'] is None) or (moex_info['board'] is None):
             logging.warning(f"Failed to find {asset.symbol()} on moex.com")
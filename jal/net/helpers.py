@@ -1,9 +1,13 @@
 import requests
 from requests.exceptions import ConnectTimeout, ConnectionError
+import time
 import logging
 import platform
+import threading
+from urllib.parse import urlparse
 from PySide6.QtWidgets import QApplication
 from jal import __version__
+from jal.net.web_cache import WebCache, web_cache
 
 
 # ===================================================================================================================
@@ -27,13 +31,63 @@ def isEnglish(text):
 
 
 # ===================================================================================================================
-# Retrieve URL from web with given method and params
+# Minimal interval in seconds between requests to the same host (i.e. rate limit for all threads together)
+HOST_REQUEST_INTERVAL = {
+    "www.cbr.ru": 0.1,
+    "iss.moex.com": 0.05,
+    "query1.finance.yahoo.com": 0.1,
+    "live.euronext.com": 0.2,
+    "app-money.tmx.com": 0.2
+}
+_sessions = threading.local()    # Every thread keeps its own pool of sessions {host: requests.Session}
+_next_request = {}               # {host: earliest time of next request}
+_rate_lock = threading.Lock()
+
+
+# Returns session for URL host. Session is reused by all requests of the thread to this host and keeps connections
+def get_session(url) -> requests.Session:
+    host = urlparse(url).netloc
+    if not hasattr(_sessions, "pool"):
+        _sessions.pool = {}
+    if host not in _sessions.pool:
+        session = requests.Session()
+        session.headers['User-Agent'] = make_user_agent(url=url)
+        _sessions.pool[host] = session
+    return _sessions.pool[host]
+
+
+# Waits until request to URL host is allowed by HOST_REQUEST_INTERVAL
+def wait_request_slot(url) -> None:
+    host = urlparse(url).netloc
+    interval = HOST_REQUEST_INTERVAL.get(host, 0)
+    if not interval:
+        return
+    with _rate_lock:
+        now = time.monotonic()
+        slot = max(now, _next_request.get(host, 0))
+        _next_request[host] = slot + interval
+    if slot > now:
+        time.sleep(slot - now)
+
+
+# ===================================================================================================================
+# Retrieve URL from web with given method and params. GET responses of reference data are taken from web_cache()
 def request_url(method, url, params=None, json_params=None):
-    session = requests.Session()
-    session.headers['User-Agent'] = make_user_agent(url=url)
+    cache = web_cache() if method == "GET" and WebCache.ttl(url) else None
+    cached = cache.get(url) if cache is not None else None
+    if cached is not None and cached['fresh']:
+        return cached['body']
+    headers = {}
+    if cached is not None:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+    session = get_session(url)
+    wait_request_slot(url)
     try:
         if method == "GET":
-            response = session.get(url)
+            response = session.get(url, headers=headers)
         elif method == "POST":
             if params:
                 response = session.post(url, data=params)
@@ -49,7 +103,13 @@ def request_url(method, url, params=None, json_params=None):
     except ConnectionError as e:
         logging.error(f"URL {url}\nConnection error: {e}")
         return ''
+    if response.status_code == 304 and cached is not None:
+        cache.refresh(url)
+        return cached['body']
     if response.status_code == 200:
+        if cache is not None:
+            cache.put(url, response.text, etag=response.headers.get('ETag', ''),
+                      last_modified=response.headers.get('Last-Modified', ''))
         return response.text
     else:
         logging.error(f"URL: {url}" + QApplication.translate('Net', " failed: ")
@@ -0,0 +1,117 @@
+import re
+import time
+import sqlite3
+import threading
+
+
+# ===================================================================================================================
+# Persistent cache of web responses that is stored in a separate sqlite file near JAL database (see JalDB.init_db).
+# Only GET responses of URLs that match one of TTL patterns are cached - these are reference data that change
+# rarely (list of currencies, security descriptions), while quotes are always downloaded.
+# Fresh responses are returned without web access. Expired responses are validated with conditional request
+# (If-None-Match / If-Modified-Since) if server provided ETag or Last-Modified header for them.
+# Total size of cached bodies is limited by 'max_size' - least recently used responses are evicted first.
+# ===================================================================================================================
+class WebCache:
+    MAX_SIZE = 16 * 1024 * 1024
+    DAY = 86400
+    TTL = [        # (URL pattern, time to live in seconds)
+        (r"^https?://www\.cbr\.ru/scripts/XML_valFull\.asp", 7 * DAY),       # CBR currency codes
+        (r"^https?://iss\.moex\.com/iss/securities/[^/?]+\.xml", DAY),         # MOEX security description
+        (r"^https?://iss\.moex\.com/iss/securities\.json\?", DAY)             # MOEX security search
+    ]
+
+    def __init__(self, filename: str, max_size: int = MAX_SIZE):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'evicted': 0}
+        self._connection = sqlite3.connect(filename, isolation_level=None, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, body TEXT NOT NULL, "
+                                 "etag TEXT NOT NULL, last_modified TEXT NOT NULL, expires INTEGER NOT NULL, "
+                                 "accessed REAL NOT NULL, size INTEGER NOT NULL)")
+
+    # Returns time to live for URL responses or 0 if URL shouldn't be cached
+    @classmethod
+    def ttl(cls, url: str) -> int:
+        for pattern, ttl in cls.TTL:
+            if re.match(pattern, url):
+                return ttl
+        return 0
+
+    # Returns cached response for URL as dictionary {body, etag, last_modified, fresh} or None if there is no response.
+    # Fresh response is counted as a cache hit, absent or expired one - as a cache miss (web request is required then).
+    def get(self, url: str):
+        with self._lock:
+            row = self._connection.execute("SELECT body, etag, last_modified, expires FROM responses WHERE url=?",
+                                           (url,)).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            now = time.time()
+            self._connection.execute("UPDATE responses SET accessed=? WHERE url=?", (now, url))
+            self._stats['hits' if row[3] > now else 'misses'] += 1
+            return {'body': row[0], 'etag': row[1], 'last_modified': row[2], 'fresh': row[3] > now}
+
+    # Stores downloaded response for URL and evicts old responses if cache size limit is exceeded
+    def put(self, url: str, body: str, etag: str = '', last_modified: str = '') -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO responses (url, body, etag, last_modified, expires, "
+                                     "accessed, size) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     (url, body, etag, last_modified, int(now) + self.ttl(url), now, len(body)))
+            self._evict()
+
+    # Extends life of cached response after server confirmed that it wasn't modified
+    def refresh(self, url: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._stats['revalidated'] += 1
+            self._connection.execute("UPDATE responses SET expires=?, accessed=? WHERE url=?",
+                                     (int(now) + self.ttl(url), now, url))
+
+    # Deletes least recently used responses that don't fit into size limit. Should be called under lock
+    def _evict(self) -> None:
+        total = 0
+        evicted = []
+        for url, size in self._connection.execute("SELECT url, size FROM responses ORDER BY accessed DESC"):
+            total += size
+            if total > self._max_size:
+                evicted.append((url,))
+        self._connection.executemany("DELETE FROM responses WHERE url=?", evicted)
+        self._stats['evicted'] += len(evicted)
+
+    # Returns {'hits', 'misses', 'revalidated', 'evicted'} counters together with current number and size of responses.
+    # Every get() is either a hit or a miss. Misses include failed downloads and expired responses 'revalidated' by server
+    def stats(self) -> dict:
+        with self._lock:
+            count, size = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            return dict(self._stats, count=count, size=size)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+# -------------------------------------------------------------------------------------------------------------------
+_web_cache = None
+_web_cache_lock = threading.Lock()
+
+
+# Returns web cache or None if it wasn't initialized with init_web_cache() - web responses aren't cached then
+def web_cache():
+    with _web_cache_lock:
+        return _web_cache
+
+
+# Replaces web cache with a new one in 'filename' with given size limit. JalDB.init_db() puts it near DB file
+def init_web_cache(filename: str, max_size: int = WebCache.MAX_SIZE) -> WebCache:
+    global _web_cache
+    with _web_cache_lock:
+        if _web_cache is not None:
+            _web_cache.close()
+        _web_cache = WebCache(filename, max_size)
+        return _web_cache
@@ -1,9 +1,10 @@
 from datetime import datetime
+from decimal import Decimal
 from PySide6.QtCore import Qt, QObject, QAbstractItemModel, QModelIndex
 from PySide6.QtGui import QBrush
 from jal.ui.reports.ui_income_spending_report import Ui_IncomeSpendingReportWidget
-from jal.constants import BookAccount, PredefinedAsset, CustomColor
-from jal.db.helpers import executeSQL
+from jal.constants import BookAccount, FxPeriod, CustomColor
+from jal.db.helpers import executeSQL, db2decimal
 from jal.db.settings import JalSettings
 from jal.widgets.delegates import GridLinesDelegate
 from jal.widgets.mdi import MdiWidget
@@ -117,6 +118,7 @@ class IncomeSpendingReportModel(QAbstractItemModel):
     COL_PATH = 4
     COL_TIMESTAMP = 5
     COL_AMOUNT = 6
+    COL_RATE = 7
 
     def __init__(self, parent_view):
         super().__init__(parent_view)
@@ -247,31 +249,43 @@ class IncomeSpendingReportModel(QAbstractItemModel):
         self.calculateIncomeSpendings()
         self.configureView()
 
+    # Months that are completely inside of report range are taken from ledger_monthly table, while amounts of partial
+    # first and last months of the range are summed from ledger records. Amounts are summed in SQL per asset and are
+    # converted into base currency with month rate here, as product of scaled integers may not fit into 64 bits
     def calculateIncomeSpendings(self):
         query = executeSQL("WITH "
-                           "_months AS (SELECT strftime('%s', datetime(timestamp, 'unixepoch', 'start of month') ) "
-                           "AS month, asset_id, MAX(timestamp) AS last_timestamp "
-                           "FROM quotes AS q "
-                           "LEFT JOIN assets AS a ON q.asset_id=a.id "
-                           "WHERE a.type_id=:asset_money "
-                           "GROUP BY month, asset_id), "
+                           "_range AS (SELECT "
+                           "CAST(strftime('%s', date(:begin - 1, 'unixepoch', 'start of month', '+1 month')) "
+                           "AS INTEGER) AS first_month, "
+                           "CAST(strftime('%s', date(:end + 1, 'unixepoch', 'start of month')) AS INTEGER) "
+                           "AS last_month), "
+                           "_amounts AS ( "
+                           "SELECT m.month, m.category_id, m.asset_id, m.amount FROM ledger_monthly AS m, _range AS d "
+                           "WHERE (m.book_account=:book_costs OR m.book_account=:book_incomes) "
+                           "AND m.month>=d.first_month AND m.month<d.last_month "
+                           "UNION ALL "
+                           "SELECT CAST(strftime('%s', date(l.timestamp, 'unixepoch', 'start of month')) AS INTEGER), "
+                           "l.category_id, l.asset_id, l.amount FROM ledger AS l, _range AS d "
+                           "WHERE (l.book_account=:book_costs OR l.book_account=:book_incomes) "
+                           "AND l.timestamp>=:begin AND l.timestamp<=:end AND l.timestamp<d.first_month "
+                           "UNION ALL "
+                           "SELECT d.last_month, l.category_id, l.asset_id, l.amount FROM ledger AS l, _range AS d "
+                           "WHERE (l.book_account=:book_costs OR l.book_account=:book_incomes) "
+                           "AND l.timestamp>=:begin AND l.timestamp<=:end AND l.timestamp>=d.last_month "
+                           "AND d.last_month>=d.first_month), "
                            "_category_amounts AS ( "
-                           "SELECT strftime('%s', datetime(t.timestamp, 'unixepoch', 'start of month')) AS month_start, "
-                           "t.category_id AS id, sum(-t.amount * coalesce(q.quote, 1)) AS amount "
-                           "FROM ledger AS t "
-                           "LEFT JOIN _months AS d ON month_start = d.month AND t.asset_id = d.asset_id "
-                           "LEFT JOIN quotes AS q ON d.last_timestamp = q.timestamp AND t.asset_id = q.asset_id "
-                           "AND q.currency_id=:base_currency "
-                           "WHERE (t.book_account=:book_costs OR t.book_account=:book_incomes) "
-                           "AND t.timestamp>=:begin AND t.timestamp<=:end "
-                           "GROUP BY month_start, category_id) "
+                           "SELECT t.month AS month_start, t.category_id AS id, sum(-t.amount) AS amount, "
+                           "r.quote AS rate FROM _amounts AS t "
+                           "LEFT JOIN fx_rates AS r ON r.period=:month AND r.asset_id=t.asset_id "
+                           "AND r.currency_id=:base_currency AND r.timestamp=t.month "
+                           "GROUP BY month_start, category_id, t.asset_id) "
                            "SELECT ct.level, ct.id, c.pid, c.name, ct.path, ca.month_start, "
-                           "coalesce(ca.amount, 0) AS amount "
+                           "coalesce(ca.amount, 0) AS amount, ca.rate "
                            "FROM categories_tree AS ct "
                            "LEFT JOIN _category_amounts AS ca ON ct.id=ca.id "
                            "LEFT JOIN categories AS c ON ct.id=c.id "
                            "ORDER BY path, month_start",
-                           [(":asset_money", PredefinedAsset.Money), (":book_costs", BookAccount.Costs),
+                           [(":month", FxPeriod.Month), (":book_costs", BookAccount.Costs),
                             (":book_incomes", BookAccount.Incomes), (":begin", self._begin), (":end", self._end),
                             (":base_currency", JalSettings().getValue('BaseCurrency'))], forward_only=True)
         self._root = ReportTreeItem(self._begin, self._end, -1, "ROOT")  # invisible root
@@ -287,7 +301,9 @@ class IncomeSpendingReportModel(QAbstractItemModel):
             if values[self.COL_TIMESTAMP]:
                 year = int(datetime.utcfromtimestamp(int(values[self.COL_TIMESTAMP])).strftime('%Y'))
                 month = int(datetime.utcfromtimestamp(int(values[self.COL_TIMESTAMP])).strftime('%m').lstrip('0'))
-                leaf.addAmount(year, month, values[self.COL_AMOUNT])
+                rate = values[self.COL_RATE]
+                rate = Decimal('1') if rate is None or rate == '' else db2decimal(rate, 'quote')
+                leaf.addAmount(year, month, db2decimal(values[self.COL_AMOUNT], 'amount') * rate)
         self.modelReset.emit()
         self._view.expandAll()
 
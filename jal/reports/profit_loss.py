@@ -1,17 +1,160 @@
-from PySide6.QtCore import Qt, Slot, QObject
-from PySide6.QtSql import QSqlTableModel
+import json
+from datetime import datetime, timezone
+import numpy as np
+from PySide6.QtCore import Qt, Slot, QObject, QAbstractTableModel
 from jal.ui.reports.ui_profit_loss_report import Ui_ProfitLossReportWidget
-from jal.db.helpers import db_connection, executeSQL
-from jal.constants import BookAccount, PredefinedCategory
+from jal.db.helpers import executeSQL, readSQLrecord, fixed_point_storage, FIXED_POINT_SCALE
+from jal.constants import BookAccount, PredefinedCategory, PredefinedAsset, FxPeriod
 from jal.widgets.delegates import FloatDelegate, TimestampDelegate
 from jal.widgets.mdi import MdiWidget
 
 JAL_REPORT_CLASS = "ProfitLossReport"
 
 
-#-----------------------------------------------------------------------------------------------------------------------
-class ProfitLossReportModel(QSqlTableModel):
+# ----------------------------------------------------------------------------------------------------------------------
+# Calculates monthly P&L of account from 'begin' to 'end' timestamps. Monthly sums of ledger records of the account
+# and quotes of its assets are loaded once, then all months are calculated with numpy:
+# - transfers, result, profit, returns and taxes/fees are sums of corresponding ledger records in the month;
+# - assets value at the beginning of month is a sum of money and assets amounts recorded before or exactly at the
+#   beginning of the month multiplied by the last quote of the asset (in account currency) known at this moment;
+#   quotes are read for month starts only, money assets take them from day rates of fx_rates table.
+# Only assets that have ledger records of the account between 'begin' and 'end' are valued and their transfers are
+# counted. Report is empty if there are no such records.
+# Months start with the month of 'begin' and continue until a month that starts after 'end'. Sums of the first and
+# the last months include all records of these months, even if they are outside of 'begin' - 'end' range.
+class ProfitLossCalculator:
+    FIELDS = ["period", "transfer", "assets", "result", "profit", "dividend", "tax_fee"]
+
+    def __init__(self, account_id: int, begin: int, end: int):
+        self._account_id = account_id
+        self._begin = begin
+        self._end = end
+        self._months = self._month_starts(begin, end)
+        self._assets = []      # ids of assets that have ledger records in report range
+        self._ledger = None    # (month, book, category, asset, amount) arrays
+        self._month_start_amounts = {}   # {asset_id: amounts of records at beginning of every month of report}
+        self._quotes = {}      # {asset_id: quotes at beginning of every month of report, NaN if unknown}
+
+    # Returns numpy array with timestamps of month starts from the month of 'begin' until a month after 'end'
+    @staticmethod
+    def _month_starts(begin: int, end: int) -> np.ndarray:
+        date = datetime.utcfromtimestamp(begin)
+        year, month = date.year, date.month
+        months = [int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())]
+        while months[-1] < end:
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+            months.append(int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp()))
+        return np.array(months, dtype=np.int64)
+
+    def _load(self):
+        fixed_point = fixed_point_storage()
+        scale = 10 ** FIXED_POINT_SCALE['amount'] if fixed_point else 1
+        self._assets = []
+        query = executeSQL("WITH _assets AS ("
+                           "SELECT DISTINCT asset_id FROM ledger_monthly WHERE account_id=:account_id) "
+                           "SELECT a.asset_id FROM _assets AS a WHERE EXISTS(SELECT 1 FROM ledger AS l "
+                           "WHERE l.account_id=:account_id AND l.asset_id=a.asset_id "
+                           "AND l.timestamp>=:begin AND l.timestamp<=:end)",
+                           [(":account_id", self._account_id), (":begin", self._begin), (":end", self._end)])
+        while query.next():
+            self._assets.append(readSQLrecord(query))
+        rows = []
+        query = executeSQL("SELECT month, book_account, category_id, asset_id, amount FROM ledger_monthly "
+                           "WHERE account_id=:account_id AND month<=:last",
+                           [(":account_id", self._account_id), (":last", int(self._months[-1]))])
+        while query.next():
+            rows.append(readSQLrecord(query))
+        columns = list(zip(*rows)) if rows else [[]] * 5
+        self._ledger = tuple([np.array(x, dtype=np.int64) for x in columns[:4]] +
+                             [np.array(columns[4], dtype=np.float64) / scale])
+        self._month_start_amounts = {}
+        self._quotes = {}
+        if not self._assets:
+            return
+        assets = json.dumps(self._assets)
+        query = executeSQL("SELECT timestamp, asset_id, SUM(amount) FROM ledger "
+                           "WHERE timestamp IN (SELECT value FROM json_each(:months)) AND account_id=:account_id "
+                           "AND book_account IN (:money, :assets) AND asset_id IN (SELECT value FROM json_each(:ids)) "
+                           "GROUP BY timestamp, asset_id",
+                           [(":months", json.dumps([int(x) for x in self._months])),
+                            (":account_id", self._account_id), (":money", BookAccount.Money),
+                            (":assets", BookAccount.Assets), (":ids", assets)])
+        while query.next():
+            timestamp, asset_id, amount = readSQLrecord(query)
+            amounts = self._month_start_amounts.setdefault(asset_id, np.zeros(len(self._months)))
+            amounts[np.searchsorted(self._months, timestamp)] += float(amount) / scale
+        scale = 10 ** FIXED_POINT_SCALE['quote'] if fixed_point else 1
+        # Money is valued with day rates from fx_rates table that keep the last quote of the day. Thus the rate of
+        # the day before month start is taken unless there is a quote exactly at month start. Other assets are valued
+        # with the last quote before or at month start.
+        query = executeSQL("WITH _months AS (SELECT value AS month FROM json_each(:months)) "
+                           "SELECT s.id, m.month, CASE WHEN s.type_id=:money THEN coalesce("
+                           "(SELECT q.quote FROM quotes q WHERE q.asset_id=s.id AND q.currency_id=a.currency_id "
+                           "AND q.timestamp=m.month), "
+                           "(SELECT r.quote FROM fx_rates r WHERE r.period=:day AND r.asset_id=s.id "
+                           "AND r.currency_id=a.currency_id AND r.timestamp<m.month ORDER BY r.timestamp DESC LIMIT 1)"
+                           ") ELSE (SELECT q.quote FROM quotes q WHERE q.asset_id=s.id AND q.currency_id=a.currency_id "
+                           "AND q.timestamp<=m.month ORDER BY q.timestamp DESC LIMIT 1) END "
+                           "FROM assets s JOIN accounts a ON a.id=:account_id CROSS JOIN _months m "
+                           "WHERE s.id IN (SELECT value FROM json_each(:ids))",
+                           [(":months", json.dumps([int(x) for x in self._months])),
+                            (":account_id", self._account_id), (":ids", assets), (":money", PredefinedAsset.Money),
+                            (":day", FxPeriod.Day)])
+        while query.next():
+            asset_id, month, quote = readSQLrecord(query)
+            if quote == '' or quote is None:
+                continue
+            quotes = self._quotes.setdefault(asset_id, np.full(len(self._months), np.nan))
+            quotes[np.searchsorted(self._months, month)] = float(quote) / scale
+
+    # Returns sums of 'amounts' grouped by months of report for records with given month
+    def _monthly(self, months, amounts) -> np.ndarray:
+        in_range = months >= self._months[0]
+        return np.bincount(np.searchsorted(self._months, months[in_range]), weights=amounts[in_range],
+                           minlength=len(self._months))
+
+    # Returns value of account assets at the beginning of every month of report
+    def _assets_value(self, months, books, assets, amounts) -> np.ndarray:
+        value = np.zeros(len(self._months))
+        positions = np.isin(books, [BookAccount.Money, BookAccount.Assets])
+        for asset_id, quotes in self._quotes.items():
+            selected = positions & (assets == asset_id)
+            order = np.argsort(months[selected], kind='stable')
+            asset_months = months[selected][order]
+            totals = np.concatenate(([0.0], np.cumsum(amounts[selected][order])))
+            amount = totals[np.searchsorted(asset_months, self._months, side='left')]   # records before month
+            if asset_id in self._month_start_amounts:
+                amount = amount + self._month_start_amounts[asset_id]
+            known = ~np.isnan(quotes)
+            value[known] += amount[known] * quotes[known]
+        return value
+
+    # Returns a list of report rows [period, transfer, assets, result, profit, dividend, tax_fee]
+    def calculate(self) -> list:
+        self._load()
+        months, books, categories, assets, amounts = self._ledger
+        if not self._assets:
+            return []
+        transfers = (books == BookAccount.Transfers) & np.isin(assets, self._assets)
+        result = np.isin(books, [BookAccount.Costs, BookAccount.Incomes])
+        returns = np.isin(categories, [PredefinedCategory.Dividends, PredefinedCategory.Interest])
+        columns = [
+            self._monthly(months[transfers], -amounts[transfers]),
+            self._assets_value(months, books, assets, amounts),
+            self._monthly(months[result], -amounts[result]),
+            self._monthly(months[result & (categories == PredefinedCategory.Profit)],
+                          -amounts[result & (categories == PredefinedCategory.Profit)]),
+            self._monthly(months[result & returns], -amounts[result & returns]),
+            self._monthly(months[(books == BookAccount.Costs) & ~returns],
+                          -amounts[(books == BookAccount.Costs) & ~returns])
+        ]
+        return [[int(month)] + [float(x[i]) for x in columns] for i, month in enumerate(self._months)]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class ProfitLossReportModel(QAbstractTableModel):
     def __init__(self, parent_view):
+        super().__init__(parent_view)
         self._columns = [("period", self.tr("Period")),
                          ("transfer", self.tr("In / Out")),
                          ("assets", self.tr("Assets value")),
@@ -23,23 +166,35 @@ class ProfitLossReportModel(QSqlTableModel):
         self._begin = 0
         self._end = 0
         self._account_id = 0
-        self._query = None
+        self._data = []
         self._ym_delegate = None
         self._float_delegate = None
-        QSqlTableModel.__init__(self, parent=parent_view, db=db_connection())
 
-    def setColumnNames(self):
-        for column in self._columns:
-            self.setHeaderData(self.fieldIndex(column[0]), Qt.Horizontal, column[1])
+    def rowCount(self, parent=None):
+        return len(self._data)
+
+    def columnCount(self, parent=None):
+        return len(self._columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self._columns[section][1]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self._data[index.row()][index.column()]
+        if role == Qt.TextAlignmentRole and index.column() > 0:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
 
-    def resetDelegates(self):
-        for column in self._columns:
-            self._view.setItemDelegateForColumn(self.fieldIndex(column[0]), None)
+    def fieldIndex(self, field):
+        return [x[0] for x in self._columns].index(field)
 
     def configureView(self):
         self._view.setModel(self)
-        self.setColumnNames()
-        self.resetDelegates()
         font = self._view.horizontalHeader().font()
         font.setBold(True)
         self._view.horizontalHeader().setFont(font)
@@ -48,12 +203,8 @@ class ProfitLossReportModel(QSqlTableModel):
         self._ym_delegate = TimestampDelegate(display_format='%Y %B')
         self._view.setItemDelegateForColumn(self.fieldIndex("period"), self._ym_delegate)
         self._float_delegate = FloatDelegate(2, allow_tail=False)
-        self._view.setItemDelegateForColumn(self.fieldIndex("transfer"), self._float_delegate)
-        self._view.setItemDelegateForColumn(self.fieldIndex("assets"), self._float_delegate)
-        self._view.setItemDelegateForColumn(self.fieldIndex("result"), self._float_delegate)
-        self._view.setItemDelegateForColumn(self.fieldIndex("profit"), self._float_delegate)
-        self._view.setItemDelegateForColumn(self.fieldIndex("dividend"), self._float_delegate)
-        self._view.setItemDelegateForColumn(self.fieldIndex("tax_fee"), self._float_delegate)
+        for column in self._columns[1:]:
+            self._view.setItemDelegateForColumn(self.fieldIndex(column[0]), self._float_delegate)
 
     def setDatesRange(self, begin, end):
         self._begin = begin
@@ -69,86 +220,9 @@ class ProfitLossReportModel(QSqlTableModel):
     def calculateProfitLossReport(self):
         if self._account_id == 0:
             return
-        self._query = executeSQL(
-            "WITH "
-            "_months AS ("
-            "SELECT DISTINCT(l.asset_id) AS asset_id, m.m_start AS month, MAX(q.timestamp) AS last_timestamp "
-            "FROM ledger AS l "
-            "LEFT JOIN "
-            "(WITH RECURSIVE months(m_start) AS "
-            "( "
-            "  VALUES(CAST(strftime('%s', date(:begin, 'unixepoch', 'start of month')) AS INTEGER)) "
-            "  UNION ALL "
-            "  SELECT CAST(strftime('%s', date(m_start, 'unixepoch', '+1 month')) AS INTEGER) "
-            "  FROM months "
-            "  WHERE m_start < :end "
-            ") "
-            "SELECT m_start FROM months) AS m "
-            "LEFT JOIN accounts AS a ON l.account_id=a.id "
-            "LEFT JOIN quotes AS q ON q.timestamp<=m.m_start AND q.asset_id=l.asset_id AND q.currency_id=a.currency_id "
-            "WHERE l.timestamp>=:begin AND l.timestamp<=:end AND l.account_id=:account_id "
-            "GROUP BY m.m_start, l.asset_id "
-            "ORDER BY m.m_start, l.asset_id ) "
-            "SELECT DISTINCT(m.month) AS period, coalesce(t.transfer, 0) AS transfer, coalesce(a.assets, 0) AS assets, "
-            "coalesce(p.result, 0) AS result, coalesce(o.profit, 0) AS profit, coalesce(d.dividend, 0) AS dividend, "
-            "coalesce(f.tax_fee, 0) AS tax_fee "
-            "FROM _months AS m "
-            "LEFT JOIN ( "
-            "  SELECT mt.month, SUM(-l.amount) AS transfer "
-            "  FROM _months AS mt "
-            "  LEFT JOIN ledger AS l ON mt.month = "
-            "  CAST(strftime('%s', date(l.timestamp, 'unixepoch', 'start of month')) AS INTEGER) "
-            "  AND mt.asset_id=l.asset_id "
-            "  WHERE l.book_account=:book_transfers AND l.account_id=:account_id GROUP BY mt.month "
-            ") AS t ON t.month = m.month "
-            "LEFT JOIN ( "
-            "  SELECT ma.month, SUM(l.amount*q.quote) AS assets "
-            "  FROM _months AS ma "
-            "  LEFT JOIN ledger AS l ON l.timestamp<=ma.month AND l.asset_id=ma.asset_id "
-            "  LEFT JOIN accounts AS a ON l.account_id=a.id "
-            "  LEFT JOIN quotes AS q ON ma.last_timestamp=q.timestamp AND ma.asset_id=q.asset_id AND q.currency_id=a.currency_id "
-            "  WHERE l.account_id =:account_id AND (l.book_account=:book_money OR l.book_account=:book_assets) "
-            "  GROUP BY ma.month "
-            ") AS a ON a.month = m.month "
-            "LEFT JOIN ( "
-            "  SELECT CAST(strftime('%s', date(l.timestamp, 'unixepoch', 'start of month')) AS INTEGER) AS month,"
-            "  SUM(-l.amount) as result"
-            "  FROM ledger AS l  "
-            "  WHERE (l.book_account=:book_costs OR l.book_account=:book_incomes) AND l.account_id=:account_id "
-            "  GROUP BY month "
-            ") AS p ON p.month = m.month "
-            "LEFT JOIN ( "
-            "  SELECT CAST(strftime('%s', date(l.timestamp, 'unixepoch', 'start of month')) "
-            "  AS INTEGER) AS month, SUM(-l.amount) as profit "
-            "  FROM ledger AS l "
-            "  WHERE (l.book_account=:book_costs OR l.book_account=:book_incomes) "
-            "  AND category_id=:category_profit AND l.account_id=:account_id "
-            "  GROUP BY month "
-            ") AS o ON o.month = m.month "
-            "LEFT JOIN ( "
-            "  SELECT CAST(strftime('%s', date(l.timestamp, 'unixepoch', 'start of month')) AS INTEGER) "
-            "  AS month, SUM(-l.amount) as dividend "
-            "  FROM ledger AS l "
-            "  WHERE (l.book_account=:book_costs OR l.book_account=:book_incomes) "
-            "  AND (l.category_id=:category_dividend OR l.category_id=:category_interest) AND l.account_id=:account_id "
-            "  GROUP BY month "
-            ") AS d ON d.month = m.month "
-            "LEFT JOIN ( "
-            "  SELECT CAST(strftime('%s', date(l.timestamp, 'unixepoch', 'start of month')) "
-            "  AS INTEGER) AS month, SUM(-l.amount) as tax_fee "
-            "  FROM ledger AS l "
-            "  WHERE l.book_account=:book_costs AND l.category_id<>:category_dividend "
-            "AND l.category_id<>:category_interest AND l.account_id=:account_id "
-            "  GROUP BY month "
-            ") AS f ON f.month = m.month",
-            [(":account_id", self._account_id), (":begin", self._begin), (":end", self._end),
-             (":book_costs", BookAccount.Costs), (":book_incomes", BookAccount.Incomes),
-             (":book_money", BookAccount.Money), (":book_assets", BookAccount.Assets),
-             (":book_transfers", BookAccount.Transfers), (":category_profit", PredefinedCategory.Profit),
-             (":category_dividend", PredefinedCategory.Dividends), (":category_interest", PredefinedCategory.Interest)],
-            forward_only=False)
-        self.setQuery(self._query)
-        self.modelReset.emit()
+        self.beginResetModel()
+        self._data = ProfitLossCalculator(self._account_id, self._begin, self._end).calculate()
+        self.endResetModel()
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,23 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Indices for ledger lookups by time and by book/account/asset
+DROP INDEX IF EXISTS ledger_by_time;
+CREATE INDEX ledger_by_time ON ledger (timestamp);
+DROP INDEX IF EXISTS ledger_by_book_account_asset;
+CREATE INDEX ledger_by_book_account_asset ON ledger (book_account, account_id, asset_id, id, timestamp, amount_acc, value_acc);
+DROP INDEX IF EXISTS ledger_by_account_asset_time;
+CREATE INDEX ledger_by_account_asset_time ON ledger (account_id, asset_id, timestamp);
+--------------------------------------------------------------------------------
+-- Indices for open trades lookups
+DROP INDEX IF EXISTS trades_opened_by_account_asset;
+CREATE INDEX trades_opened_by_account_asset ON trades_opened (account_id, asset_id, timestamp, op_type DESC, operation_id, price, remaining_qty);
+DROP INDEX IF EXISTS trades_opened_by_time;
+CREATE INDEX trades_opened_by_time ON trades_opened (timestamp);
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=39 WHERE name='SchemaVersion';
+COMMIT;
@@ -0,0 +1,24 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Table to keep accumulated amounts and values of ledger at the beginning of every month
+DROP TABLE IF EXISTS ledger_snapshots;
+CREATE TABLE ledger_snapshots (
+    id           INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    timestamp    INTEGER NOT NULL,
+    book_account INTEGER NOT NULL,
+    account_id   INTEGER NOT NULL,
+    asset_id     INTEGER NOT NULL,
+    amount_acc   TEXT    NOT NULL,
+    value_acc    TEXT    NOT NULL
+);
+DROP INDEX IF EXISTS ledger_snapshots_by_time;
+CREATE INDEX ledger_snapshots_by_time ON ledger_snapshots (timestamp);
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=40 WHERE name='SchemaVersion';
+INSERT OR REPLACE INTO settings(id, name, value) VALUES (7, 'RebuildDB', 1);
+COMMIT;
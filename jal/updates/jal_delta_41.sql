@@ -0,0 +1,25 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Decimal values may be stored as scaled integers if 'FixedPointStorage' is on (text storage is kept by default)
+INSERT OR REPLACE INTO settings(id, name, value) VALUES (11, 'FixedPointStorage', 0);
+
+DROP TRIGGER IF EXISTS on_closed_trade_delete;
+CREATE TRIGGER on_closed_trade_delete
+    AFTER DELETE ON trades_closed
+    FOR EACH ROW
+    WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    -- 1000000000 is a scale of 'remaining_qty' column if 'FixedPointStorage' is on (see jal/db/helpers.py)
+    UPDATE trades_opened
+    SET remaining_qty = remaining_qty + CASE WHEN (SELECT value FROM settings WHERE name='FixedPointStorage')
+        THEN CAST(ROUND(OLD.qty * 1000000000) AS INTEGER) ELSE OLD.qty END
+    WHERE op_type=OLD.open_op_type AND operation_id=OLD.open_op_id AND account_id=OLD.account_id AND asset_id = OLD.asset_id;
+END;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=41 WHERE name='SchemaVersion';
+COMMIT;
@@ -0,0 +1,31 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Expose 'seq' column of operation_sequence in order to read it page by page with (timestamp, seq, subtype, id) key
+DROP VIEW IF EXISTS operation_sequence;
+CREATE VIEW operation_sequence AS
+SELECT m.op_type, m.seq, m.id, m.timestamp, m.account_id, subtype
+FROM
+(
+    SELECT op_type, 1 AS seq, id, timestamp, account_id, 0 AS subtype FROM actions
+    UNION ALL
+    SELECT op_type, 2 AS seq, id, timestamp, account_id, type AS subtype FROM dividends
+    UNION ALL
+    SELECT op_type, 3 AS seq, id, timestamp, account_id, type AS subtype FROM asset_actions
+    UNION ALL
+    SELECT op_type, 4 AS seq, id, timestamp, account_id, 0 AS subtype FROM trades
+    UNION ALL
+    SELECT op_type, 5 AS seq, id, withdrawal_timestamp AS timestamp, withdrawal_account AS account_id, -1 AS subtype FROM transfers
+    UNION ALL
+    SELECT op_type, 5 AS seq, id, withdrawal_timestamp AS timestamp, fee_account AS account_id, 0 AS subtype FROM transfers WHERE NOT fee IS NULL
+    UNION ALL
+    SELECT op_type, 5 AS seq, id, deposit_timestamp AS timestamp, deposit_account AS account_id, 1 AS subtype FROM transfers
+) AS m
+ORDER BY m.timestamp, m.seq, m.subtype, m.id;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=42 WHERE name='SchemaVersion';
+COMMIT;
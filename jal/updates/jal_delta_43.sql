@@ -0,0 +1,149 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Replace operation_sequence view with a table that is kept in sync by triggers
+-- operation_sequence keeps all operations in the order of their processing by ledger. It is maintained by
+-- operation_sequence_* triggers on operation tables (they work independently of 'TriggersEnabled' setting)
+-- seq - order of operation types with the same timestamp, subtype - type of transfer leg (or type of operation)
+DROP VIEW IF EXISTS operation_sequence;
+DROP TABLE IF EXISTS operation_sequence;
+CREATE TABLE operation_sequence (
+    op_type      INTEGER NOT NULL,
+    seq          INTEGER NOT NULL,
+    id           INTEGER NOT NULL,
+    timestamp    INTEGER NOT NULL,
+    account_id   INTEGER,
+    subtype      INTEGER NOT NULL,
+    PRIMARY KEY (op_type, id, subtype)
+);
+DROP INDEX IF EXISTS operation_sequence_by_time;
+CREATE UNIQUE INDEX operation_sequence_by_time ON operation_sequence (timestamp, seq, subtype, id);
+DROP INDEX IF EXISTS operation_sequence_by_account;
+CREATE INDEX operation_sequence_by_account ON operation_sequence (account_id, timestamp);
+
+INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+SELECT op_type, 1, id, timestamp, account_id, 0 FROM actions
+UNION ALL
+SELECT op_type, 2, id, timestamp, account_id, type FROM dividends
+UNION ALL
+SELECT op_type, 3, id, timestamp, account_id, type FROM asset_actions
+UNION ALL
+SELECT op_type, 4, id, timestamp, account_id, 0 FROM trades
+UNION ALL
+SELECT op_type, 5, id, withdrawal_timestamp, withdrawal_account, -1 FROM transfers
+UNION ALL
+SELECT op_type, 5, id, withdrawal_timestamp, fee_account, 0 FROM transfers WHERE NOT fee IS NULL
+UNION ALL
+SELECT op_type, 5, id, deposit_timestamp, deposit_account, 1 FROM transfers;
+
+-- Triggers: operation_sequence_* keep operation_sequence table in sync with operation tables
+DROP TRIGGER IF EXISTS operation_sequence_actions_insert;
+CREATE TRIGGER operation_sequence_actions_insert AFTER INSERT ON actions FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 1, NEW.id, NEW.timestamp, NEW.account_id, 0);
+END;
+DROP TRIGGER IF EXISTS operation_sequence_actions_update;
+CREATE TRIGGER operation_sequence_actions_update AFTER UPDATE OF id, timestamp, account_id ON actions FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET id=NEW.id, timestamp=NEW.timestamp, account_id=NEW.account_id
+    WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+DROP TRIGGER IF EXISTS operation_sequence_actions_delete;
+CREATE TRIGGER operation_sequence_actions_delete AFTER DELETE ON actions FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS operation_sequence_dividends_insert;
+CREATE TRIGGER operation_sequence_dividends_insert AFTER INSERT ON dividends FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 2, NEW.id, NEW.timestamp, NEW.account_id, NEW.type);
+END;
+DROP TRIGGER IF EXISTS operation_sequence_dividends_update;
+CREATE TRIGGER operation_sequence_dividends_update AFTER UPDATE OF id, timestamp, account_id, type ON dividends
+FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET id=NEW.id, timestamp=NEW.timestamp, account_id=NEW.account_id, subtype=NEW.type
+    WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+DROP TRIGGER IF EXISTS operation_sequence_dividends_delete;
+CREATE TRIGGER operation_sequence_dividends_delete AFTER DELETE ON dividends FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS operation_sequence_asset_actions_insert;
+CREATE TRIGGER operation_sequence_asset_actions_insert AFTER INSERT ON asset_actions FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 3, NEW.id, NEW.timestamp, NEW.account_id, NEW.type);
+END;
+DROP TRIGGER IF EXISTS operation_sequence_asset_actions_update;
+CREATE TRIGGER operation_sequence_asset_actions_update AFTER UPDATE OF id, timestamp, account_id, type ON asset_actions
+FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET id=NEW.id, timestamp=NEW.timestamp, account_id=NEW.account_id, subtype=NEW.type
+    WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+DROP TRIGGER IF EXISTS operation_sequence_asset_actions_delete;
+CREATE TRIGGER operation_sequence_asset_actions_delete AFTER DELETE ON asset_actions FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS operation_sequence_trades_insert;
+CREATE TRIGGER operation_sequence_trades_insert AFTER INSERT ON trades FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 4, NEW.id, NEW.timestamp, NEW.account_id, 0);
+END;
+DROP TRIGGER IF EXISTS operation_sequence_trades_update;
+CREATE TRIGGER operation_sequence_trades_update AFTER UPDATE OF id, timestamp, account_id ON trades FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET id=NEW.id, timestamp=NEW.timestamp, account_id=NEW.account_id
+    WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+DROP TRIGGER IF EXISTS operation_sequence_trades_delete;
+CREATE TRIGGER operation_sequence_trades_delete AFTER DELETE ON trades FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+
+-- Transfer is represented by 3 rows: withdrawal (subtype -1), fee (subtype 0, only if fee is set) and deposit (1)
+DROP TRIGGER IF EXISTS operation_sequence_transfers_insert;
+CREATE TRIGGER operation_sequence_transfers_insert AFTER INSERT ON transfers FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.withdrawal_account, -1);
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    SELECT NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.fee_account, 0 WHERE NOT NEW.fee IS NULL;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.deposit_timestamp, NEW.deposit_account, 1);
+END;
+DROP TRIGGER IF EXISTS operation_sequence_transfers_update;
+CREATE TRIGGER operation_sequence_transfers_update
+    AFTER UPDATE OF id, withdrawal_timestamp, withdrawal_account, deposit_timestamp, deposit_account, fee_account, fee
+    ON transfers FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type=OLD.op_type AND id=OLD.id;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.withdrawal_account, -1);
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    SELECT NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.fee_account, 0 WHERE NOT NEW.fee IS NULL;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.deposit_timestamp, NEW.deposit_account, 1);
+END;
+DROP TRIGGER IF EXISTS operation_sequence_transfers_delete;
+CREATE TRIGGER operation_sequence_transfers_delete AFTER DELETE ON transfers FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type=OLD.op_type AND id=OLD.id;
+END;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=43 WHERE name='SchemaVersion';
+COMMIT;
@@ -0,0 +1,32 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Table: ledger_monthly keeps sums of ledger amounts per month (timestamp of month start), account, book, category
+-- (0 if records have no category) and asset. It is filled during ledger rebuild and is used by reports
+DROP TABLE IF EXISTS ledger_monthly;
+CREATE TABLE ledger_monthly (
+    id           INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    month        INTEGER NOT NULL,
+    account_id   INTEGER NOT NULL,
+    book_account INTEGER NOT NULL,
+    category_id  INTEGER NOT NULL,
+    asset_id     INTEGER NOT NULL,
+    amount       TEXT    NOT NULL
+);
+DROP INDEX IF EXISTS ledger_monthly_by_month;
+CREATE UNIQUE INDEX ledger_monthly_by_month ON ledger_monthly (month, account_id, book_account, category_id, asset_id);
+DROP INDEX IF EXISTS ledger_monthly_by_account;
+CREATE INDEX ledger_monthly_by_account ON ledger_monthly (account_id, book_account, month);
+
+INSERT INTO ledger_monthly (month, account_id, book_account, category_id, asset_id, amount)
+SELECT CAST(strftime('%s', date(timestamp, 'unixepoch', 'start of month')) AS INTEGER) AS month, account_id,
+       book_account, coalesce(category_id, 0) AS category, asset_id, SUM(amount)
+FROM ledger WHERE NOT asset_id IS NULL
+GROUP BY month, account_id, book_account, category, asset_id;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=44 WHERE name='SchemaVersion';
+COMMIT;
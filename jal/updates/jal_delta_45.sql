@@ -0,0 +1,113 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Table: fx_rates keeps the last quote of every money asset within a day (period 1) and within a month (period 2).
+-- Timestamp is the start of the day/month. It is maintained by fx_rates_* triggers on quotes table
+DROP TABLE IF EXISTS fx_rates;
+CREATE TABLE fx_rates (
+    id          INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    period      INTEGER NOT NULL,
+    timestamp   INTEGER NOT NULL,
+    asset_id    INTEGER REFERENCES assets (id) ON DELETE CASCADE ON UPDATE CASCADE NOT NULL,
+    currency_id INTEGER REFERENCES assets (id) ON DELETE CASCADE ON UPDATE CASCADE NOT NULL,
+    quote       TEXT    NOT NULL DEFAULT ('0')
+);
+DROP INDEX IF EXISTS fx_rates_by_time;
+CREATE UNIQUE INDEX fx_rates_by_time ON fx_rates (period, asset_id, currency_id, timestamp);
+
+INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+SELECT 1, period_start, asset_id, currency_id, quote FROM (
+    SELECT q.timestamp - q.timestamp % 86400 AS period_start, q.asset_id, q.currency_id, q.quote,
+           MAX(q.timestamp)   -- quote value is taken from the row with max timestamp in group
+    FROM quotes AS q JOIN assets AS a ON a.id=q.asset_id WHERE a.type_id=1
+    GROUP BY period_start, q.asset_id, q.currency_id);
+INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+SELECT 2, period_start, asset_id, currency_id, quote FROM (
+    SELECT CAST(strftime('%s', date(q.timestamp, 'unixepoch', 'start of month')) AS INTEGER) AS period_start, q.asset_id, q.currency_id, q.quote,
+           MAX(q.timestamp)   -- quote value is taken from the row with max timestamp in group
+    FROM quotes AS q JOIN assets AS a ON a.id=q.asset_id WHERE a.type_id=1
+    GROUP BY period_start, q.asset_id, q.currency_id);
+
+-- Triggers: fx_rates_* update day and month rates of money asset (assets.type_id=1) after its quote modification
+DROP TRIGGER IF EXISTS fx_rates_insert;
+CREATE TRIGGER fx_rates_insert AFTER INSERT ON quotes FOR EACH ROW
+    WHEN (SELECT type_id FROM assets WHERE id=NEW.asset_id)=1
+BEGIN
+    DELETE FROM fx_rates WHERE asset_id=NEW.asset_id AND currency_id=NEW.currency_id AND (
+        (period=1 AND timestamp=NEW.timestamp - NEW.timestamp % 86400) OR
+        (period=2 AND timestamp=CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month')) AS INTEGER)));
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 1, NEW.timestamp - NEW.timestamp % 86400, asset_id, currency_id, quote FROM quotes
+    WHERE asset_id=NEW.asset_id AND currency_id=NEW.currency_id
+    AND timestamp>=NEW.timestamp - NEW.timestamp % 86400 AND timestamp<NEW.timestamp - NEW.timestamp % 86400 + 86400
+    ORDER BY timestamp DESC LIMIT 1;
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 2, CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month')) AS INTEGER),
+           asset_id, currency_id, quote
+    FROM quotes WHERE asset_id=NEW.asset_id AND currency_id=NEW.currency_id
+    AND timestamp>=CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month')) AS INTEGER)
+    AND timestamp<CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month', '+1 month')) AS INTEGER)
+    ORDER BY timestamp DESC LIMIT 1;
+END;
+DROP TRIGGER IF EXISTS fx_rates_update;
+CREATE TRIGGER fx_rates_update AFTER UPDATE OF timestamp, asset_id, currency_id, quote ON quotes FOR EACH ROW
+    WHEN (SELECT type_id FROM assets WHERE id=OLD.asset_id)=1 OR (SELECT type_id FROM assets WHERE id=NEW.asset_id)=1
+BEGIN
+    DELETE FROM fx_rates WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id AND (
+        (period=1 AND timestamp=OLD.timestamp - OLD.timestamp % 86400) OR
+        (period=2 AND timestamp=CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month')) AS INTEGER)));
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 1, OLD.timestamp - OLD.timestamp % 86400, asset_id, currency_id, quote FROM quotes
+    WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id
+    AND timestamp>=OLD.timestamp - OLD.timestamp % 86400 AND timestamp<OLD.timestamp - OLD.timestamp % 86400 + 86400
+    ORDER BY timestamp DESC LIMIT 1;
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 2, CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month')) AS INTEGER),
+           asset_id, currency_id, quote
+    FROM quotes WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id
+    AND timestamp>=CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month')) AS INTEGER)
+    AND timestamp<CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month', '+1 month')) AS INTEGER)
+    ORDER BY timestamp DESC LIMIT 1;
+    DELETE FROM fx_rates WHERE asset_id=NEW.asset_id AND currency_id=NEW.currency_id AND (
+        (period=1 AND timestamp=NEW.timestamp - NEW.timestamp % 86400) OR
+        (period=2 AND timestamp=CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month')) AS INTEGER)));
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 1, NEW.timestamp - NEW.timestamp % 86400, asset_id, currency_id, quote FROM quotes
+    WHERE asset_id=NEW.asset_id AND currency_id=NEW.currency_id
+    AND timestamp>=NEW.timestamp - NEW.timestamp % 86400 AND timestamp<NEW.timestamp - NEW.timestamp % 86400 + 86400
+    ORDER BY timestamp DESC LIMIT 1;
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 2, CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month')) AS INTEGER),
+           asset_id, currency_id, quote
+    FROM quotes WHERE asset_id=NEW.asset_id AND currency_id=NEW.currency_id
+    AND timestamp>=CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month')) AS INTEGER)
+    AND timestamp<CAST(strftime('%s', date(NEW.timestamp, 'unixepoch', 'start of month', '+1 month')) AS INTEGER)
+    ORDER BY timestamp DESC LIMIT 1;
+END;
+DROP TRIGGER IF EXISTS fx_rates_delete;
+CREATE TRIGGER fx_rates_delete AFTER DELETE ON quotes FOR EACH ROW
+    WHEN (SELECT type_id FROM assets WHERE id=OLD.asset_id)=1
+BEGIN
+    DELETE FROM fx_rates WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id AND (
+        (period=1 AND timestamp=OLD.timestamp - OLD.timestamp % 86400) OR
+        (period=2 AND timestamp=CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month')) AS INTEGER)));
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 1, OLD.timestamp - OLD.timestamp % 86400, asset_id, currency_id, quote FROM quotes
+    WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id
+    AND timestamp>=OLD.timestamp - OLD.timestamp % 86400 AND timestamp<OLD.timestamp - OLD.timestamp % 86400 + 86400
+    ORDER BY timestamp DESC LIMIT 1;
+    INSERT INTO fx_rates (period, timestamp, asset_id, currency_id, quote)
+    SELECT 2, CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month')) AS INTEGER),
+           asset_id, currency_id, quote
+    FROM quotes WHERE asset_id=OLD.asset_id AND currency_id=OLD.currency_id
+    AND timestamp>=CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month')) AS INTEGER)
+    AND timestamp<CAST(strftime('%s', date(OLD.timestamp, 'unixepoch', 'start of month', '+1 month')) AS INTEGER)
+    ORDER BY timestamp DESC LIMIT 1;
+END;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=45 WHERE name='SchemaVersion';
+COMMIT;
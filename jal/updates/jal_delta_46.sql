@@ -0,0 +1,19 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Indices of open trades: by account/asset for position lookups and partial index of non-zero positions
+-- in FIFO order for ledger rebuild
+DROP INDEX IF EXISTS trades_opened_by_account_asset;
+CREATE INDEX trades_opened_by_account_asset ON trades_opened (account_id, asset_id, op_type, operation_id);
+DROP INDEX IF EXISTS trades_opened_open_lots;
+CREATE INDEX trades_opened_open_lots ON trades_opened (timestamp, op_type DESC, id) WHERE remaining_qty!='0';
+-- Index of closed trades for cleanup before ledger rebuild
+DROP INDEX IF EXISTS trades_closed_by_close_time;
+CREATE INDEX trades_closed_by_close_time ON trades_closed (close_timestamp);
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=46 WHERE name='SchemaVersion';
+COMMIT;
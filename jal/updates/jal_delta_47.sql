@@ -0,0 +1,77 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Scales of older fixed point storage (9 digits for amounts and values, 10 digits for prices and quotes) don't fit
+-- real values into 64-bit integers. Values are converted back into text without rounding and fixed point storage is
+-- switched off. JalDB.update_db_schema() switches it on again with new scales if all values fit into them.
+UPDATE ledger SET
+    amount=CASE WHEN CAST(amount AS INTEGER)<0 THEN '-' ELSE '' END ||
+        (abs(CAST(amount AS INTEGER))/1000000000) ||
+        rtrim(rtrim('.' || printf('%09d', abs(CAST(amount AS INTEGER)) % 1000000000), '0'), '.'),
+    value=CASE WHEN CAST(value AS INTEGER)<0 THEN '-' ELSE '' END ||
+        (abs(CAST(value AS INTEGER))/1000000000) ||
+        rtrim(rtrim('.' || printf('%09d', abs(CAST(value AS INTEGER)) % 1000000000), '0'), '.'),
+    amount_acc=CASE WHEN CAST(amount_acc AS INTEGER)<0 THEN '-' ELSE '' END ||
+        (abs(CAST(amount_acc AS INTEGER))/1000000000) ||
+        rtrim(rtrim('.' || printf('%09d', abs(CAST(amount_acc AS INTEGER)) % 1000000000), '0'), '.'),
+    value_acc=CASE WHEN CAST(value_acc AS INTEGER)<0 THEN '-' ELSE '' END ||
+        (abs(CAST(value_acc AS INTEGER))/1000000000) ||
+        rtrim(rtrim('.' || printf('%09d', abs(CAST(value_acc AS INTEGER)) % 1000000000), '0'), '.')
+WHERE (SELECT value FROM settings WHERE name='FixedPointStorage');
+UPDATE ledger_totals SET
+    amount_acc=CASE WHEN CAST(amount_acc AS INTEGER)<0 THEN '-' ELSE '' END ||
+        (abs(CAST(amount_acc AS INTEGER))/1000000000) ||
+        rtrim(rtrim('.' || printf('%09d', abs(CAST(amount_acc AS INTEGER)) % 1000000000), '0'), '.'),
+    value_acc=CASE WHEN CAST(value_acc AS INTEGER)<0 THEN '-' ELSE '' END ||
+        (abs(CAST(value_acc AS INTEGER))/1000000000) ||
+        rtrim(rtrim('.' || printf('%09d', abs(CAST(value_acc AS INTEGER)) % 1000000000), '0'), '.')
+WHERE (SELECT value FROM settings WHERE name='FixedPointStorage');
+UPDATE ledger_snapshots SET
+    amount_acc=CASE WHEN CAST(amount_acc AS INTEGER)<0 THEN '-' ELSE '' END ||
+        (abs(CAST(amount_acc AS INTEGER))/1000000000) ||
+        rtrim(rtrim('.' || printf('%09d', abs(CAST(amount_acc AS INTEGER)) % 1000000000), '0'), '.'),
+    value_acc=CASE WHEN CAST(value_acc AS INTEGER)<0 THEN '-' ELSE '' END ||
+        (abs(CAST(value_acc AS INTEGER))/1000000000) ||
+        rtrim(rtrim('.' || printf('%09d', abs(CAST(value_acc AS INTEGER)) % 1000000000), '0'), '.')
+WHERE (SELECT value FROM settings WHERE name='FixedPointStorage');
+UPDATE ledger_monthly SET
+    amount=CASE WHEN CAST(amount AS INTEGER)<0 THEN '-' ELSE '' END ||
+        (abs(CAST(amount AS INTEGER))/1000000000) ||
+        rtrim(rtrim('.' || printf('%09d', abs(CAST(amount AS INTEGER)) % 1000000000), '0'), '.')
+WHERE (SELECT value FROM settings WHERE name='FixedPointStorage');
+UPDATE trades_opened SET
+    price=CASE WHEN CAST(price AS INTEGER)<0 THEN '-' ELSE '' END ||
+        (abs(CAST(price AS INTEGER))/10000000000) ||
+        rtrim(rtrim('.' || printf('%010d', abs(CAST(price AS INTEGER)) % 10000000000), '0'), '.'),
+    remaining_qty=CASE WHEN CAST(remaining_qty AS INTEGER)<0 THEN '-' ELSE '' END ||
+        (abs(CAST(remaining_qty AS INTEGER))/1000000000) ||
+        rtrim(rtrim('.' || printf('%09d', abs(CAST(remaining_qty AS INTEGER)) % 1000000000), '0'), '.')
+WHERE (SELECT value FROM settings WHERE name='FixedPointStorage');
+UPDATE quotes SET
+    quote=CASE WHEN CAST(quote AS INTEGER)<0 THEN '-' ELSE '' END ||
+        (abs(CAST(quote AS INTEGER))/10000000000) ||
+        rtrim(rtrim('.' || printf('%010d', abs(CAST(quote AS INTEGER)) % 10000000000), '0'), '.')
+WHERE (SELECT value FROM settings WHERE name='FixedPointStorage');
+UPDATE settings SET value=0 WHERE name='FixedPointStorage';
+INSERT OR REPLACE INTO settings(id, name, value) VALUES (12, 'FixedPointQtyMultiplier', 100000000);
+
+DROP TRIGGER IF EXISTS on_closed_trade_delete;
+CREATE TRIGGER on_closed_trade_delete
+    AFTER DELETE ON trades_closed
+    FOR EACH ROW
+    WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    -- 'FixedPointQtyMultiplier' is a scale of 'remaining_qty' if 'FixedPointStorage' is on (see jal/db/helpers.py)
+    UPDATE trades_opened
+    SET remaining_qty = remaining_qty + CASE WHEN (SELECT value FROM settings WHERE name='FixedPointStorage')
+        THEN CAST(ROUND(OLD.qty * (SELECT value FROM settings WHERE name='FixedPointQtyMultiplier')) AS INTEGER)
+        ELSE OLD.qty END
+    WHERE op_type=OLD.open_op_type AND operation_id=OLD.open_op_id AND account_id=OLD.account_id AND asset_id = OLD.asset_id;
+END;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=47 WHERE name='SchemaVersion';
+COMMIT;
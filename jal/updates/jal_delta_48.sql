@@ -0,0 +1,291 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Operation triggers delete monthly sums of ledger together with ledger records
+-- Trigger: action_details_after_delete
+DROP TRIGGER IF EXISTS action_details_after_delete;
+CREATE TRIGGER action_details_after_delete
+      AFTER DELETE ON action_details
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM actions WHERE id = OLD.pid);
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        (SELECT timestamp FROM actions WHERE id = OLD.pid),
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+
+-- Trigger: action_details_after_insert
+DROP TRIGGER IF EXISTS action_details_after_insert;
+CREATE TRIGGER action_details_after_insert
+      AFTER INSERT ON action_details
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM actions WHERE id = NEW.pid);
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        (SELECT timestamp FROM actions WHERE id = NEW.pid),
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+-- Trigger: action_details_after_update
+DROP TRIGGER IF EXISTS action_details_after_update;
+CREATE TRIGGER action_details_after_update
+      AFTER UPDATE ON action_details
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM actions WHERE id = OLD.pid );
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        (SELECT timestamp FROM actions WHERE id = OLD.pid),
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+-- Trigger: actions_after_delete
+DROP TRIGGER IF EXISTS actions_after_delete;
+CREATE TRIGGER actions_after_delete
+      AFTER DELETE ON actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM action_details WHERE pid = OLD.id;
+    DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        OLD.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+-- Trigger: actions_after_insert
+DROP TRIGGER IF EXISTS actions_after_insert;
+CREATE TRIGGER actions_after_insert
+      AFTER INSERT ON actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        NEW.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+-- Trigger: actions_after_update
+DROP TRIGGER IF EXISTS actions_after_update;
+CREATE TRIGGER actions_after_update
+      AFTER UPDATE OF timestamp, account_id, peer_id ON actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(OLD.timestamp, NEW.timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+-- Trigger: dividends_after_delete
+DROP TRIGGER IF EXISTS dividends_after_delete;
+CREATE TRIGGER dividends_after_delete
+      AFTER DELETE ON dividends
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        OLD.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+-- Trigger: dividends_after_insert
+DROP TRIGGER IF EXISTS dividends_after_insert;
+CREATE TRIGGER dividends_after_insert
+      AFTER INSERT ON dividends
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        NEW.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+-- Trigger: dividends_after_update
+DROP TRIGGER IF EXISTS dividends_after_update;
+CREATE TRIGGER dividends_after_update
+      AFTER UPDATE OF timestamp, account_id, asset_id, amount, tax ON dividends
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(OLD.timestamp, NEW.timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+DROP TRIGGER IF EXISTS trades_after_delete;
+CREATE TRIGGER trades_after_delete
+         AFTER DELETE ON trades
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        OLD.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
+    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp;
+END;
+
+DROP TRIGGER IF EXISTS trades_after_insert;
+CREATE TRIGGER trades_after_insert
+      AFTER INSERT ON trades
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        NEW.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
+    DELETE FROM trades_opened WHERE timestamp >= NEW.timestamp;
+END;
+
+DROP TRIGGER IF EXISTS trades_after_update;
+CREATE TRIGGER trades_after_update
+      AFTER UPDATE OF timestamp, account_id, asset_id, qty, price, fee ON trades
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(OLD.timestamp, NEW.timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
+    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+END;
+
+DROP TRIGGER IF EXISTS asset_action_after_delete;
+CREATE TRIGGER asset_action_after_delete
+      AFTER DELETE ON asset_actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        OLD.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
+    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp;
+END;
+
+DROP TRIGGER IF EXISTS asset_action_after_insert;
+CREATE TRIGGER asset_action_after_insert
+      AFTER INSERT ON asset_actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        NEW.timestamp,
+        'unixepoch', 'start of month')) AS INTEGER);
+    DELETE FROM trades_opened WHERE timestamp >= NEW.timestamp;
+END;
+
+DROP TRIGGER IF EXISTS asset_action_after_update;
+CREATE TRIGGER asset_action_after_update
+      AFTER UPDATE OF timestamp, account_id, type, asset_id, qty ON asset_actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(OLD.timestamp, NEW.timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
+    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp  OR timestamp >= NEW.timestamp;
+END;
+
+DROP TRIGGER IF EXISTS asset_result_after_delete;
+CREATE TRIGGER asset_result_after_delete
+      AFTER DELETE ON action_results
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id);
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id),
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+DROP TRIGGER IF EXISTS asset_result_after_insert;
+CREATE TRIGGER asset_result_after_insert
+      AFTER INSERT ON action_results
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM asset_actions WHERE id = NEW.action_id);
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        (SELECT timestamp FROM asset_actions WHERE id = NEW.action_id),
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+DROP TRIGGER IF EXISTS asset_result_after_update;
+CREATE TRIGGER asset_result_after_update
+      AFTER UPDATE OF asset_id, qty, value_share ON action_results
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id);
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id),
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+DROP TRIGGER IF EXISTS transfers_after_delete;
+CREATE TRIGGER transfers_after_delete
+      AFTER DELETE ON transfers
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= OLD.withdrawal_timestamp OR timestamp >= OLD.deposit_timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(OLD.withdrawal_timestamp, OLD.deposit_timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+DROP TRIGGER IF EXISTS transfers_after_insert;
+CREATE TRIGGER transfers_after_insert
+      AFTER INSERT ON transfers
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= NEW.withdrawal_timestamp OR timestamp >= NEW.deposit_timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(NEW.withdrawal_timestamp, NEW.deposit_timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+
+DROP TRIGGER IF EXISTS transfers_after_update;
+CREATE TRIGGER transfers_after_update
+      AFTER UPDATE OF withdrawal_timestamp, deposit_timestamp, withdrawal_account, deposit_account, fee_account,
+                      withdrawal, deposit, fee, asset ON transfers
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE timestamp >= OLD.withdrawal_timestamp OR timestamp >= OLD.deposit_timestamp OR
+                timestamp >= NEW.withdrawal_timestamp OR timestamp >= NEW.deposit_timestamp;
+    DELETE FROM ledger_monthly WHERE month >= CAST(strftime('%s', date(
+        min(OLD.withdrawal_timestamp, OLD.deposit_timestamp, NEW.withdrawal_timestamp, NEW.deposit_timestamp),
+        'unixepoch', 'start of month')) AS INTEGER);
+END;
+-- Monthly sums after the last ledger record may be left by operation modifications. Sums of the last month are
+-- re-calculated as it may be partially deleted
+DELETE FROM ledger_monthly WHERE month >= (
+    SELECT CAST(strftime('%s', date(coalesce(MAX(timestamp), 0), 'unixepoch', 'start of month')) AS INTEGER) FROM ledger);
+INSERT INTO ledger_monthly (month, account_id, book_account, category_id, asset_id, amount)
+SELECT CAST(strftime('%s', date(timestamp, 'unixepoch', 'start of month')) AS INTEGER) AS m,
+       account_id, book_account, coalesce(category_id, 0) AS category, asset_id, SUM(amount)
+FROM ledger WHERE NOT asset_id IS NULL AND timestamp >= (
+    SELECT CAST(strftime('%s', date(coalesce(MAX(timestamp), 0), 'unixepoch', 'start of month')) AS INTEGER) FROM ledger)
+GROUP BY m, account_id, book_account, category, asset_id;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=48 WHERE name='SchemaVersion';
+COMMIT;
@@ -241,6 +241,7 @@ class MainWindow(QMainWindow, Ui_JAL_MainWindow):
             QuotesListDialog().exec()
         else:
             assert False, f"Unexpected dialog call: '{dlg_type}'"
+        self.updateWidgets()    # reference data might be changed in dialog, i.e. cached data of widgets are outdated
 
     @Slot()
     def updateWidgets(self):
@@ -164,6 +164,7 @@ class OperationsWidget(MdiWidget, Ui_OperationsWidget):
         account_id = self.operations_model.data(idx, Qt.UserRole, field="account_id")
         JalAccount(account_id).reconcile(timestamp)
         self.operations_model.refresh()
+        self.balances_model.update()    # cached balances keep days since last reconciliation
 
     def refresh(self):
         self.balances_model.update()
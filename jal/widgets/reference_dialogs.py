@@ -1,8 +1,9 @@
+from decimal import Decimal, InvalidOperation
 from PySide6.QtCore import Qt, QModelIndex
 from PySide6.QtSql import QSqlRelation, QSqlRelationalDelegate, QSqlIndex
 from PySide6.QtWidgets import QAbstractItemView
 from jal.constants import PredefindedAccountType, PredefinedAsset
-from jal.db.helpers import readSQL
+from jal.db.helpers import readSQL, decimal2db, db2decimal
 from jal.db.reference_models import AbstractReferenceListModel, SqlTreeModel
 from jal.widgets.delegates import TimestampDelegate, BoolDelegate, FloatDelegate, \
     PeerSelectorDelegate, AssetSelectorDelegate
@@ -385,6 +386,22 @@ class QuotesListModel(AbstractReferenceListModel):
         self._lookup_delegate = None
         self.setRelation(self.fieldIndex("currency_id"), QSqlRelation("currencies", "id", "symbol"))
 
+    # Quotes might be stored as scaled integers so they are converted to decimal values for display and edit
+    def data(self, index, role=Qt.DisplayRole):
+        value = super().data(index, role)
+        if index.isValid() and index.column() == self.fieldIndex("quote") and role in [Qt.DisplayRole, Qt.EditRole] \
+                and value is not None and value != '':
+            return str(db2decimal(value, 'quote'))
+        return value
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if index.column() == self.fieldIndex("quote") and role == Qt.EditRole:
+            try:
+                value = decimal2db(Decimal(value), 'quote')
+            except (InvalidOperation, TypeError):
+                return False
+        return super().setData(index, value, role)
+
     def configureView(self):
         super().configureView()
         self._view.setColumnWidth(self.fieldIndex("timestamp"),
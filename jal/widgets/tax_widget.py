@@ -1,18 +1,13 @@
 from functools import partial
 from datetime import datetime
-import logging
 
 from PySide6.QtCore import Property, Slot
 from PySide6.QtWidgets import QFileDialog, QMessageBox
 from jal.ui.ui_tax_export_widget import Ui_TaxWidget
 from jal.ui.ui_flow_export_widget import Ui_MoneyFlowWidget
 from jal.widgets.mdi import MdiWidget
-from jal.db.peer import JalPeer
-from jal.db.country import JalCountry
 from jal.data_export.taxes import TaxesRus
 from jal.data_export.taxes_flow import TaxesFlowRus
-from jal.data_export.xlsx import XLSX
-from jal.data_export.dlsg import DLSG
 
 
 class TaxWidget(MdiWidget, Ui_TaxWidget):
@@ -81,44 +76,10 @@ class TaxWidget(MdiWidget, Ui_TaxWidget):
             QMessageBox().warning(self, self.tr("Data are incomplete"),
                                   self.tr("You haven't selected an account for tax report"), QMessageBox.Ok)
             return
-        taxes = TaxesRus()
-        tax_report = taxes.prepare_tax_report(self.year, self.account, use_settlement=(not self.no_settelement))
-
-        reports_xls = XLSX(self.xls_filename)
-        templates = {
-            "Дивиденды": "tax_rus_dividends.json",
-            "Акции": "tax_rus_trades.json",
-            "Облигации": "tax_rus_bonds.json",
-            "ПФИ": "tax_rus_derivatives.json",
-            "Криптовалюты": "tax_rus_crypto.json",
-            "Корп.события": "tax_rus_corporate_actions.json",
-            "Комиссии": "tax_rus_fees.json",
-            "Проценты": "tax_rus_interests.json"
-        }
-        parameters = {
-            "period": f"{datetime.utcfromtimestamp(taxes.year_begin).strftime('%d.%m.%Y')}"
-                      f" - {datetime.utcfromtimestamp(taxes.year_end - 1).strftime('%d.%m.%Y')}",
-            "account": f"{taxes.account.number()} ({taxes.account.currency()})",
-            "currency": taxes.account.currency(),
-            "broker_name": JalPeer(taxes.account.organization()).name(),
-            "broker_iso_country": JalCountry(taxes.account.country()).iso_code()
-        }
-        for section in tax_report:
-            if section not in templates:
-                continue
-            reports_xls.output_data(tax_report[section], templates[section], parameters)
-        reports_xls.save()
-
-        logging.info(self.tr("Tax report saved to file ") + f"'{self.xls_filename}'")
-
-        if self.update_dlsg:
-            tax_forms = DLSG(self.year, broker_as_income=self.dlsg_broker_as_income,
-                             only_dividends=self.dlsg_dividends_only)
-            tax_forms.update_taxes(tax_report, parameters)
-            try:
-                tax_forms.save(self.dlsg_filename)
-            except:
-                logging.error(self.tr("Can't write tax form into file ") + f"'{self.dlsg_filename}'")
+        dlsg_filename = self.dlsg_filename if self.update_dlsg else ''
+        TaxesRus().save_tax_report(self.year, self.account, self.xls_filename, use_settlement=(not self.no_settelement),
+                                   dlsg_filename=dlsg_filename, broker_as_income=self.dlsg_broker_as_income,
+                                   only_dividends=self.dlsg_dividends_only)
 
 
 class MoneyFlowWidget(MdiWidget, Ui_MoneyFlowWidget):
@@ -151,16 +112,5 @@ class MoneyFlowWidget(MdiWidget, Ui_MoneyFlowWidget):
 
     @Slot()
     def SaveReport(self):
-        taxes_flow = TaxesFlowRus()
-        flow_report = taxes_flow.prepare_flow_report(self.year)
-
-        reports_xls = XLSX(self.xls_filename)
-        parameters = {
-            "period": f"{datetime.utcfromtimestamp(taxes_flow.year_begin).strftime('%d.%m.%Y')}"
-                      f" - {datetime.utcfromtimestamp(taxes_flow.year_end - 1).strftime('%d.%m.%Y')}"
-        }
-        reports_xls.output_data(flow_report, "tax_rus_flow.json", parameters)
-        reports_xls.save()
-
-        logging.info(self.tr("Money flow report saved to file ") + f"'{self.xls_filename}'")
+        TaxesFlowRus().save_flow_report(self.year, self.xls_filename)
         self.close()
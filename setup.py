@@ -39,7 +39,7 @@ setup(
     ],
     install_requires=["lxml", "pandas", "PySide6>=6.2.0", "requests", "XlsxWriter", "jsonschema", "sqlparse"],
     entry_points={
-        'console_scripts': ['jal=jal.jal:main', ]
+        'console_scripts': ['jal=jal.jal:main', 'jal-cli=jal.jal_cli:main']
     },
     include_package_data=True,
     package_data={
@@ -1,5 +1,6 @@
 from decimal import Decimal
 from jal.db.helpers import executeSQL
+from jal.db.db import QuoteIndex
 from jal.db.operations import Dividend
 from constants import PredefinedAsset
 
@@ -60,6 +61,7 @@ def create_quotes(asset_id, currency_id, quotes):
                           [(":asset_id", asset_id), (":currency_id", currency_id),
                            (":timestamp", quote[0]), (":quote", quote[1])],
                           commit=True) is not None
+    QuoteIndex.invalidate(asset_id, currency_id)
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,110 @@
+import pandas as pd
+from decimal import Decimal
+
+from tests.fixtures import project_root, data_path, prepare_db, prepare_db_fifo
+from tests.helpers import create_stocks, create_quotes, create_actions
+from constants import PredefindedAccountType, PredefinedCategory, FxPeriod
+from jal.db.ledger import Ledger
+from jal.db.helpers import readSQL, executeSQL, readSQLrecord, db2decimal
+from jal.db.db import JalDBObject, QuoteIndex
+from jal.db.asset import JalAsset
+from jal.db.holdings import JalHoldings
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_quotes_bulk(prepare_db_fifo, tmp_path):
+    create_stocks([(4, 'A', 'A SHARE')], currency_id=2)
+    asset = JalAsset(4)
+    data = pd.DataFrame({'Close': [Decimal('10.5'), None, Decimal('11.25')]},
+                        index=pd.to_datetime(['2021-04-13', '2021-04-14', '2021-04-15'], format="%Y-%m-%d"))
+    assert asset.set_quotes_bulk(data, 2) == 2
+    assert asset.quotes_range(2) == (1618272000, 1618444800)
+    assert asset.quote(1618358400, 2) == (1618272000, Decimal('10.5'))
+    assert asset.quote(1618444800, 2) == (1618444800, Decimal('11.25'))
+
+    # Column arrays with mixed quote types replace existing quotes
+    assert asset.set_quotes_bulk({'timestamp': [1618444800, 1618531200, None], 'quote': ['12.1', 12.2, 12.3]}, 2) == 2
+    assert asset.quote(1618444800, 2) == (1618444800, Decimal('12.1'))
+    assert asset.quote(1618531200, 2) == (1618531200, Decimal('12.2'))
+    assert asset.set_quotes_bulk({'timestamp': [], 'quote': []}, 2) == 0
+
+    # Old interface gives the same result
+    asset.set_quotes([{'timestamp': 1618617600, 'quote': Decimal('13')}, {'timestamp': None, 'quote': None}], 2)
+    assert readSQL("SELECT COUNT(*) FROM quotes WHERE asset_id=4") == 4
+
+    with open(tmp_path / "quotes.csv", 'w') as csv_file:
+        csv_file.write("Date,Close\n2021-04-19,14.01\n2021-04-20,14.02\n")
+    assert asset.load_quotes_csv(str(tmp_path / "quotes.csv"), 2) == 2
+    assert asset.quote(1618963200, 2) == (1618876800, Decimal('14.02'))
+    with open(tmp_path / "quotes.csv", 'w') as csv_file:
+        csv_file.write("timestamp,quote\n1618963200,15\n")
+    assert asset.load_quotes_csv(str(tmp_path / "quotes.csv"), 2) == 1
+    assert asset.quote(1618963200, 2) == (1618963200, Decimal('15'))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_quote_index(prepare_db_fifo):
+    create_stocks([(4, 'A', 'A SHARE')], currency_id=2)
+    create_quotes(4, 2, [(1618272000, 10.0), (1618444800, 12.0)])
+    asset = JalAsset(4)
+    QuoteIndex.clear()
+    assert asset.quote(1618271999, 2) == (0, Decimal('0'))
+    assert asset.quote(1618272000, 2) == (1618272000, Decimal('10'))
+    assert asset.quote(1618358400, 2) == (1618272000, Decimal('10'))
+    assert asset.quote(1700000000, 2) == (1618444800, Decimal('12'))
+    assert asset.quote(1700000000, 1) == (0, Decimal('0'))
+    assert asset.quotes_at([1618444800, 1, 1618358400], 2) == [(1618444800, Decimal('12')), (0, Decimal('0')),
+                                                               (1618272000, Decimal('10'))]
+    assert QuoteIndex.stats() == {'series': 2, 'quotes': 2, 'lookups': 8, 'loads': 2}
+
+    # Series is reloaded after quotes update
+    asset.set_quotes([{'timestamp': 1618358400, 'quote': Decimal('11')}], 2)
+    assert asset.quote(1618358400, 2) == (1618358400, Decimal('11'))
+    assert QuoteIndex.stats()['loads'] == 3
+    JalDBObject.invalidate_table("quotes")
+    assert QuoteIndex.stats()['series'] == 0
+    assert asset.quote(1618358400, '2') == (1618358400, Decimal('11'))   # Currency id might be given as a string
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_fx_rates(prepare_db):
+    def rates(period):
+        query = executeSQL("SELECT timestamp, quote FROM fx_rates WHERE period=:period AND asset_id=2 "
+                           "AND currency_id=1 ORDER BY timestamp", [(":period", period)])
+        result = []
+        while query.next():
+            timestamp, quote = readSQLrecord(query)
+            result.append((timestamp, db2decimal(quote, 'quote')))
+        return result
+
+    create_stocks([(4, 'A', 'A SHARE')], currency_id=2)
+    # 2 quotes on 2022-01-10, 1 quote on 2022-01-20 and 1 quote on 2022-02-05
+    assert JalAsset(2).set_quotes_bulk({'timestamp': [1641772800, 1641816000, 1642636800, 1644019200],
+                                        'quote': [Decimal('75'), Decimal('76'), Decimal('77'), Decimal('78')]}, 1) == 4
+    assert JalAsset(4).set_quotes_bulk({'timestamp': [1641772800], 'quote': [Decimal('10')]}, 2) == 1
+    assert rates(FxPeriod.Day) == [(1641772800, Decimal('76')), (1642636800, Decimal('77')),
+                                   (1644019200, Decimal('78'))]
+    assert rates(FxPeriod.Month) == [(1640995200, Decimal('77')), (1643673600, Decimal('78'))]
+    assert readSQL("SELECT COUNT(*) FROM fx_rates WHERE asset_id=4") == 0
+
+    # New quotes replace rates of their day and month only
+    assert JalAsset(2).set_quotes_bulk({'timestamp': [1641816000, 1643587200], 'quote': [Decimal('80'), Decimal('79')]},
+                                       1) == 2
+    assert rates(FxPeriod.Day) == [(1641772800, Decimal('80')), (1642636800, Decimal('77')),
+                                   (1643587200, Decimal('79')), (1644019200, Decimal('78'))]
+    assert rates(FxPeriod.Month) == [(1640995200, Decimal('79')), (1643673600, Decimal('78'))]
+    assert executeSQL("DELETE FROM quotes WHERE asset_id=2 AND timestamp>=1643587200", commit=True) is not None
+    assert rates(FxPeriod.Day) == [(1641772800, Decimal('80')), (1642636800, Decimal('77'))]
+    assert rates(FxPeriod.Month) == [(1640995200, Decimal('77'))]
+
+    # Account snapshot takes the last day rate of account currency
+    assert executeSQL("INSERT INTO agents (pid, name) VALUES (0, 'Bank')") is not None
+    assert executeSQL("INSERT INTO accounts (type_id, name, currency_id, active) VALUES (:type, 'USD', 2, 1)",
+                      [(":type", PredefindedAccountType.Bank)], commit=True) is not None
+    create_actions([(1641772800, 1, 1, [(PredefinedCategory.Interest, 10)])])
+    Ledger().rebuild(from_timestamp=0)
+    assert JalHoldings(1642723200, 1).rate(1) == Decimal('77')
+    # Quotes of the snapshot day that are made after snapshot time aren't used
+    assert JalHoldings(1641790800, 1).rate(1) == Decimal('75')
+    assert JalHoldings(1641816000, 1).rate(1) == Decimal('80')
+    assert JalHoldings(1641859200, 1).rate(1) == Decimal('80')
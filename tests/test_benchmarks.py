@@ -0,0 +1,41 @@
+from PySide6.QtWidgets import QApplication
+from tests.fixtures import project_root, data_path, prepare_db
+from constants import BookAccount
+from jal.db.ledger import Ledger
+from jal.db.helpers import readSQL
+from benchmarks.generator import PortfolioGenerator
+from benchmarks.run import run
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_portfolio_generator(prepare_db):
+    config = {'seed': 7, 'accounts': 2, 'assets': 3, 'years': 1, 'trades': 200, 'dividends': 20, 'transfers': 5,
+              'corp_actions': 2}
+    portfolio = PortfolioGenerator(**config)
+    assert portfolio.config() == config
+    assert portfolio.statement(10) == PortfolioGenerator(**config).statement(10)
+    quotes = readSQL("SELECT COUNT(*) FROM quotes")
+    portfolio.populate()
+    assert readSQL("SELECT COUNT(*) FROM trades") == 200
+    assert readSQL("SELECT COUNT(*) FROM transfers") == 5
+    assert readSQL("SELECT COUNT(*) FROM quotes") == quotes + 4 * 365
+    assert 0 < readSQL("SELECT COUNT(*) FROM dividends") <= 20
+    assert readSQL("SELECT COUNT(*) FROM asset_actions") == 2
+
+    Ledger().rebuild(from_timestamp=0)
+    assert readSQL("SELECT COUNT(*) FROM ledger") > 0
+    # Generator never sells more than it holds
+    assert readSQL("SELECT COUNT(*) FROM ledger WHERE book_account=:assets AND CAST(amount_acc AS REAL)<0",
+                   [(":assets", BookAccount.Assets)]) == 0
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_benchmark_reports(prepare_db):
+    app = QApplication.instance() or QApplication([])
+    portfolio = PortfolioGenerator(seed=3, accounts=1, assets=2, years=1, trades=100, dividends=10, transfers=2,
+                                   corp_actions=1)
+    portfolio.populate()
+    Ledger().rebuild(from_timestamp=0)
+    results = run(portfolio, 1, ["report_profit_loss", "report_deals", "report_income_spending"])
+    assert sorted(results.keys()) == ["report_deals", "report_income_spending", "report_profit_loss"]
+    assert all(len(x['runs']) == 1 for x in results.values())
@@ -0,0 +1,34 @@
+import os
+from tests.fixtures import project_root, data_path, prepare_db, prepare_db_ibkr
+from jal.db.helpers import readSQL
+from jal.jal_cli import create_parser, run
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_cli(tmp_path, data_path, prepare_db_ibkr, capsys):
+    def cli(*args):
+        return run(create_parser().parse_args(["--db", str(tmp_path)] + list(args)))
+
+    assert cli("import", "json", data_path + "ibkr.json", "--account", "1", "--no-rebuild") == 0
+    output = capsys.readouterr().out
+    assert output.startswith("import: ")
+    assert f"  trades: {readSQL('SELECT COUNT(*) FROM trades')}\n" in output
+    assert readSQL("SELECT COUNT(*) FROM ledger") == 0
+
+    assert cli("rebuild", "--since", "2020-01-01") == 0
+    assert f"  ledger: {readSQL('SELECT COUNT(*) FROM ledger')}\n" in capsys.readouterr().out
+    assert readSQL("SELECT COUNT(*) FROM ledger") > 0
+
+    assert cli("--sqlite3", "flow", "2020", str(tmp_path / "flow.xlsx")) == 0
+    assert cli("taxes", "2020", "1", str(tmp_path / "taxes.xlsx")) == 0
+    assert "  Дивиденды: " in capsys.readouterr().out
+    assert os.path.getsize(tmp_path / "flow.xlsx") > 0 and os.path.getsize(tmp_path / "taxes.xlsx") > 0
+
+    with open(tmp_path / "quotes.csv", 'w') as csv_file:
+        csv_file.write("date,quote\n2020-12-01,100\n2020-12-02,101\n")
+    assert cli("load-quotes", "4", "2", str(tmp_path / "quotes.csv")) == 0
+    assert "  quotes: 2\n" in capsys.readouterr().out
+    assert cli("load-quotes", "4", "2", str(tmp_path / "missing.csv")) == 1
+
+    assert cli("import", "unknown", data_path + "ibkr.json") == 1
+    assert cli("--db", str(tmp_path / "missing"), "rebuild") == 1
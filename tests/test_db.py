@@ -0,0 +1,141 @@
+from decimal import Decimal
+
+from tests.fixtures import project_root, data_path, prepare_db, prepare_db_fifo
+from tests.helpers import create_stocks, create_quotes, create_trades
+from jal.db.ledger import Ledger
+from jal.db.helpers import readSQL, executeSQL, executeSQLbatch, readSQLrecord, query_cache_stats, db_connection, \
+    close_db_connection
+from jal.db.db import JalDB, JalDBObject
+from jal.db.backend import QtSqlBackend, Sqlite3Backend
+from jal.db.settings import JalSettings
+from jal.db.account import JalAccount
+from jal.db.asset import JalAsset
+from jal.db.peer import JalPeer
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_identity_map(prepare_db):
+    assert executeSQL("INSERT INTO agents (pid, name) VALUES (0, 'Test Peer')") is not None
+    assert executeSQL("INSERT INTO accounts (id, type_id, name, currency_id, active, number) "
+                      "VALUES (1, 1, 'Wallet', 2, 1, 'W1')") is not None
+    create_stocks([(4, 'A', 'A SHARE')], currency_id=2)
+    assert JalDBObject.cache_stats() == {'size': 0, 'hits': 0, 'misses': 0}
+
+    account = JalAccount(1)
+    assert JalAccount(1) is account
+    assert JalAsset(4) is JalAsset(4)
+    assert JalAsset(4) is not JalAccount(1)
+    assert JalAccount(99) is not JalAccount(99)   # Non-existing records aren't cached
+    assert JalDBObject.cache_stats() == {'size': 2, 'hits': 4, 'misses': 4}
+    # Objects created by search are not taken from the map
+    assert JalPeer(data={'name': 'Test Peer'}, search=True).id() == 1
+    assert JalPeer(1) is not JalPeer(data={'name': 'Test Peer'}, search=True)
+
+    # Mutators invalidate cached objects
+    account.set_organization(1)
+    assert JalAccount(1) is not account
+    assert JalAccount(1).organization() == 1
+    JalAccount(1).reconcile(1640995200)
+    assert JalAccount(1).reconciled_at() == 1640995200
+    asset = JalAsset(4)
+    asset.update_data({'isin': 'US0000000001'})
+    assert JalAsset(4) is not asset
+    assert JalAsset(4).isin() == 'US0000000001'
+    # Table based invalidation is used by reference data editors
+    assert executeSQL("UPDATE agents SET name='New name' WHERE id=1") is not None
+    assert JalPeer(1).name() == 'Test Peer'
+    JalDBObject.invalidate_table("agents")
+    assert JalPeer(1).name() == 'New name'
+
+    JalDBObject.clear_cache()
+    assert JalDBObject.cache_stats() == {'size': 0, 'hits': 0, 'misses': 0}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_query_cache(prepare_db_fifo):
+    sql = "SELECT COUNT(*) FROM assets WHERE id<=:id"
+    assert readSQL(sql, [(":id", 2)]) == 2
+    stats = query_cache_stats()
+    assert readSQL(sql, [(":id", 3)]) == 3
+    assert query_cache_stats()['hits'] == stats['hits'] + 1
+    assert executeSQLbatch("INSERT INTO settings (name, value) VALUES (:name, :value)",
+                           [(":name", ['Test1', 'Test2']), (":value", [1, 2])]) is not None
+    stats = query_cache_stats()
+    assert executeSQLbatch("INSERT INTO settings (name, value) VALUES (:name, :value)",
+                           [(":name", ['Test3']), (":value", [3])]) is not None
+    assert query_cache_stats()['hits'] == stats['hits'] + 1
+    # Partly read queries don't keep statements active, so table may be dropped after them
+    assert executeSQL("CREATE TABLE test_cache (id INTEGER)") is not None
+    assert executeSQL("INSERT INTO test_cache (id) VALUES (1), (2), (3)") is not None
+    assert readSQL("SELECT id FROM test_cache ORDER BY id") == 1
+    query = executeSQL("SELECT id FROM test_cache ORDER BY id")
+    assert query.next() and readSQLrecord(query) == 1
+    del query
+    assert executeSQL("DROP TABLE test_cache") is not None
+    # Cached queries are dropped with connection close and are prepared again after its re-opening
+    close_db_connection()
+    assert query_cache_stats()['size'] == 0
+    assert db_connection().open()
+    assert readSQL(sql, [(":id", 3)]) == 3
+
+    Ledger().rebuild(from_timestamp=0)
+    stats = query_cache_stats()
+    Ledger().rebuild(from_timestamp=0)   # All queries of 2nd rebuild are already prepared
+    assert query_cache_stats()['misses'] == stats['misses']
+    assert query_cache_stats()['hits'] > stats['hits']
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_sqlite3_backend(prepare_db_fifo):
+    create_stocks([(4, 'A', 'A SHARE')], currency_id=2)
+    create_quotes(4, 2, [(1606813200, 10.5), (1606899600, 11.0)])
+    create_trades(1, [(1606813200, 1606856400, 4, 100.0, 10.0, 1.0)])
+    Ledger().rebuild(from_timestamp=0)
+
+    def dump_data():
+        account = JalAccount(1)
+        return [(x['asset'].id(), x['amount'], x['value']) for x in account.assets_list(1606899600)], \
+            account.get_asset_amount(1606899600, 2), JalAsset(4).quote(1606899600, 2), JalAsset(4).symbol(), \
+            JalDB._readSQL("SELECT id, reconciled_on FROM accounts WHERE id=1", named=True)
+    qt_data = dump_data()
+
+    JalDB.set_backend(Sqlite3Backend(db_connection().databaseName()))
+    try:
+        assert JalDB.backend().name == "sqlite3"
+        assert dump_data() == qt_data
+        assert JalDB._readSQL("SELECT NULL") == ''
+        assert JalDB._readSQL("SELECT id FROM assets WHERE id>3") == 4
+        assert JalDB._readSQL("SELECT id FROM assets WHERE id<3", check_unique=True) is None
+        assert JalDB._executeSQLbatch("INSERT INTO quotes (timestamp, asset_id, currency_id, quote) "
+                                      "VALUES (:timestamp, 4, 2, :quote)",
+                                      [(":timestamp", [1607000000, 1607100000]),
+                                       (":quote", [Decimal('12.50'), Decimal('13')])]) is not None
+        JalSettings().setValue('RebuildDB', 1)
+    finally:
+        JalDB.set_backend(QtSqlBackend())
+    # Data written by one backend are visible for another one
+    assert readSQL("SELECT quote FROM quotes WHERE timestamp=1607000000") == '12.5'
+    assert JalSettings().getValue('RebuildDB') == 1
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_sqlite3_backend_mixed_writes(prepare_db_fifo):
+    create_stocks([(4, 'A', 'A SHARE')], currency_id=2)
+    JalDB.set_backend(Sqlite3Backend(db_connection().databaseName()))
+    try:
+        # Uncommitted change of JalDB backend is committed by rebuild and is seen by ledger
+        JalDB().transaction()
+        assert JalDB._executeSQL("INSERT INTO trades (timestamp, settlement, account_id, asset_id, qty, price, fee) "
+                                 "VALUES (1606813200, 1606856400, 1, 4, 100, 10, 1)") is not None
+        Ledger().rebuild(from_timestamp=0)
+        assert JalDB.backend().name == "sqlite3"
+        assert readSQL("SELECT COUNT(*) FROM trades_opened") == 1
+        # Ledger data written via QtSql connection are visible for JalDB objects after rebuild
+        assert JalAccount(1).get_asset_amount(1606899600, 4) == Decimal('100')
+        assert JalAccount(1).get_asset_amount(1606899600, 2) == Decimal('8999')
+        # Both connections are able to write after each other as none of them keeps a transaction open
+        JalSettings().setValue('RebuildDB', 1)
+        assert executeSQL("UPDATE settings SET value=0 WHERE name='RebuildDB'", commit=True) is not None
+        assert JalSettings().getValue('RebuildDB') == 0
+    finally:
+        JalDB.set_backend(QtSqlBackend())
@@ -1,14 +1,20 @@
+import time
+import threading
 import pandas as pd
+from io import StringIO
 from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from decimal import Decimal
 from pandas._testing import assert_frame_equal
 
-from tests.fixtures import project_root, data_path, prepare_db, prepare_db_moex
-from tests.helpers import create_stocks, create_assets
-from jal.db.helpers import readSQL
+from tests.fixtures import project_root, data_path, prepare_db, prepare_db_moex, prepare_db_fifo
+from tests.helpers import create_stocks, create_assets, create_trades
+from jal.db.helpers import readSQL, executeSQL
 from jal.db.asset import JalAsset
-from jal.constants import PredefinedAsset
-from jal.net.helpers import isEnglish
+from jal.db.ledger import Ledger
+from jal.constants import PredefinedAsset, MarketDataFeed
+from jal.net.helpers import isEnglish, get_web_data, HOST_REQUEST_INTERVAL
+from jal.net.web_cache import WebCache, init_web_cache
 from jal.net.downloader import QuoteDownloader
 from jal.data_import.slips_tax import SlipsTaxAPI
 
@@ -219,3 +225,152 @@ def test_Frankfurt_downloader(prepare_db):
     downloader = QuoteDownloader()
     quotes_downloaded = downloader.YahooFRA_Downloader(JalAsset(4), 3, 1618272000, 1618444800)
     assert_frame_equal(quotes, quotes_downloaded)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Local HTTP server that returns quotes for any symbol and keeps statistics of requests
+class QuotesStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"    # keep-alive connections
+    lock = threading.Lock()
+    active = {}
+    max_active = {}
+    requests = []      # list of (path, client port, start time)
+
+    def do_GET(self):
+        feed = self.path.split('/')[1]
+        with self.lock:
+            self.active[feed] = self.active.get(feed, 0) + 1
+            self.max_active[feed] = max(self.max_active.get(feed, 0), self.active[feed])
+            self.requests.append((self.path, self.client_address[1], time.monotonic()))
+        time.sleep(0.05)
+        body = "Date,Close\n2021-04-13,10.5\n2021-04-14,11\n".encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.lock:
+            self.active[feed] -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_concurrent_downloads(prepare_db_fifo):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), QuotesStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"127.0.0.1:{server.server_port}"
+
+    def stub_loader(feed, asset, _currency_id, _start_timestamp, _end_timestamp):
+        data = pd.read_csv(StringIO(get_web_data(f"http://{host}/{feed}/{asset.symbol()}")), dtype={'Close': str})
+        data['Date'] = pd.to_datetime(data['Date'], format="%Y-%m-%d")
+        data['Close'] = data['Close'].apply(Decimal)
+        return data.set_index("Date")
+
+    stocks = list(range(4, 16))
+    create_stocks([(x, f"S{x}", f"Stock {x}") for x in stocks], currency_id=2)
+    assert executeSQL("UPDATE asset_tickers SET quote_source=:us WHERE asset_id>=4",
+                      [(":us", MarketDataFeed.US)]) is not None
+    create_trades(1, [(1618272000, 1618272000, x, 1.0, 10.0, 0.0) for x in stocks])
+    Ledger().rebuild(from_timestamp=0)
+
+    downloader = QuoteDownloader()
+    downloader.PrepareRussianCBReader = lambda: None
+    downloader.data_loaders[MarketDataFeed.US] = lambda *args: stub_loader("us", *args)
+    downloader.data_loaders[MarketDataFeed.CBR] = lambda *args: stub_loader("cbr", *args)
+    HOST_REQUEST_INTERVAL[host] = 0.03
+    try:
+        downloader.UpdateQuotes(1618272000, 1618444800)
+    finally:
+        del HOST_REQUEST_INTERVAL[host]
+        server.shutdown()
+        server.server_close()
+
+    for asset_id in stocks:
+        assert JalAsset(asset_id).quote(1618444800, 2) == (1618358400, Decimal('11'))
+    assert JalAsset(2).quote(1618444800, 1) == (1618358400, Decimal('11'))
+    assert len([x for x in QuotesStubHandler.requests if x[0].startswith("/us/")]) == len(stocks)
+    assert 1 < QuotesStubHandler.max_active["us"] <= QuoteDownloader.FEED_CONCURRENCY[MarketDataFeed.US]
+    assert QuotesStubHandler.max_active["cbr"] <= QuoteDownloader.FEED_CONCURRENCY[MarketDataFeed.CBR]
+    # Connections are reused by threads and requests are spread in time according to rate limit
+    assert len(set([x[1] for x in QuotesStubHandler.requests])) < len(QuotesStubHandler.requests)
+    starts = [x[2] for x in QuotesStubHandler.requests]
+    assert max(starts) - min(starts) > 0.8 * 0.03 * (len(starts) - 1)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Local HTTP server that returns the same reference data with ETag for any URL except /missing/ ones
+class ReferenceStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    ETAG = '"v1"'
+    responses = []      # list of (path, status)
+
+    def do_GET(self):
+        if self.path.startswith("/missing/"):
+            self.responses.append((self.path, 404))
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == self.ETAG:
+            self.responses.append((self.path, 304))
+            self.send_response(304)
+            self.send_header("ETag", self.ETAG)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.responses.append((self.path, 200))
+        body = f"Data of {self.path}".encode('utf-8')
+        self.send_response(200)
+        self.send_header("ETag", self.ETAG)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_web_cache(tmp_path, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ReferenceStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setattr(WebCache, "TTL", [(f"^{url}/ref/", 3600), (f"^{url}/stale/", -1), (f"^{url}/missing/", 3600)])
+    cache = init_web_cache(str(tmp_path / "web_cache.sqlite"), max_size=40)
+    try:
+        assert get_web_data(f"{url}/ref/1") == "Data of /ref/1"
+        assert get_web_data(f"{url}/ref/1") == "Data of /ref/1"
+        assert get_web_data(f"{url}/quotes") == "Data of /quotes"   # not cached
+        assert get_web_data(f"{url}/quotes") == "Data of /quotes"
+        assert ReferenceStubHandler.responses == [("/ref/1", 200), ("/quotes", 200), ("/quotes", 200)]
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'revalidated': 0, 'evicted': 0, 'count': 1, 'size': 14}
+
+        # Expired response is validated by server
+        ReferenceStubHandler.responses.clear()
+        assert get_web_data(f"{url}/stale/1") == "Data of /stale/1"
+        assert get_web_data(f"{url}/stale/1") == "Data of /stale/1"
+        assert ReferenceStubHandler.responses == [("/stale/1", 200), ("/stale/1", 304)]
+        assert cache.stats() == {'hits': 1, 'misses': 3, 'revalidated': 1, 'evicted': 0, 'count': 2, 'size': 30}
+
+        # Failed download is a cache miss that isn't stored
+        assert get_web_data(f"{url}/missing/1") == ''
+        assert get_web_data(f"{url}/missing/1") == ''
+        assert cache.stats() == {'hits': 1, 'misses': 5, 'revalidated': 1, 'evicted': 0, 'count': 2, 'size': 30}
+
+        # Least recently used response is evicted when size limit is exceeded
+        assert get_web_data(f"{url}/ref/2") == "Data of /ref/2"
+        assert cache.stats()['evicted'] == 1
+        assert cache.stats()['count'] == 2
+        ReferenceStubHandler.responses.clear()
+        get_web_data(f"{url}/stale/1")
+        get_web_data(f"{url}/ref/1")
+        assert ReferenceStubHandler.responses == [("/stale/1", 304), ("/ref/1", 200)]
+
+        # Cache is kept on disk
+        cache = init_web_cache(str(tmp_path / "web_cache.sqlite"), max_size=40)
+        ReferenceStubHandler.responses.clear()
+        assert get_web_data(f"{url}/ref/1") == "Data of /ref/1"
+        assert ReferenceStubHandler.responses == []
+        assert cache.stats()['hits'] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,44 @@
+from decimal import Decimal
+
+from tests.fixtures import project_root, data_path, prepare_db, prepare_db_fifo
+from tests.helpers import create_stocks, create_actions, create_trades, create_quotes
+from constants import PredefindedAccountType, PredefinedCategory
+from jal.db.ledger import Ledger
+from jal.db.helpers import executeSQL
+from jal.db.account import JalAccount
+from jal.db.asset import JalAsset
+from jal.db.holdings import JalHoldings
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_holdings_snapshot(prepare_db_fifo):
+    assert executeSQL("INSERT INTO accounts (type_id, name, currency_id, active, number, organization_id) "
+                      "VALUES (4, 'Old Account', 1, 0, 'R1234', 1)") is not None
+    create_actions([(1604221200, 2, 1, [(PredefinedCategory.StartingBalance, 50000.0)])])
+    create_stocks([(4, 'A', 'A SHARE'), (5, 'B', 'B SHARE')], currency_id=2)
+    create_stocks([(6, 'C', 'C SHARE')], currency_id=1)
+    create_quotes(4, 2, [(1606813200, 10.5), (1606899600, 11.0)])
+    create_quotes(5, 2, [(1606813200, 20.0)])
+    create_quotes(6, 1, [(1606813200, 100.0)])
+    create_quotes(2, 1, [(1606813200, 75.0), (1606899600, 76.0)])
+    create_trades(1, [(1606813200, 1606856400, 4, 100.0, 10.0, 1.0), (1606813200, 1606856400, 5, 10.0, 20.0, 1.0),
+                      (1606856400, 1606856400, 5, -10.0, 21.0, 1.0), (1606856400, 1606856400, 4, -30.0, 11.0, 1.0)])
+    create_trades(2, [(1606813200, 1606856400, 6, 20.0, 100.0, 0.0)])
+    Ledger().rebuild(from_timestamp=0)
+
+    assert JalHoldings(1600000000, 1).accounts() == []
+    for timestamp in [1606813200, 1606900000]:
+        snapshot = JalHoldings(timestamp, 1, active_only=False)
+        assert snapshot.accounts() == [1, 2]
+        for account in JalAccount.get_all_accounts(active_only=False):
+            assert snapshot.currency(account.id()) == account.currency()
+            assert snapshot.rate(account.id()) == JalAsset(account.currency()).quote(timestamp, 1)[1]
+            assert snapshot.money(account.id()) == account.get_asset_amount(timestamp, account.currency())
+            assert [(x['asset_id'], x['symbol'], x['amount'], x['value'], x['quote'])
+                    for x in snapshot.assets(account.id())] == \
+                   [(x['asset'].id(), x['asset'].symbol(account.currency()), x['amount'], x['value'],
+                     x['asset'].quote(timestamp, account.currency())[1]) for x in account.assets_list(timestamp)]
+    assert [x['asset_id'] for x in snapshot.assets(1)] == [4]    # closed position of B isn't shown
+    assert snapshot.assets_value(1) == Decimal('770')
+    assert JalHoldings(1606900000, 1).accounts() == [1]
+    assert JalHoldings(1606900000, 1, account_type=PredefindedAccountType.Cash, active_only=False).accounts() == []
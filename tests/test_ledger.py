@@ -1,3 +1,4 @@
+import pytest
 from pytest import approx
 from decimal import Decimal
 
@@ -5,9 +6,14 @@ from tests.fixtures import project_root, data_path, prepare_db, prepare_db_fifo,
 from tests.helpers import create_stocks, create_actions, create_trades, create_quotes, \
     create_corporate_actions, create_stock_dividends, create_transfers
 from constants import BookAccount
-from jal.db.ledger import Ledger
+from jal.db.ledger import Ledger, LedgerWriter, LedgerAmounts, LotBook
 from jal.db.operations import LedgerTransaction, Dividend
-from jal.db.helpers import readSQL, executeSQL, readSQLrecord
+from jal.db.db import JalDB
+from jal.db.account import JalAccount
+from jal.db.asset import JalAsset
+from jal.db.helpers import readSQL, executeSQL, readSQLrecord, db2decimal, decimal2db, fixed_point_storage, \
+    FIXED_POINT_SCALE
+from benchmarks.generator import PortfolioGenerator
 
 
 #-----------------------------------------------------------------------------------------------------------------------
@@ -400,3 +406,323 @@ def test_asset_transfer(prepare_db):
     assert readSQL("SELECT COUNT(*) FROM deals_ext WHERE account_id=2 AND asset_id=4") == 1
     assert readSQL("SELECT SUM(profit) FROM deals_ext WHERE account_id=1 AND asset_id=4") == -1.0
     assert readSQL("SELECT SUM(profit) FROM deals_ext WHERE account_id=2 AND asset_id=4") == 2495
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_ledger_batch_size(prepare_db):
+    def dump_table(table, fields):
+        rows = []
+        query = executeSQL(f"SELECT {fields} FROM {table} ORDER BY id")
+        while query.next():
+            rows.append(readSQLrecord(query))
+        return rows
+
+    assert executeSQL("INSERT INTO agents (pid, name) VALUES (0, 'Test Peer')") is not None
+    assert executeSQL("INSERT INTO accounts (id, type_id, name, currency_id, active, number, organization_id) "
+                      "VALUES (1, 4, 'account.USD', 2, 1, 'U7654321', 1)") is not None
+    assert executeSQL("INSERT INTO accounts (id, type_id, name, currency_id, active, number, organization_id) "
+                      "VALUES (2, 4, 'account.RUB', 1, 1, 'U7654321', 1)") is not None
+    create_actions([(1640995200, 1, 1, [(4, 1000.0)])])
+    create_quotes(2, 1, [(1643716800, 80), (1643889600, 75)])
+    create_stocks([(4, 'A', 'A SHARE'), (5, 'B', 'B SHARE')], currency_id=2)
+    create_trades(1, [(1643716800, 1643889600, 4, 5.0, 100.0, 1.0),
+                      (1643716800, 1643889600, 5, 3.0, 20.0, 0.0),
+                      (1643803200, 1643889600, 5, 2.0, 30.0, 0.0),
+                      (1644148800, 1644235200, 5, -4.0, 40.0, 1.0)])
+    create_transfers([(1644235200, 1, 5.0, 2, 5.0, 4)])
+    create_trades(2, [(1644580800, 1644753600, 4, -2.0, 8000.0, 5.0),
+                      (1644667200, 1644753600, 4, -3.0, 8100.0, 5.0)])
+
+    tables = {
+        "ledger": "timestamp, op_type, operation_id, book_account, asset_id, account_id, amount, value, "
+                  "amount_acc, value_acc, peer_id, category_id, tag_id",
+        "trades_opened": "timestamp, op_type, operation_id, account_id, asset_id, price, remaining_qty",
+        "trades_closed": "account_id, asset_id, open_op_type, open_op_id, open_timestamp, open_price, "
+                         "close_op_type, close_op_id, close_timestamp, close_price, qty"
+    }
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0, batch_size=1)
+    row_by_row = {x: dump_table(x, tables[x]) for x in tables}
+    assert len(row_by_row['trades_closed']) == 5
+    ledger.rebuild(from_timestamp=0)
+    batched = {x: dump_table(x, tables[x]) for x in tables}
+    assert batched == row_by_row
+    # Partial rebuild should continue FIFO matching from open positions that were stored in DB
+    ledger.rebuild(from_timestamp=1644580800)
+    partial = {x: dump_table(x, tables[x]) for x in tables}
+    assert partial == row_by_row
+
+    # Rows that failed to be written are reported with exception and are dropped from buffer
+    writer = LedgerWriter()
+    writer.add_records('ledger', [[None] * 13])
+    with pytest.raises(ValueError):
+        writer.flush()
+    writer.flush()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_preload_operations(prepare_db_fifo):
+    create_stocks([(4, 'A', 'A SHARE'), (5, 'B', 'B SHARE'), (6, 'C', 'C SHARE')], currency_id=2)
+    create_actions([(1604221300, 1, 1, [(5, -10.0, 'Fee 1'), (5, -20.0, 'Fee 2')])])
+    create_trades(1, [(1606813200, 1606856400, 4, 100.0, 10.0, 1.0)])
+    create_corporate_actions(1, [(1606986000, 2, 4, 100.0, 'Spin-off B from A', [(4, 100.0, 0.8), (5, 20.0, 0.2)])])
+    create_stock_dividends([(Dividend.StockDividend, 1608368400, 1, 6, 1.0, 2, 1050.0, 60.0, 'Stock dividend +1 C')])
+    assert executeSQL("INSERT INTO accounts (type_id, name, currency_id, active, number, organization_id) "
+                      "VALUES (4, 'Inv. Account 2', 2, 1, 'U7654322', 1)") is not None
+    create_transfers([(1609567200, 1, 5.0, 2, 5.0, 4)])
+
+    frontier = 1604221300
+    preloaded = LedgerTransaction.preload_operations(frontier)
+    query = executeSQL("SELECT op_type, id, subtype FROM operation_sequence WHERE timestamp >= :frontier",
+                       [(":frontier", frontier)])
+    count = 0
+    while query.next():
+        op_type, oid, subtype = readSQLrecord(query)
+        assert (op_type, oid) in preloaded
+        loaded = LedgerTransaction.get_operation(op_type, oid, subtype)
+        bulk = LedgerTransaction.get_operation(op_type, oid, subtype, preloaded=preloaded[(op_type, oid)])
+        assert bulk.dump() == loaded.dump()
+        assert bulk.timestamp() == loaded.timestamp()
+        assert bulk.account_id() == loaded.account_id()
+        assert bulk.value_change() == loaded.value_change()
+        count += 1
+    assert count == 6
+    assert (LedgerTransaction.IncomeSpending, 1) not in preloaded
+    assert len(preloaded[(LedgerTransaction.IncomeSpending, 2)]['details']) == 2
+    assert len(preloaded[(LedgerTransaction.CorporateAction, 1)]['results']) == 2
+    # Parallel rebuild preloads only operations of account group
+    keys = [(LedgerTransaction.IncomeSpending, 2), (LedgerTransaction.CorporateAction, 1)]
+    assert LedgerTransaction.preload_by_id(keys) == {x: preloaded[x] for x in keys}
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Verify that frequently used ledger and open trades lookups are served by indices without full table scans
+def test_ledger_query_plans(prepare_db):
+    hot_queries = [
+        LedgerAmounts.AMOUNT_SQL.format(field='amount_acc'),
+        LotBook.LOAD_SQL,
+        JalAccount.ASSETS_LIST_SQL,
+        JalAccount.ASSET_AMOUNT_SQL,
+        JalAccount.OPEN_TRADES_SQL,
+        LedgerTransaction.TOTALS_SQL
+    ] + Ledger.CLEANUP_SQL
+    for sql in hot_queries:
+        query = executeSQL("EXPLAIN QUERY PLAN " + sql)
+        assert query is not None
+        plan = []
+        while query.next():
+            _id, _parent, _notused, detail = readSQLrecord(query)
+            plan.append(detail)
+        for detail in plan:
+            assert not (detail.startswith("SCAN") and "INDEX" not in detail), f"Full scan '{detail}' for query: {sql}"
+            assert "TEMP B-TREE" not in detail, f"Sorting '{detail}' for query: {sql}"
+        if sql == LotBook.LOAD_SQL:   # Only non-zero positions should be read
+            assert any("trades_opened_open_lots" in x for x in plan)
+        if sql == LedgerTransaction.TOTALS_SQL:   # Totals are searched by bound keys of operations
+            assert any("ledger_totals_by_operation_book" in x for x in plan)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_ledger_snapshots(prepare_db_fifo):
+    create_stocks([(4, 'A', 'A SHARE'), (5, 'B', 'B SHARE')], currency_id=2)
+    create_trades(1, [(1606813200, 1606856400, 4, 10.0, 100.0, 1.0),    # 01/12/2020
+                      (1609567200, 1609653600, 5, 10.0, 50.0, 1.0),     # 02/01/2021
+                      (1612245600, 1612332000, 4, -4.0, 120.0, 1.0),    # 02/02/2021
+                      (1614664800, 1614751200, 5, -10.0, 60.0, 1.0),    # 02/03/2021
+                      (1617343200, 1617429600, 4, -6.0, 90.0, 1.0)])    # 02/04/2021
+    fields = "timestamp, op_type, operation_id, book_account, asset_id, account_id, amount, value, amount_acc, value_acc"
+
+    def dump_ledger():
+        rows = []
+        query = executeSQL(f"SELECT {fields} FROM ledger ORDER BY id")
+        while query.next():
+            rows.append(readSQLrecord(query))
+        return rows
+
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0)
+    full = dump_ledger()
+    # Snapshots are made at the beginning of every month where operations happened
+    assert readSQL("SELECT COUNT(DISTINCT timestamp) FROM ledger_snapshots") == 5
+    assert readSQL("SELECT amount_acc FROM ledger_snapshots WHERE timestamp=1614556800 AND book_account=:assets "
+                   "AND asset_id=4", [(":assets", BookAccount.Assets)]) == '6'
+
+    # State loaded from snapshot is the same as the one read from ledger directly
+    ledger._loadSnapshot(1614664800)
+    for key in list(ledger.amounts.keys()):
+        direct = readSQL("SELECT amount_acc, value_acc FROM ledger WHERE book_account=:book AND account_id=:account "
+                         "AND asset_id=:asset AND timestamp<1614664800 ORDER BY id DESC LIMIT 1",
+                         [(":book", key[0]), (":account", key[1]), (":asset", key[2])])
+        assert [str(ledger.amounts[key]), str(ledger.values[key])] == direct
+
+    ledger.rebuild(from_timestamp=1614664800)
+    assert dump_ledger() == full
+    assert readSQL("SELECT COUNT(DISTINCT timestamp) FROM ledger_snapshots") == 5
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_ledger_parallel_rebuild(prepare_db):
+    def dump_tables():
+        tables = {
+            "ledger": "account_id, timestamp, op_type, operation_id, book_account, asset_id, amount, value, "
+                      "amount_acc, value_acc, peer_id, category_id, tag_id",
+            "ledger_totals": "account_id, op_type, operation_id, timestamp, book_account, asset_id, amount_acc, value_acc",
+            "trades_opened": "account_id, timestamp, op_type, operation_id, asset_id, price, remaining_qty",
+            "trades_closed": "account_id, asset_id, open_op_type, open_op_id, open_timestamp, open_price, "
+                             "close_op_type, close_op_id, close_timestamp, close_price, qty",
+            "ledger_snapshots": "account_id, timestamp, book_account, asset_id, amount_acc, value_acc"
+        }
+        data = {}
+        for table in tables:   # Order of records is important only within one account
+            data[table] = []
+            order = "timestamp, book_account, asset_id" if table == "ledger_snapshots" else "id"
+            query = executeSQL(f"SELECT {tables[table]} FROM {table} ORDER BY account_id, {order}")
+            while query.next():
+                data[table].append(readSQLrecord(query))
+        return data
+
+    assert executeSQL("INSERT INTO agents (pid, name) VALUES (0, 'Test Peer')") is not None
+    for account_id, currency_id in [(1, 2), (2, 1), (3, 2)]:
+        assert executeSQL("INSERT INTO accounts (id, type_id, name, currency_id, active, number, organization_id) "
+                          "VALUES (:id, 4, :name, :currency, 1, 'U7654321', 1)",
+                          [(":id", account_id), (":name", f"account.{account_id}"), (":currency", currency_id)]) is not None
+    create_actions([(1640995200, 1, 1, [(4, 1000.0)]), (1640995200, 3, 1, [(4, 2000.0)])])
+    create_quotes(2, 1, [(1643716800, 80), (1643889600, 75)])
+    create_stocks([(4, 'A', 'A SHARE'), (5, 'B', 'B SHARE')], currency_id=2)
+    create_trades(1, [(1643716800, 1643889600, 4, 5.0, 100.0, 1.0)])
+    create_transfers([(1644235200, 1, 5.0, 2, 5.0, 4)])
+    create_trades(2, [(1646136000, 1646308800, 4, -5.0, 8000.0, 5.0)])
+    create_trades(3, [(1643716800, 1643889600, 5, 10.0, 50.0, 1.0),
+                      (1646136000, 1646308800, 5, -4.0, 60.0, 1.0),
+                      (1648814400, 1648987200, 5, -6.0, 40.0, 1.0)])
+
+    ledger = Ledger()
+    groups = ledger._getAccountGroups(0, ledger._getSequence(0))
+    assert sorted([sorted(x) for x in groups]) == [[1, 2], [3]]
+
+    ledger.rebuild(from_timestamp=0)
+    sequential = dump_tables()
+    ledger.rebuild(from_timestamp=0, processes=2)
+    assert dump_tables() == sequential
+    ledger.rebuild(from_timestamp=1646136000, processes=2)
+    assert dump_tables() == sequential
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_fixed_point_storage(prepare_db):
+    def dump_table(table, fields):
+        rows = []
+        query = executeSQL(f"SELECT {', '.join(fields)} FROM {table} ORDER BY id")
+        while query.next():
+            rows.append([db2decimal(value, field) if field in FIXED_POINT_SCALE else value
+                         for value, field in zip(readSQLrecord(query), fields)])
+        return rows
+
+    assert executeSQL("INSERT INTO agents (pid, name) VALUES (0, 'Test Peer')") is not None
+    assert executeSQL("INSERT INTO accounts (id, type_id, name, currency_id, active, number, organization_id) "
+                      "VALUES (1, 4, 'account.USD', 2, 1, 'U7654321', 1)") is not None
+    create_actions([(1640995200, 1, 1, [(4, 1000.0)])])
+    create_quotes(2, 1, [(1643716800, 80.1234), (1643889600, 75)])
+    create_stocks([(4, 'A', 'A SHARE')], currency_id=2)
+    create_trades(1, [(1643716800, 1643889600, 4, 3.0, 100.25, 1.0),
+                      (1643803200, 1643889600, 4, 2.0, 30.0, 0.0),
+                      (1644148800, 1644235200, 4, -4.0, 40.0, 1.0)])
+    tables = {
+        "ledger": ["timestamp", "op_type", "operation_id", "book_account", "asset_id", "account_id",
+                   "amount", "value", "amount_acc", "value_acc"],
+        "trades_opened": ["timestamp", "op_type", "operation_id", "account_id", "asset_id", "price", "remaining_qty"],
+        "quotes": ["timestamp", "asset_id", "currency_id", "quote"]
+    }
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0)
+    text_rows = {x: dump_table(x, tables[x]) for x in tables}
+    text_raw = readSQL("SELECT amount_acc, value_acc FROM ledger ORDER BY id DESC LIMIT 1")
+    account = JalAccount(1)
+    assets = [(x['asset'].id(), x['amount'], x['value']) for x in account.assets_list(1644235200)]
+    assert assets == [(4, Decimal('1'), Decimal('30'))]
+
+    schema = readSQL("SELECT group_concat(name) FROM (SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger') "
+                     "AND tbl_name IN ('ledger', 'trades_opened', 'quotes') ORDER BY name)")
+    JalDB().set_fixed_point_storage(True)
+    assert readSQL("SELECT type FROM pragma_table_info('quotes') WHERE name='quote'") == 'INTEGER'
+    assert readSQL("SELECT group_concat(name) FROM (SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger') "
+                   "AND tbl_name IN ('ledger', 'trades_opened', 'quotes') ORDER BY name)") == schema
+    # Scaled values are kept as integers and are summed as integers, prices of open trades are kept as text
+    assert readSQL("SELECT quote FROM quotes WHERE timestamp=1643716800") == 8012340000
+    assert readSQL("SELECT typeof(SUM(amount)) || typeof(SUM(value_acc)) FROM ledger") == 'integerinteger'
+    assert readSQL("SELECT typeof(price) || typeof(remaining_qty) FROM trades_opened LIMIT 1") == 'textinteger'
+    assert {x: dump_table(x, tables[x]) for x in tables} == text_rows
+    assert [(x['asset'].id(), x['amount'], x['value']) for x in account.assets_list(1644235200)] == assets
+    assert account.get_asset_amount(1644235200, 2) == Decimal('797.25')
+    assert JalAsset(2).quote(1643800000, 1) == (1643716800, Decimal('80.1234'))
+    # Rebuild of ledger (both full and partial one with restoration of open positions) gives the same values
+    ledger.rebuild(from_timestamp=0)
+    assert {x: dump_table(x, tables[x]) for x in tables} == text_rows
+    ledger.rebuild(from_timestamp=1644148800)
+    assert {x: dump_table(x, tables[x]) for x in tables} == text_rows
+    # Trigger restores scaled quantity of open position after deletion of closed trade
+    assert executeSQL("DELETE FROM trades_closed WHERE close_op_id=3", commit=True) is not None
+    assert db2decimal(readSQL("SELECT remaining_qty FROM trades_opened WHERE operation_id=2"), 'remaining_qty') == 2
+    ledger.rebuild(from_timestamp=0)
+
+    JalDB().set_fixed_point_storage(False)
+    assert readSQL("SELECT amount_acc, value_acc FROM ledger ORDER BY id DESC LIMIT 1") == text_raw
+    assert readSQL("SELECT type FROM pragma_table_info('quotes') WHERE name='quote'") == 'TEXT'
+    assert {x: dump_table(x, tables[x]) for x in tables} == text_rows
+
+    # Values that don't fit into 64-bit integers are rejected and storage is kept unchanged
+    assert decimal2db(Decimal('12000000000.5'), 'amount_acc', False) == '12000000000.5'
+    with pytest.raises(ValueError):
+        decimal2db(Decimal('120000000000.5'), 'amount_acc', True)
+    # Values with more digits than the scale keeps are rejected as well instead of rounding
+    assert decimal2db(Decimal('1.12345678'), 'quote', True) == 112345678
+    with pytest.raises(ValueError):
+        decimal2db(Decimal('1.123456789'), 'quote', True)
+    create_quotes(2, 1, [(1644235200, 1e11)])
+    with pytest.raises(ValueError):
+        JalDB().set_fixed_point_storage(True)
+    assert not fixed_point_storage(refresh=True)
+    assert readSQL("SELECT quote FROM quotes WHERE timestamp=1643716800") == '80.1234'
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_ledger_monthly(prepare_db):
+    def monthly_sums(table):
+        month = "month" if table == "ledger_monthly" else \
+            "CAST(strftime('%s', date(timestamp, 'unixepoch', 'start of month')) AS INTEGER)"
+        query = executeSQL(f"SELECT {month} AS m, account_id, book_account, coalesce(category_id, 0) AS c, asset_id, "
+                           f"amount FROM {table}")
+        sums = {}
+        while query.next():
+            month, account, book, category, asset, amount = readSQLrecord(query)
+            key = (month, account, book, category, asset)
+            sums[key] = sums.get(key, Decimal('0')) + db2decimal(amount, 'amount')
+        return {key: round(value, 6) for key, value in sums.items()}
+
+    PortfolioGenerator(seed=11, accounts=2, assets=3, years=1, trades=80, dividends=10, transfers=6,
+                       corp_actions=1).populate()
+    Ledger().rebuild(from_timestamp=0)
+    monthly = monthly_sums("ledger_monthly")
+    assert len(monthly) > 0
+    assert monthly == monthly_sums("ledger")
+    months = sorted({key[0] for key in monthly})
+    assert len(months) > 6
+
+    # Partial rebuild replaces only months since frontier and keeps earlier months
+    assert executeSQL("UPDATE ledger_monthly SET amount=0 WHERE month<:month", [(":month", months[5])]) is not None
+    Ledger().rebuild(from_timestamp=months[5] + 86400)
+    assert readSQL("SELECT COUNT(*) FROM ledger_monthly WHERE month<:month AND amount<>0",
+                   [(":month", months[5])]) == 0
+    assert {k: v for k, v in monthly_sums("ledger_monthly").items() if k[0] >= months[5]} == \
+           {k: v for k, v in monthly.items() if k[0] >= months[5]}
+
+    # Modification of operation drops monthly sums starting from its month until the next rebuild
+    monthly = monthly_sums("ledger_monthly")
+    trade_id, timestamp = readSQL("SELECT id, timestamp FROM trades WHERE timestamp>=:month ORDER BY timestamp",
+                                  [(":month", months[8] + 86400)])
+    assert executeSQL("DELETE FROM trades WHERE id=:id", [(":id", trade_id)], commit=True) is not None
+    assert readSQL("SELECT COUNT(*) FROM ledger_monthly WHERE month>=:month", [(":month", months[8])]) == 0
+    assert monthly_sums("ledger_monthly") == {k: v for k, v in monthly.items() if k[0] < months[8]}
+    Ledger().rebuild()
+    assert {k: v for k, v in monthly_sums("ledger_monthly").items() if k[0] >= months[8]} == \
+           {k: v for k, v in monthly_sums("ledger").items() if k[0] >= months[8]}
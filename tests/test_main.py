@@ -8,6 +8,7 @@ from jal.db.db import JalDB, JalDBError, db_connection
 from jal.db.helpers import get_dbfilename
 from jal.db.helpers import readSQL
 from jal.db.backup_restore import JalBackup
+from jal.net.web_cache import web_cache
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -26,6 +27,9 @@ def test_db_creation(tmp_path, project_root):
     assert error.code == JalDBError.NoError
     # Verify db encoding
     assert readSQL("SELECT full_name FROM assets WHERE id=1") == 'Российский Рубль'
+    # Web cache is created near db file
+    assert web_cache() is not None
+    assert os.path.exists(str(tmp_path) + os.sep + Setup.WEB_CACHE_PATH)
 
     # Clean up db
     db_connection().close()
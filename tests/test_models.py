@@ -0,0 +1,226 @@
+from decimal import Decimal
+from PySide6.QtCore import Qt, QDate
+from PySide6.QtWidgets import QApplication, QTreeView
+
+from tests.fixtures import project_root, data_path, prepare_db, prepare_db_fifo
+from tests.helpers import create_stocks, create_trades, create_quotes, create_transfers, create_actions
+from jal.db.ledger import Ledger
+from jal.db.helpers import executeSQL
+from jal.db.db import JalDB
+from jal.reports.profit_loss import ProfitLossReportModel    # reports should be imported before models in order
+from jal.db.balances_model import BalancesModel             # to resolve circular import of delegates
+from jal.reports.profit_loss import ProfitLossCalculator
+from jal.reports.income_spending import IncomeSpendingReportModel
+from jal.db.operations_model import OperationsModel
+from jal.db.operations import LedgerTransaction
+from jal.widgets.operations_widget import OperationsWidget
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_balances_cache(prepare_db_fifo):
+    create_stocks([(4, 'A', 'A SHARE')], currency_id=2)
+    create_quotes(4, 2, [(1606813200, 10.0)])
+    create_quotes(2, 1, [(1606813200, 75.0)])
+    create_trades(1, [(1606813200, 1606856400, 4, 100.0, 10.0, 1.0)])
+    Ledger().rebuild(from_timestamp=0)
+
+    model = BalancesModel(None)
+    model.setCurrency(2)
+    model.setDate(QDate(2020, 12, 2))
+    assert model.rowCount() == 3     # account, sub-total for investment accounts and total
+    assert model.data_text(0, 0) == 'Inv. Account'
+    assert model._data[0]['balance'] == Decimal('9999')
+    assert model._data[0]['balance_a'] == Decimal('9999')
+    model.setCurrency(1)
+    assert model._data[0]['balance_a'] == Decimal('749925')
+    assert model._data[2]['balance_a'] == Decimal('749925')
+    assert len(model._balances_cache) == 2       # currency change doesn't recalculate balances (1st is for today)
+    model.setDate(QDate(2020, 10, 31))
+    assert model.rowCount() == 1
+    model.setDate(QDate(2020, 12, 2))
+    assert len(model._balances_cache) == 3
+
+    # Cached data are used until model update after ledger or quotes change
+    create_quotes(4, 2, [(1606813200, 12.0)])
+    model.setCurrency(2)
+    assert model._data[0]['balance'] == Decimal('9999')
+    model.update()
+    assert model._data[0]['balance'] == Decimal('10199')
+    assert len(model._balances_cache) == 1
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_operations_cache(prepare_db_fifo):
+    create_stocks([(4, 'A', 'A SHARE')], currency_id=2)
+    create_trades(1, [(1606813200 + i * 86400, 1606813200 + i * 86400, 4, 1.0 + i, 10.0, 1.0) for i in range(10)])
+    Ledger().rebuild(from_timestamp=0)
+
+    model = OperationsModel(None)
+    model.PREFETCH_SIZE = 4
+    model.CACHE_SIZE = 6
+    model.setDateRange(1604221200, 1609459200)
+    rows = model.rowCount()
+    assert rows == 11     # initial deposit and 10 trades
+    assert len(model._cache) == 0
+    for row in range(rows):
+        operation = LedgerTransaction.get_operation(*model.get_operation(row), model._data[row][2])
+        assert [model.data(model.index(row, x)) for x in range(model.columnCount())] == \
+               [model.data_text(operation, x) for x in range(model.columnCount())]
+        assert len(model._cache) == min(((row // 4) + 1) * 4, 6)
+    assert list(model._cache) == [5, 6, 7, 8, 9, 10]   # the least recently used rows are evicted
+    model.data(model.index(5, 1))
+    model.prefetch(0, 1)
+    assert list(model._cache) == [8, 9, 10, 5, 0, 1]
+
+    model.setAccount(1)   # model reset drops cached rows
+    assert len(model._cache) == 0
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_operations_paging(prepare_db_fifo):
+    create_stocks([(4, 'A', 'A SHARE')], currency_id=2)
+    create_trades(1, [(1606813200 + (i // 3) * 86400, 1606813200, 4, 1.0 + i, 10.0, 1.0) for i in range(10)])
+    assert executeSQL("INSERT INTO accounts (type_id, name, currency_id, active, number, organization_id) "
+                      "VALUES (4, 'Inv. Account 2', 2, 1, 'U1234567', 1)") is not None
+    create_transfers([(1606813200, 1, 10.0, 2, 10.0, None)] * 3)  # transfers have several rows with the same id
+    Ledger().rebuild(from_timestamp=0)
+    sequence = Ledger.get_operations_sequence(1604221200, 1609459200)
+    assert len(sequence) == 17
+    assert sequence == sorted(sequence)
+
+    model = OperationsModel(None)
+    model.PAGE_SIZE = 5
+    model.setDateRange(1604221200, 1609459200)
+    assert model.rowCount() == 5
+    assert model.canFetchMore()
+    while model.canFetchMore():
+        model.fetchMore()
+    assert model.rowCount() == 17
+    assert model._data == sequence
+    assert model.data(model.index(16, 0), Qt.UserRole, field='timestamp') == sequence[16][0]
+
+    model.setAccount(2)
+    assert model.rowCount() == 3
+    assert not model.canFetchMore()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_profit_loss_report(prepare_db_fifo):
+    create_stocks([(4, 'A', 'A SHARE')], currency_id=2)
+    create_quotes(4, 2, [(1606813200, 10.0), (1609459200, 12.0)])
+    create_trades(1, [(1606813200, 1606813200, 4, 100.0, 10.0, 1.0), (1610000000, 1610000000, 4, -100.0, 12.0, 1.0)])
+    Ledger().rebuild(from_timestamp=0)
+
+    model = ProfitLossReportModel(None)
+    model._begin, model._end = 1604188800, 1612137599
+    model.calculateProfitLossReport()
+    assert model.rowCount() == 0    # account isn't selected
+    model._account_id = 1
+    model.calculateProfitLossReport()
+    assert model.rowCount() == 4    # period is extended till the start of the next month
+    assert model._data == [     # period, in/out, assets value, result, profit, returns, taxes & fees
+        [1604188800, 0.0, 0.0, 10000.0, 0.0, 0.0, 0.0],
+        [1606780800, 0.0, 0.0, -1.0, 0.0, 0.0, -1.0],
+        [1609459200, 0.0, 1200.0, 199.0, 200.0, 0.0, -1.0],
+        [1612137600, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+    ]
+    model._begin = 1640995200
+    model.calculateProfitLossReport()
+    assert model.rowCount() == 0
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_profit_loss_partial_months(prepare_db_fifo):
+    create_stocks([(4, 'A', 'A SHARE')], currency_id=2)
+    create_quotes(4, 2, [(1606813200, 10.0), (1609459200, 12.0)])
+    create_trades(1, [(1606813200, 1606813200, 4, 100.0, 10.0, 1.0), (1610000000, 1610000000, 4, -100.0, 12.0, 1.0)])
+    create_actions([(1608422400, 1, 1, [(5, -5.0)])])     # 20/12/2020
+    Ledger().rebuild(from_timestamp=0)
+
+    # Flows of the whole first and last months are shown, even if they are outside of report range
+    # Value is shown for assets that have records in report range only (stock A isn't traded in second half of Dec)
+    assert ProfitLossCalculator(1, 1607990400, 1609459199).calculate() == [    # 15/12/2020 - 31/12/2020
+        [1606780800, 0.0, 0.0, -6.0, 0.0, 0.0, -6.0],
+        [1609459200, 0.0, 0.0, 199.0, 200.0, 0.0, -1.0]
+    ]
+    assert ProfitLossCalculator(1, 1606780800, 1609459199).calculate() == [    # 01/12/2020 - 31/12/2020
+        [1606780800, 0.0, 0.0, -6.0, 0.0, 0.0, -6.0],
+        [1609459200, 0.0, 1200.0, 199.0, 200.0, 0.0, -1.0]
+    ]
+    # Report is empty if there are no records in report range
+    assert ProfitLossCalculator(1, 1609459200, 1609891200).calculate() == []    # 01/01/2021 - 06/01/2021
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_profit_loss_money_rates(prepare_db_fifo):
+    create_quotes(2, 2, [(1606694400, 1.0), (1606784400, 3.0), (1609459200, 2.0), (1612137600, 4.0),
+                         (1612141200, 5.0)])
+    create_actions([(1608422400, 1, 1, [(5, -5.0)]), (1610236800, 1, 1, [(5, -5.0)])])     # 20/12/2020, 10/01/2021
+    Ledger().rebuild(from_timestamp=0)
+
+    # Money is valued with the rate of the day before month start (quote of 01/12 01:00 isn't known at 01/12 00:00)
+    # or with the quote exactly at month start (01/01 00:00 and 01/02 00:00, but not 01/02 01:00)
+    assert [x[2] for x in ProfitLossCalculator(1, 1606780800, 1609459199).calculate()] == [10000.0, 19990.0]
+    assert [x[2] for x in ProfitLossCalculator(1, 1609459200, 1612137600).calculate()] == [19990.0, 39960.0]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_balances_reconcile(prepare_db_fifo):
+    create_stocks([(4, 'A', 'A SHARE')], currency_id=2)
+    create_quotes(4, 2, [(1606813200, 10.0)])
+    create_quotes(2, 1, [(1606813200, 75.0)])
+    create_trades(1, [(1606813200, 1606856400, 4, 100.0, 10.0, 1.0)])
+    Ledger().rebuild(from_timestamp=0)
+
+    app = QApplication.instance() or QApplication([])
+    widget = OperationsWidget()
+    widget.balances_model.setCurrency(2)
+    widget.balances_model.setDate(QDate(2020, 12, 2))
+    unreconciled = widget.balances_model._data[0]['unreconciled']
+    assert unreconciled > 0
+    widget.operations_model.setDateRange(0, 1606899600)
+    row = [widget.operations_model.data(widget.operations_model.index(x, 0), Qt.UserRole, field="timestamp")
+           for x in range(widget.operations_model.rowCount())].index(1606813200)
+    widget.current_index = widget.operations_model.index(row, 0)
+    widget.reconcileAtCurrentOperation()
+    # Cached balances are dropped after reconciliation
+    assert widget.balances_model._data[0]['unreconciled'] == 0
+    widget.deleteLater()
+    app.processEvents()
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_income_spending_report(prepare_db_fifo):
+    create_actions([(1607126400, 1, 1, [(5, -10.0)]),     # 05/12/2020
+                    (1608854400, 1, 1, [(5, -20.0)]),     # 25/12/2020
+                    (1610668800, 1, 1, [(5, -40.0)]),     # 15/01/2021
+                    (1612915200, 1, 1, [(5, -80.0)])])    # 10/02/2021
+    Ledger().rebuild(from_timestamp=0)
+
+    app = QApplication.instance() or QApplication([])
+    view = QTreeView()
+    model = IncomeSpendingReportModel(view)
+    model._begin, model._end = 1608422400, 1612483200    # 20/12/2020 - 05/02/2021
+    model.calculateIncomeSpendings()
+    def find_item(item, item_id):
+        if item._id == item_id:
+            return item
+        for child in item._children:
+            if (found := find_item(child, item_id)) is not None:
+                return found
+        return None
+
+    fees = find_item(model._root, 5)
+    # Full month is taken from monthly sums and partial months are limited by report range
+    assert (fees.getAmount(2020, 12), fees.getAmount(2021, 1), fees.getAmount(2021, 2)) == (-20.0, -40.0, 0)
+    assert fees.getAmount(0, 0) == -60.0
+    # Amounts are summed as scaled integers with fixed point storage and give exact decimal values
+    JalDB().set_fixed_point_storage(True)
+    create_actions([(1612224000, 1, 1, [(5, -0.1)]), (1612310400, 1, 1, [(5, -0.2)])])     # 02/02/2021, 03/02/2021
+    Ledger().rebuild(from_timestamp=0)
+    model.calculateIncomeSpendings()
+    fees = find_item(model._root, 5)
+    assert (fees.getAmount(2020, 12), fees.getAmount(2021, 1), fees.getAmount(2021, 2)) == \
+           (Decimal('-20'), Decimal('-40'), Decimal('-0.3'))
+    view.deleteLater()
+    app.processEvents()
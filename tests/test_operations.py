@@ -0,0 +1,73 @@
+from tests.fixtures import project_root, data_path, prepare_db, prepare_db_fifo
+from tests.helpers import create_stocks, create_actions, create_trades, create_corporate_actions, \
+    create_stock_dividends, create_transfers
+from jal.db.ledger import Ledger
+from jal.db.helpers import executeSQL, readSQLrecord
+from jal.db.db import JalDB
+from jal.db.account import JalAccount
+from jal.db.operations import LedgerTransaction, Dividend, CorporateAction
+from benchmarks.generator import PortfolioGenerator
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_operation_sequence(prepare_db_fifo):
+    def sequence_union():   # the same query that was used in operation_sequence view before it became a table
+        query = executeSQL(
+            "SELECT op_type, seq, id, timestamp, account_id, subtype FROM ("
+            "SELECT op_type, 1 AS seq, id, timestamp, account_id, 0 AS subtype FROM actions UNION ALL "
+            "SELECT op_type, 2 AS seq, id, timestamp, account_id, type AS subtype FROM dividends UNION ALL "
+            "SELECT op_type, 3 AS seq, id, timestamp, account_id, type AS subtype FROM asset_actions UNION ALL "
+            "SELECT op_type, 4 AS seq, id, timestamp, account_id, 0 AS subtype FROM trades UNION ALL "
+            "SELECT op_type, 5, id, withdrawal_timestamp, withdrawal_account, -1 FROM transfers UNION ALL "
+            "SELECT op_type, 5, id, withdrawal_timestamp, fee_account, 0 FROM transfers WHERE NOT fee IS NULL "
+            "UNION ALL SELECT op_type, 5, id, deposit_timestamp, deposit_account, 1 FROM transfers"
+            ") ORDER BY timestamp, seq, subtype, id")
+        return [readSQLrecord(query) for _ in iter(query.next, False)]
+
+    def sequence_table():
+        query = executeSQL("SELECT op_type, seq, id, timestamp, account_id, subtype FROM operation_sequence "
+                           "ORDER BY timestamp, seq, subtype, id")
+        return [readSQLrecord(query) for _ in iter(query.next, False)]
+
+    assert executeSQL("INSERT INTO accounts (type_id, name, currency_id, active, number, organization_id) "
+                      "VALUES (4, 'Inv. Account 2', 2, 1, 'U1234567', 1)") is not None
+    create_stocks([(4, 'A', 'A SHARE'), (5, 'B', 'B SHARE')], currency_id=2)
+    create_actions([(1606813200, 2, 1, [(4, 10.0)])])
+    create_trades(1, [(1606813200, 1606813200, 4, 10.0, 10.0, 1.0), (1606899600, 1606899600, 4, -5.0, 11.0, 1.0)])
+    create_stock_dividends([(Dividend.StockDividend, 1606899600, 1, 4, 1.0, 2, 11.0, 0.0, 'Stock dividend')])
+    create_corporate_actions(1, [(1606986000, CorporateAction.SymbolChange, 4, 6.0, 'A -> B', [(5, 6.0, 1.0)])])
+    create_transfers([(1606813200, 1, 10.0, 2, 10.0, None), (1606899600, 2, 3.0, 1, 3.0, None)])
+    assert executeSQL("UPDATE transfers SET fee_account=1, fee='1' WHERE id=1") is not None
+    assert len(sequence_table()) == 11
+    assert sequence_table() == sequence_union()
+
+    # Changes of operations are reflected in sequence even if triggers are disabled for ledger rebuild
+    JalDB().enable_triggers(False)
+    assert executeSQL("UPDATE trades SET timestamp=1606986000, account_id=2 WHERE id=1") is not None
+    assert executeSQL("UPDATE asset_actions SET type=:type", [(":type", CorporateAction.Split)]) is not None
+    assert executeSQL("UPDATE transfers SET fee=NULL, deposit_timestamp=1607072400 WHERE id=1") is not None
+    assert executeSQL("DELETE FROM dividends") is not None
+    JalDB().enable_triggers(True)
+    assert len(sequence_table()) == 9
+    assert sequence_table() == sequence_union()
+    assert executeSQL("DELETE FROM accounts WHERE id=2") is not None    # operations are deleted by cascade
+    assert len(sequence_table()) == 3
+    assert sequence_table() == sequence_union()
+    assert JalAccount(1).last_operation_date() == 1606986000
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_preload_totals(prepare_db):
+    PortfolioGenerator(seed=3, accounts=2, assets=3, years=1, trades=60, dividends=10, transfers=6,
+                       corp_actions=2).populate()
+    Ledger().rebuild(from_timestamp=0)
+
+    sequence = Ledger.get_operations_sequence(0, 1893456000)
+    keys = [(x[4], x[3]) for x in sequence]
+    totals = LedgerTransaction.preload_totals(keys)
+    assert len(totals) == len(set(keys))
+    preloaded = LedgerTransaction.preload_by_id(keys, totals=True)
+    for _timestamp, _seq, subtype, oid, op_type, _account in sequence:
+        operation = LedgerTransaction.get_operation(op_type, oid, subtype, preloaded=preloaded[(op_type, oid)])
+        assert operation._totals == totals[(op_type, oid)]
+        assert operation.value_total() == LedgerTransaction.get_operation(op_type, oid, subtype).value_total()